@@ -0,0 +1,35 @@
+"""Multi-process serving: `gunicorn --config gunicorn.conf.py main:app`.
+
+The app and the D3Database catalogs are loaded once in the master, workers are
+forked from it and open their own database pools.
+
+Set PROMETHEUS_MULTIPROC_DIR to an empty directory to aggregate the metrics of
+every worker on /metrics.
+"""
+
+import gc
+import os
+
+from prometheus_client import multiprocess
+
+from src.const import WEB_WORKERS, get_setting
+from src.database import reset_engines
+
+bind = get_setting("BIND", "0.0.0.0:8000")
+workers = WEB_WORKERS
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+
+
+def pre_fork(server, worker):
+    # preloaded objects are never collected, keep the gc from touching their pages
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    reset_engines()
+
+
+def child_exit(server, worker):
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        multiprocess.mark_process_dead(worker.pid)
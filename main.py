@@ -1,13 +1,14 @@
+import asyncio
 import logging
 import os
-import socket
 import sys
+import time
 from contextlib import asynccontextmanager
 from pathlib import Path
-from time import sleep
+
+BOOT_STARTED_AT = time.perf_counter()
 
 import uvicorn
-from dotenv import get_key
 from fastapi import FastAPI, Request
 from fastapi.exceptions import RequestValidationError
 from starlette.exceptions import HTTPException as StarletteHTTPException
@@ -16,19 +17,61 @@ from starlette.responses import PlainTextResponse
 
 sys.path.append(os.path.join(Path(__file__).parent, "D3Database"))
 
-from src.const import ENV_PATH
-from src.routers import item_price_history, data_center, character
+from src.catalog import DataReader, I18N
+from src.const import (
+    CRAFT_RANKING_ENABLED,
+    HOT_WINDOW_ENABLED,
+    RANKING_MATERIALIZER_IN_PROCESS,
+)
+from src.database import run_migrations, wait_for_database
+from src.metrics import MetricsMiddleware
+from src.profiling import ProfilingMiddleware
+from src.routers import (
+    admin,
+    character,
+    data_center,
+    health,
+    item_price_history,
+    metrics,
+)
+from src.tracing import TracingMiddleware
+from src.workers.craft_ranking import run_craft_ranking
+from src.workers.hot_window import run_hot_window
+from src.workers.materializer import run_materializer
+from src.workers.mule_listener import run_mule_listener
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    while not is_db_ready(get_key(ENV_PATH, "DB_HOST") or "localhost", 5432):
-        print("waiting for reachable db")
-        sleep(1)
-    os.system(
-        f"poetry run alembic --config {os.path.join(Path(__file__).parent, 'src', 'alembic', 'alembic.ini')} upgrade head"
+    app.state.ready = False
+    lifespan_started_at = time.perf_counter()
+
+    await wait_for_database()
+    db_ready_at = time.perf_counter()
+
+    migrated = await asyncio.to_thread(run_migrations)
+    migrated_at = time.perf_counter()
+
+    app.state.ready = True
+    logger.info(
+        "API ready in %.3fs (import %.3fs, db wait %.3fs, migrations %.3fs%s)",
+        migrated_at - BOOT_STARTED_AT,
+        lifespan_started_at - BOOT_STARTED_AT,
+        db_ready_at - lifespan_started_at,
+        migrated_at - db_ready_at,
+        "" if migrated else ", already at head",
     )
+
+    background_tasks = [asyncio.create_task(run_mule_listener())]
+    if RANKING_MATERIALIZER_IN_PROCESS:
+        background_tasks.append(asyncio.create_task(run_materializer()))
+    if HOT_WINDOW_ENABLED:
+        background_tasks.append(asyncio.create_task(run_hot_window()))
+    if CRAFT_RANKING_ENABLED:
+        background_tasks.append(asyncio.create_task(run_craft_ranking()))
     yield
+    for task in background_tasks:
+        task.cancel()
 
 
 app = FastAPI(lifespan=lifespan)
@@ -59,18 +102,30 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(TracingMiddleware)
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(ProfilingMiddleware)
 app.include_router(item_price_history.router)
 app.include_router(data_center.router)
 app.include_router(character.router)
+app.include_router(health.router)
+app.include_router(metrics.router)
+app.include_router(admin.router)
+
+
+def preload_catalogs():
+    """Charge les catalogues D3Database une seule fois, avant le fork des workers
+    pour qu'ils soient partagés en copy-on-write."""
+    data_reader = DataReader()
+    data_reader.item_by_id
+    data_reader.item_type_by_id
+    data_reader.item_ids_by_category
+    data_reader.item_ids_by_type_id
+    data_reader.recipes
+    I18N().name_by_id
 
 
-def is_db_ready(host: str, port: int) -> bool:
-    """Vérifie si la base de données est prête pour les connexions."""
-    try:
-        with socket.create_connection((host, port), timeout=1):
-            return True
-    except OSError:
-        return False
+preload_catalogs()
 
 
 if __name__ == "__main__":
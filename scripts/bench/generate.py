@@ -0,0 +1,131 @@
+"""Fill item_price_history with a deterministic synthetic dataset through COPY.
+
+The same seed, scale and end date always produce the same rows, from 10k to 100M.
+Items come from the catalog selected by CATALOG_PROVIDER, or are numbered 1..N
+with `--items`.
+
+    python -m scripts.bench.generate --scale 1m --servers 1 2 3 --seed 42 --truncate
+"""
+
+import argparse
+import io
+import itertools
+import time
+from datetime import datetime
+from typing import Iterable
+
+from sqlalchemy import Engine, text
+
+from src.catalog import DataReader
+from src.controllers.latest_item_price import LatestItemPriceController
+from src.database import SessionMaker, get_engine
+from src.synthetic.prices import SCALES, PriceRow, generate_price_rows
+
+COPY_STATEMENT = (
+    "COPY item_price_history (gid, quantity, price, recorded_at, server_id) FROM STDIN"
+)
+
+
+def get_gids(items: int | None = None) -> list[int]:
+    if items is None:
+        gids = sorted(DataReader().item_by_id)
+        if gids:
+            return gids
+        items = 10_000
+    return list(range(1, items + 1))
+
+
+def to_copy_line(row: PriceRow) -> str:
+    price = r"\N" if row.price is None else str(row.price)
+    return (
+        f"{row.gid}\t{row.quantity.name}\t{price}\t"
+        f"{row.recorded_at.isoformat()}\t{row.server_id}\n"
+    )
+
+
+def copy_rows(engine: Engine, rows: Iterable[PriceRow], chunk_size: int) -> int:
+    """COPY the rows by chunks in a single transaction, returns the rows copied."""
+    copied = 0
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        rows = iter(rows)
+        while chunk := list(itertools.islice(rows, chunk_size)):
+            buffer = io.StringIO("".join(map(to_copy_line, chunk)))
+            cursor.copy_expert(COPY_STATEMENT, buffer)
+            copied += len(chunk)
+        connection.commit()
+    finally:
+        connection.close()
+    return copied
+
+
+def generate_dataset(
+    engine: Engine,
+    rows: int,
+    server_ids: list[int],
+    seed: int = 0,
+    days: int = 60,
+    gids: list[int] | None = None,
+    end: datetime | None = None,
+    truncate: bool = False,
+    chunk_size: int = 100_000,
+) -> float:
+    """Insert the dataset and refresh the planner statistics, returns the seconds."""
+    started_at = time.perf_counter()
+    if truncate:
+        with engine.begin() as connection:
+            # the materialized rankings belonged to the previous dataset
+            connection.execute(
+                text(
+                    "TRUNCATE item_price_history, top_ranking, latest_item_price"
+                    " RESTART IDENTITY"
+                )
+            )
+    copy_rows(
+        engine,
+        generate_price_rows(
+            rows, gids or get_gids(), server_ids, seed=seed, days=days, end=end
+        ),
+        chunk_size,
+    )
+    # COPY bypasses bulk_insert, which maintains the latest prices
+    with SessionMaker(bind=engine) as session:
+        LatestItemPriceController.rebuild(session)
+    with engine.connect() as connection:
+        connection.execute(text("ANALYZE item_price_history, latest_item_price"))
+        connection.commit()
+    return time.perf_counter() - started_at
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    size = parser.add_mutually_exclusive_group(required=True)
+    size.add_argument("--scale", choices=SCALES, help="preset number of rows")
+    size.add_argument("--rows", type=int, help="exact number of rows")
+    parser.add_argument("--servers", type=int, nargs="+", default=[1])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--days", type=int, default=60, help="history window")
+    parser.add_argument("--items", type=int, help="number of synthetic items")
+    parser.add_argument(
+        "--end",
+        type=datetime.fromisoformat,
+        help="date of the most recent samples, now by default",
+    )
+    parser.add_argument(
+        "--truncate", action="store_true", help="empty item_price_history first"
+    )
+    args = parser.parse_args()
+
+    rows = args.rows or SCALES[args.scale]
+    elapsed = generate_dataset(
+        get_engine(),
+        rows,
+        args.servers,
+        seed=args.seed,
+        days=args.days,
+        gids=get_gids(args.items),
+        end=args.end,
+        truncate=args.truncate,
+    )
+    print(f"{rows} rows generated in {elapsed:.1f}s ({rows / elapsed:.0f} rows/s)")
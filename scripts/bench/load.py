@@ -0,0 +1,287 @@
+"""Replay a bot traffic mix against the API and report the throughput and latency
+percentiles of every route, to compare the capacity between commits.
+
+The requests are drawn at random from the routes of the mix, in proportion to their
+weight, and sent with at most `--concurrency` in flight. By default the `main:app`
+application is driven in process, with its lifespan and middlewares, through the
+ASGI transport; with `--base-url` a running server is loaded over HTTP instead.
+
+The weights are given with `--mix bulk_insert=60 evaluate_resell=20 ...`, or taken
+from the request counts of a production `/metrics` scrape, saved to a file or read
+from its url, with `--traffic`. The requests are built from the items with the most
+samples of the database configured in `.env`, and the bulk inserts are written to
+it: run against a bench database.
+
+    CATALOG_PROVIDER=synthetic python -m scripts.bench.load --requests 5000 \
+        --concurrency 32 --traffic metrics.txt --output load.json
+"""
+
+import argparse
+import asyncio
+import collections
+import json
+import random
+import time
+from datetime import datetime
+from typing import Callable, NamedTuple
+
+import httpx
+from prometheus_client.parser import text_string_to_metric_families
+
+from scripts.bench.multi_server import get_bench_gids, get_server_ids
+from scripts.bench.suite import get_git_revision
+from scripts.bench.utils import print_report, run_concurrently, summarize
+from src.catalog import DataReader
+from src.models.item_price_history import QuantityEnum
+
+
+class BenchData(NamedTuple):
+    server_ids: list[int]
+    gids: list[int]
+    type_id_by_gid: dict[int, int]
+
+
+class Route(NamedTuple):
+    method: str
+    path: str
+    # (params, json body) of a request
+    build: Callable[[random.Random, BenchData, argparse.Namespace], tuple[dict, object]]
+
+
+def build_bulk_insert(rng: random.Random, data: BenchData, args: argparse.Namespace):
+    # the price of every quantity of the item checked by a bot
+    gid, server_id = rng.choice(data.gids), rng.choice(data.server_ids)
+    return {}, [
+        {
+            "gid": gid,
+            "quantity": quantity.value,
+            # the quantities not on sale have no price
+            "price": rng.choice([None, rng.randint(1, 1_000_000)]),
+            "server_id": server_id,
+        }
+        for quantity in QuantityEnum
+    ]
+
+
+def build_evaluate_resell(
+    rng: random.Random, data: BenchData, args: argparse.Namespace
+):
+    return {
+        "gid": rng.choice(data.gids),
+        "observed_price": rng.randint(1, 1_000_000),
+        "server_id": rng.choice(data.server_ids),
+        "quantity": rng.choice(list(QuantityEnum)).value,
+    }, None
+
+
+def build_sales_speed(rng: random.Random, data: BenchData, args: argparse.Namespace):
+    return {"server_id": rng.choice(data.server_ids)}, rng.sample(
+        data.gids, min(args.batch_size, len(data.gids))
+    )
+
+
+def build_evolution_price(
+    rng: random.Random, data: BenchData, args: argparse.Namespace
+):
+    gid = rng.choice(data.gids)
+    return {
+        "server_id": rng.choice(data.server_ids),
+        "type_id": data.type_id_by_gid[gid],
+        "item_gid": gid,
+    }, None
+
+
+def build_top(rng: random.Random, data: BenchData, args: argparse.Namespace):
+    # the bots ask for the default ranking
+    return {"server_id": rng.choice(data.server_ids)}, None
+
+
+ROUTES = {
+    "bulk_insert": Route("POST", "/item_price_history/bulk_insert", build_bulk_insert),
+    "evaluate_resell": Route(
+        "GET", "/item_price_history/evaluate_resell", build_evaluate_resell
+    ),
+    "get_sales_speed": Route(
+        "POST", "/item_price_history/get_sales_speed", build_sales_speed
+    ),
+    "evolution_price": Route(
+        "GET", "/item_price_history/evolution_price", build_evolution_price
+    ),
+    "top_profitable_items": Route(
+        "GET", "/item_price_history/top_profitable_items", build_top
+    ),
+    "top_profitable_crafts": Route(
+        "GET", "/item_price_history/top_profitable_crafts", build_top
+    ),
+}
+
+# the bots mostly report the prices they check
+DEFAULT_MIX: dict[str, float] = {
+    "bulk_insert": 50,
+    "evaluate_resell": 20,
+    "get_sales_speed": 10,
+    "evolution_price": 10,
+    "top_profitable_items": 5,
+    "top_profitable_crafts": 5,
+}
+
+
+def parse_mix(items: list[str]) -> dict[str, float]:
+    """name=weight items, the routes not given are not requested."""
+    mix = {}
+    for item in items:
+        name, _, weight = item.partition("=")
+        if name not in ROUTES:
+            raise ValueError(f"unknown route {name}, expected one of {list(ROUTES)}")
+        mix[name] = float(weight)
+    return mix
+
+
+def get_recorded_mix(metrics_text: str) -> dict[str, float]:
+    """Requests served by each route of the mix, from the counts of the
+    http_request_duration_seconds histogram of a Prometheus scrape."""
+    name_by_route = {(route.method, route.path): name for name, route in ROUTES.items()}
+    mix: dict[str, float] = collections.defaultdict(float)
+    for family in text_string_to_metric_families(metrics_text):
+        if family.name != "http_request_duration_seconds":
+            continue
+        for sample in family.samples:
+            key = (sample.labels.get("method"), sample.labels.get("route"))
+            if sample.name.endswith("_count") and key in name_by_route:
+                mix[name_by_route[key]] += sample.value
+    return dict(mix)
+
+
+def read_traffic(source: str) -> str:
+    if source.startswith(("http://", "https://")):
+        return httpx.get(source).raise_for_status().text
+    with open(source) as file:
+        return file.read()
+
+
+def get_bench_data(server_ids: list[int] | None, items: int) -> BenchData:
+    gids = get_bench_gids(items)
+    item_by_id = DataReader().item_by_id
+    return BenchData(
+        server_ids=server_ids or get_server_ids(),
+        gids=gids,
+        type_id_by_gid={
+            gid: item_by_id[gid].typeId if gid in item_by_id else 0 for gid in gids
+        },
+    )
+
+
+async def replay(
+    client: httpx.AsyncClient,
+    mix: dict[str, float],
+    data: BenchData,
+    args: argparse.Namespace,
+    rng: random.Random,
+    requests: int,
+) -> dict[str, dict]:
+    """Send `requests` requests drawn from the mix, returns the report by route."""
+    names = rng.choices(list(mix), weights=list(mix.values()), k=requests)
+    latencies_by_route: dict[str, list[float]] = {name: [] for name in mix}
+    errors_by_route: dict[str, int] = collections.Counter()
+
+    def make_call(name: str):
+        route = ROUTES[name]
+        params, body = route.build(rng, data, args)
+
+        async def call() -> bool:
+            started_at = time.perf_counter()
+            response = await client.request(
+                route.method, route.path, params=params, json=body
+            )
+            latencies_by_route[name].append(time.perf_counter() - started_at)
+            if not response.is_success:
+                errors_by_route[name] += 1
+            return response.is_success
+
+        return call
+
+    latencies, errors, elapsed = await run_concurrently(
+        [make_call(name) for name in names], args.concurrency
+    )
+    report = {
+        name: summarize(latencies_by_route[name], elapsed, errors_by_route[name])
+        for name in mix
+    }
+    report["total"] = summarize(latencies, elapsed, errors)
+    return report
+
+
+async def main(args: argparse.Namespace):
+    if args.traffic is not None:
+        mix = get_recorded_mix(read_traffic(args.traffic))
+        if not mix:
+            raise ValueError(f"no request of the mix routes in {args.traffic}")
+    elif args.mix:
+        mix = parse_mix(args.mix)
+    else:
+        mix = DEFAULT_MIX
+    data = get_bench_data(args.servers, args.items)
+    rng = random.Random(args.seed)
+
+    async def run(client: httpx.AsyncClient) -> dict[str, dict]:
+        if args.warmup:
+            await replay(client, mix, data, args, rng, args.warmup)
+        return await replay(client, mix, data, args, rng, args.requests)
+
+    if args.base_url is not None:
+        async with httpx.AsyncClient(base_url=args.base_url, timeout=None) as client:
+            report = await run(client)
+    else:
+        # imported only when served in process, it loads the catalogs
+        from main import app
+
+        # a failing route is reported as an error, not raised
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        async with app.router.lifespan_context(app):
+            async with httpx.AsyncClient(
+                transport=transport, base_url="http://bench", timeout=None
+            ) as client:
+                report = await run(client)
+
+    print_report(report)
+    if args.output is not None:
+        total = sum(mix.values())
+        with open(args.output, "w") as file:
+            json.dump(
+                {
+                    "meta": {
+                        "started_at": datetime.now().isoformat(),
+                        "git_revision": get_git_revision(),
+                        "target": args.base_url or "in process",
+                        "mix": {name: weight / total for name, weight in mix.items()},
+                        "requests": args.requests,
+                        "concurrency": args.concurrency,
+                        "seed": args.seed,
+                    },
+                    "routes": report,
+                },
+                file,
+                indent=2,
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=2_000)
+    parser.add_argument("--warmup", type=int, default=100, help="requests not timed")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--mix", nargs="+", help="route=weight, see ROUTES")
+    parser.add_argument(
+        "--traffic", help="Prometheus /metrics scrape, file or url, to take the mix of"
+    )
+    parser.add_argument("--base-url", help="load a running server instead of main:app")
+    parser.add_argument("--servers", type=int, nargs="+")
+    parser.add_argument(
+        "--items", type=int, default=200, help="items with the most samples requested"
+    )
+    parser.add_argument(
+        "--batch-size", type=int, default=10, help="items per sales speed query"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the json report to this path")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,110 @@
+"""Compare the multi-server analytics, computed from one query grouped by server,
+with one call per server, on the prices of the database configured in `.env`.
+
+The servers default to every server having prices. Both variants are checked to
+return the same results before being timed.
+
+    python -m scripts.bench.multi_server --servers 1 3 7 --repeat 5
+"""
+
+import argparse
+import time
+
+from sqlalchemy import distinct, func, select
+
+from scripts.bench.utils import print_report, summarize
+from src.controllers.item_price_history import ItemPriceHistoryController
+from src.database import SessionMaker, get_engine
+from src.models.item_price_history import ItemPriceHistory, QuantityEnum
+
+
+def get_server_ids() -> list[int]:
+    with get_engine().connect() as connection:
+        return list(
+            connection.scalars(
+                select(distinct(ItemPriceHistory.server_id)).order_by(
+                    ItemPriceHistory.server_id
+                )
+            )
+        )
+
+
+def get_bench_gids(count: int) -> list[int]:
+    """The items with the most samples, across the servers."""
+    with get_engine().connect() as connection:
+        return list(
+            connection.scalars(
+                select(ItemPriceHistory.gid)
+                .group_by(ItemPriceHistory.gid)
+                .order_by(func.count().desc())
+                .limit(count)
+            )
+        )
+
+
+def get_cases(server_ids: list[int], gids: list[int], lookback_days: int) -> dict:
+    """name -> (one call per server, grouped call), both returning by server."""
+    quantity = QuantityEnum.HUNDRED
+    return {
+        "top_profitable_items": (
+            lambda session: {
+                server_id: ItemPriceHistoryController.get_top_profitable_items(
+                    session, server_id, quantity, lookback_days
+                )
+                for server_id in server_ids
+            },
+            lambda session: (
+                ItemPriceHistoryController.get_top_profitable_items_by_server(
+                    session, server_ids, quantity, lookback_days
+                )
+            ),
+        ),
+        "get_sales_speed": (
+            lambda session: {
+                server_id: ItemPriceHistoryController.get_sales_speed_from_prices(
+                    session, quantity, server_id, gids
+                )
+                for server_id in server_ids
+            },
+            lambda session: ItemPriceHistoryController.get_sales_speed_by_server(
+                session, quantity, server_ids, gids
+            ),
+        ),
+    }
+
+
+def time_calls(call, repeat: int) -> dict:
+    latencies = []
+    started_at = time.perf_counter()
+    with SessionMaker(bind=get_engine()) as session:
+        for _ in range(repeat):
+            call_started_at = time.perf_counter()
+            call(session)
+            latencies.append(time.perf_counter() - call_started_at)
+            session.rollback()
+    return summarize(latencies, time.perf_counter() - started_at)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--servers", type=int, nargs="+")
+    parser.add_argument("--gids", type=int, default=500)
+    parser.add_argument("--lookback-days", type=int, default=30)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="write the json report to this path")
+    args = parser.parse_args()
+
+    server_ids = args.servers or get_server_ids()
+    cases = get_cases(server_ids, get_bench_gids(args.gids), args.lookback_days)
+    report = {}
+    for name, (sequential, grouped) in cases.items():
+        with SessionMaker(bind=get_engine()) as session:
+            if sequential(session) != grouped(session):
+                raise AssertionError(f"{name}: the grouped results differ")
+        report[f"{name} {len(server_ids)} servers sequential"] = time_calls(
+            sequential, args.repeat
+        )
+        report[f"{name} {len(server_ids)} servers grouped"] = time_calls(
+            grouped, args.repeat
+        )
+    print_report(report, args.output)
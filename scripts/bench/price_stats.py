@@ -0,0 +1,87 @@
+"""Compare the NumPy grouped statistics with the equivalent Python loops, on the
+synthetic price rows, without database.
+
+Each case times the grouping alone ("columns" already loaded) and with the
+conversion of the rows as returned by a cursor ("rows").
+
+    python -m scripts.bench.price_stats --rows 1000000 3000000 --items 20000
+"""
+
+import argparse
+import time
+from datetime import datetime
+
+from scripts.bench.utils import print_report, summarize
+from src.price_stats import PriceColumns, group_price_stats
+from src.synthetic.prices import generate_price_rows
+
+
+def python_group_price_stats(rows: list[tuple[int, int]], min_count: int) -> dict:
+    """Same statistics as `group_price_stats`, with the loops the rankings used."""
+    prices_by_gid: dict[int, list[int]] = {}
+    for gid, price in rows:
+        if gid not in prices_by_gid:
+            prices_by_gid[gid] = []
+        prices_by_gid[gid].append(price)
+
+    stats = {}
+    for gid, prices in prices_by_gid.items():
+        if len(prices) < min_count:
+            continue
+        count = len(prices)
+        mean = sum(prices) / count
+        variance = sum((price - mean) ** 2 for price in prices) / count
+        ordered = sorted(prices)
+        median = (ordered[(count - 1) // 2] + ordered[count // 2]) / 2
+        stats[gid] = (count, mean, min(prices), max(prices), variance**0.5, median)
+    return stats
+
+
+def time_calls(call, repeat: int) -> dict:
+    latencies = []
+    started_at = time.perf_counter()
+    for _ in range(repeat):
+        call_started_at = time.perf_counter()
+        call()
+        latencies.append(time.perf_counter() - call_started_at)
+    return summarize(latencies, time.perf_counter() - started_at)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000_000])
+    parser.add_argument("--items", type=int, default=20_000)
+    parser.add_argument("--min-samples", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="write the json report to this path")
+    args = parser.parse_args()
+
+    report = {}
+    for count in args.rows:
+        rows = [
+            (row.gid, row.price)
+            for row in generate_price_rows(
+                count,
+                list(range(1, args.items + 1)),
+                [1],
+                end=datetime(2026, 1, 1),
+                missing_price_ratio=0,
+            )
+            if row.price is not None
+        ]
+        columns = PriceColumns.from_rows(rows)
+        cases = {
+            "python": lambda: python_group_price_stats(rows, args.min_samples),
+            "numpy rows": lambda: group_price_stats(
+                PriceColumns.from_rows(rows), args.min_samples, with_medians=True
+            ),
+            "numpy columns": lambda: group_price_stats(
+                columns, args.min_samples, with_medians=True
+            ),
+            "numpy columns, no medians": lambda: group_price_stats(
+                columns, args.min_samples
+            ),
+        }
+        for name, call in cases.items():
+            report[f"{count} {name}"] = time_calls(call, args.repeat)
+    print_report(report, args.output)
@@ -0,0 +1,171 @@
+"""Compare the serialization of the large list responses through the pydantic
+response_model with the msgspec Structs encoded by MsgspecJSONResponse.
+
+"pydantic" builds the schemas like the controllers did, then runs what FastAPI does
+with a response_model: validation of the content, dump in json mode and
+`json.dumps` by JSONResponse. "msgspec" builds the Structs and encodes them.
+
+    python -m scripts.bench.serialization --rows 1000 100000 1000000
+"""
+
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, TypeAdapter
+
+from scripts.bench.utils import print_report, summarize
+from src.models.item_price_history import QuantityEnum
+from src.responses import MsgspecJSONResponse
+from src.schemas.item_price_history import (
+    IngredientDetailSchema,
+    IngredientDetailStruct,
+    ProfitableCraftSchema,
+    ProfitableCraftStruct,
+    ProfitableItemSchema,
+    ProfitableItemStruct,
+    ReadItemPriceHistorySchema,
+    ReadItemPriceHistoryStruct,
+)
+
+
+def generate_fields(kind: str, count: int, seed: int = 0) -> list[dict]:
+    """Fields of `count` rows of the response `kind`, as a controller builds them."""
+    rng = random.Random(seed)
+    start = datetime(2026, 1, 1)
+    if kind == "evolution_price":
+        return [
+            {
+                "name": f"Item {rng.randint(1, 20_000)}",
+                "quantity": rng.choice(list(QuantityEnum)),
+                "price": rng.choice([None, rng.randint(1, 1_000_000)]),
+                "recorded_at": start + timedelta(seconds=index),
+            }
+            for index in range(count)
+        ]
+    if kind == "top_profitable_items":
+        return [
+            {
+                "gid": rng.randint(1, 20_000),
+                "name": f"Item {index}",
+                "avg_price": round(rng.uniform(1, 1e6), 2),
+                "min_price": float(rng.randint(1, 1000)),
+                "max_price": float(rng.randint(1000, 1_000_000)),
+                "profit_potential": round(rng.uniform(1, 1e6), 2),
+                "profit_margin_pct": round(rng.uniform(1, 1e4), 2),
+                "profitability_score": round(rng.uniform(1, 1e9), 2),
+                "volatility": round(rng.uniform(1, 1e5), 2),
+                "samples": rng.randint(5, 10_000),
+            }
+            for index in range(count)
+        ]
+    return [
+        {
+            "result_id": rng.randint(1, 20_000),
+            "result_name": f"Item {index}",
+            "sell_price": round(rng.uniform(1, 1e6), 2),
+            "craft_cost": round(rng.uniform(1, 1e6), 2),
+            "profit": round(rng.uniform(1, 1e6), 2),
+            "profit_margin_pct": round(rng.uniform(1, 1e4), 2),
+            "ingredients": [
+                {
+                    "id": rng.randint(1, 20_000),
+                    "name": f"Item {ingredient}",
+                    "quantity": rng.randint(1, 10),
+                    "unit_price": round(rng.uniform(1, 1e5), 2),
+                    "total_price": round(rng.uniform(1, 1e6), 2),
+                }
+                for ingredient in range(rng.randint(1, 8))
+            ],
+            "samples": rng.randint(5, 10_000),
+        }
+        for index in range(count)
+    ]
+
+
+def build_schema(kind: str, fields: dict) -> BaseModel:
+    if kind == "evolution_price":
+        return ReadItemPriceHistorySchema(**fields)
+    if kind == "top_profitable_items":
+        return ProfitableItemSchema(**fields)
+    return ProfitableCraftSchema(
+        **{
+            **fields,
+            "ingredients": [
+                IngredientDetailSchema(**ingredient)
+                for ingredient in fields["ingredients"]
+            ],
+        }
+    )
+
+
+def build_struct(kind: str, fields: dict):
+    if kind == "evolution_price":
+        return ReadItemPriceHistoryStruct(**fields)
+    if kind == "top_profitable_items":
+        return ProfitableItemStruct(**fields)
+    return ProfitableCraftStruct(
+        **{
+            **fields,
+            "ingredients": [
+                IngredientDetailStruct(**ingredient)
+                for ingredient in fields["ingredients"]
+            ],
+        }
+    )
+
+
+ADAPTERS: dict[str, TypeAdapter] = {
+    "evolution_price": TypeAdapter(list[ReadItemPriceHistorySchema]),
+    "top_profitable_items": TypeAdapter(list[ProfitableItemSchema]),
+    "top_profitable_crafts": TypeAdapter(list[ProfitableCraftSchema]),
+}
+
+
+def pydantic_response(kind: str, rows: list[dict]) -> bytes:
+    content = [build_schema(kind, fields) for fields in rows]
+    adapter = ADAPTERS[kind]
+    validated = adapter.validate_python(content, from_attributes=True)
+    return JSONResponse(adapter.dump_python(validated, mode="json")).body
+
+
+def msgspec_response(kind: str, rows: list[dict]) -> bytes:
+    return MsgspecJSONResponse([build_struct(kind, fields) for fields in rows]).body
+
+
+def time_calls(call, repeat: int) -> dict:
+    latencies = []
+    started_at = time.perf_counter()
+    for _ in range(repeat):
+        call_started_at = time.perf_counter()
+        call()
+        latencies.append(time.perf_counter() - call_started_at)
+    return summarize(latencies, time.perf_counter() - started_at)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--rows", type=int, nargs="+", default=[1_000, 100_000, 1_000_000]
+    )
+    parser.add_argument(
+        "--kinds", nargs="+", choices=list(ADAPTERS), default=list(ADAPTERS)
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="write the json report to this path")
+    args = parser.parse_args()
+
+    report = {}
+    for kind in args.kinds:
+        for count in args.rows:
+            rows = generate_fields(kind, count)
+            for name, serialize in (
+                ("pydantic", pydantic_response),
+                ("msgspec", msgspec_response),
+            ):
+                report[f"{kind} {count} {name}"] = time_calls(
+                    lambda: serialize(kind, rows), args.repeat
+                )
+    print_report(report, args.output)
@@ -0,0 +1,202 @@
+"""Compare the hot controller queries built as plain Core statements, as they were,
+with their cached lambda statement forms.
+
+"compile" times what SQLAlchemy does in Python before sending a query whose
+compiled form is already cached: build the statement, compute its cache key, look
+the compiled form up and bind the parameters (expanding the IN lists). "execute"
+also runs the queries on the database configured in `.env` through the async
+engine, with item lists of varying length: an expanding IN renders a new SQL text
+per length, prepared again by asyncpg, a bound array keeps a single one.
+
+    python -m scripts.bench.statements --repeat 10000
+    python -m scripts.bench.statements --execute --repeat 200
+"""
+
+import argparse
+import asyncio
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Callable
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects import postgresql
+
+from scripts.bench.utils import print_report, summarize
+from src.controllers.change_version import ChangeVersionController
+from src.controllers.item_price_history import ItemPriceHistoryController
+from src.database import AsyncSessionMaker, get_async_engine
+from src.models.item_price_history import ItemPriceHistory, QuantityEnum
+from src.models.server_change_version import ServerChangeVersion
+
+SERVER_ID = 1
+
+
+def plain_version(session, server_id: int, gids: list[int]):
+    return select(ServerChangeVersion.version).filter(
+        ServerChangeVersion.server_id == server_id
+    )
+
+
+def plain_next_version(session, server_id: int, gids: list[int]):
+    return ChangeVersionController._increment_version(
+        postgresql.insert(ServerChangeVersion), server_id
+    )
+
+
+def plain_resell_prices(session, server_id: int, gids: list[int]):
+    return (
+        select(ItemPriceHistory.price)
+        .filter(
+            ItemPriceHistory.gid == gids[0],
+            ItemPriceHistory.server_id == server_id,
+            ItemPriceHistory.recorded_at >= datetime.now() - timedelta(days=30),
+            ItemPriceHistory.price.isnot(None),
+            ItemPriceHistory.quantity == QuantityEnum.HUNDRED,
+        )
+        .order_by(ItemPriceHistory.recorded_at.desc())
+    )
+
+
+def plain_sales_speed(session, server_id: int, gids: list[int]):
+    return ItemPriceHistoryController._sales_speed_select(
+        QuantityEnum.HUNDRED,
+        ItemPriceHistory.server_id.in_([server_id]),
+        ItemPriceHistory.gid.in_(gids),
+    )
+
+
+def cached_version(session, server_id: int, gids: list[int]):
+    return ChangeVersionController._version_statement(server_id)
+
+
+def cached_next_version(session, server_id: int, gids: list[int]):
+    return ChangeVersionController._next_version_statement(session, server_id)
+
+
+def cached_resell_prices(session, server_id: int, gids: list[int]):
+    return ItemPriceHistoryController._resell_prices_statement(
+        gids[0], QuantityEnum.HUNDRED, server_id, 30
+    )
+
+
+def cached_sales_speed(session, server_id: int, gids: list[int]):
+    return ItemPriceHistoryController._sales_speed_statement(
+        QuantityEnum.HUNDRED, [server_id], gids
+    )
+
+
+STATEMENTS: dict[str, dict[str, Callable]] = {
+    "version": {"plain": plain_version, "cached": cached_version},
+    "next_version": {"plain": plain_next_version, "cached": cached_next_version},
+    "resell_prices": {"plain": plain_resell_prices, "cached": cached_resell_prices},
+    "sales_speed": {"plain": plain_sales_speed, "cached": cached_sales_speed},
+}
+
+
+def compile_cached(statement, dialect, cache: dict):
+    """What the connection does before executing an already compiled statement."""
+    compiled, extracted, _ = statement._compile_w_cache(
+        dialect=dialect,
+        compiled_cache=cache,
+        column_keys=[],
+        for_executemany=False,
+        schema_translate_map=None,
+        linting=0,
+    )
+    parameters = compiled.construct_params(
+        extracted_parameters=extracted, escape_names=False, _no_postcompile=True
+    )
+    if compiled.post_compile_params:
+        compiled._process_parameters_for_postcompile(parameters)
+    return compiled
+
+
+def bench_compile(
+    build: Callable, gid_lists: list[list[int]], dialect, repeat: int
+) -> dict:
+    cache: dict = {}
+    # never connected, only gives the upsert of its PostgreSQL engine
+    session = AsyncSessionMaker(bind=get_async_engine())
+    for gids in gid_lists:
+        compile_cached(build(session, SERVER_ID, gids), dialect, cache)
+    latencies = []
+    started_at = time.perf_counter()
+    for index in range(repeat):
+        call_started_at = time.perf_counter()
+        compile_cached(
+            build(session, SERVER_ID, gid_lists[index % len(gid_lists)]), dialect, cache
+        )
+        latencies.append(time.perf_counter() - call_started_at)
+    return summarize(latencies, time.perf_counter() - started_at)
+
+
+async def bench_execute(
+    build: Callable, gid_lists: list[list[int]], repeat: int
+) -> dict:
+    latencies = []
+    async with AsyncSessionMaker(bind=get_async_engine()) as session:
+        started_at = time.perf_counter()
+        for index in range(repeat):
+            call_started_at = time.perf_counter()
+            await session.execute(
+                build(session, SERVER_ID, gid_lists[index % len(gid_lists)])
+            )
+            latencies.append(time.perf_counter() - call_started_at)
+        elapsed = time.perf_counter() - started_at
+        # the version increments are not kept
+        await session.rollback()
+    # the connections belong to this event loop
+    await get_async_engine().dispose()
+    return summarize(latencies, elapsed)
+
+
+async def get_bench_gids(count: int) -> list[int]:
+    async with AsyncSessionMaker(bind=get_async_engine()) as session:
+        gids = list(
+            await session.scalars(
+                select(ItemPriceHistory.gid)
+                .filter(ItemPriceHistory.server_id == SERVER_ID)
+                .group_by(ItemPriceHistory.gid)
+                .order_by(func.count().desc())
+                .limit(count)
+            )
+        )
+    await get_async_engine().dispose()
+    return gids
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--statements", nargs="+", choices=list(STATEMENTS), default=list(STATEMENTS)
+    )
+    parser.add_argument("--repeat", type=int, default=10_000)
+    parser.add_argument(
+        "--max-items", type=int, default=50, help="longest item list of a query"
+    )
+    parser.add_argument("--execute", action="store_true")
+    parser.add_argument("--output", help="write the json report to this path")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    gids = (
+        asyncio.run(get_bench_gids(args.max_items))
+        if args.execute
+        else list(range(10_000, 10_000 + args.max_items))
+    )
+    gid_lists = [rng.sample(gids, rng.randint(1, len(gids))) for _ in range(100)]
+    dialect = get_async_engine().dialect
+
+    report = {}
+    for name in args.statements:
+        for form, build in STATEMENTS[name].items():
+            if args.execute:
+                report[f"{name} {form}"] = asyncio.run(
+                    bench_execute(build, gid_lists, args.repeat)
+                )
+            else:
+                report[f"{name} {form}"] = bench_compile(
+                    build, gid_lists, dialect, args.repeat
+                )
+    print_report(report, args.output)
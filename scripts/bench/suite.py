@@ -0,0 +1,256 @@
+"""Time every ItemPriceHistoryController method and API route at several dataset
+scales, and write a json report to compare runs.
+
+For each scale, the database configured in `.env` is refilled by the seeded
+generator (the item_price_history table is truncated), then each case runs
+`--repeat` times.
+
+The crafts and catalog paths depend on the game catalog, set CATALOG_PROVIDER to
+"synthetic" to bench them without D3Database (sized by SYNTHETIC_CATALOG_*).
+
+    CATALOG_PROVIDER=synthetic python -m scripts.bench.suite --scales 10k 1m \
+        --output bench.json
+"""
+
+import argparse
+import asyncio
+import json
+import platform
+import subprocess
+import time
+from datetime import datetime
+from typing import Callable
+
+import httpx
+from fastapi import FastAPI
+from sqlalchemy import func, select
+
+from scripts.bench.generate import generate_dataset, get_gids
+from scripts.bench.utils import print_report, run_concurrently, summarize
+from src.catalog import DataReader
+from src.controllers.item_price_history import ItemPriceHistoryController
+from src.database import SessionMaker, get_engine
+from src.models.item_price_history import ItemPriceHistory, QuantityEnum
+from src.routers import character, data_center, item_price_history
+from src.schemas.item_price_history import CreateItemPriceHistorySchema
+from src.synthetic.prices import SCALES
+
+SERVER_ID = 1
+
+
+def build_app() -> FastAPI:
+    app = FastAPI()
+    app.include_router(item_price_history.router)
+    app.include_router(data_center.router)
+    app.include_router(character.router)
+    return app
+
+
+def get_bench_gid() -> int:
+    """The item with the most samples, the heaviest case of the per item queries."""
+    with get_engine().connect() as connection:
+        return connection.execute(
+            select(ItemPriceHistory.gid)
+            .filter(ItemPriceHistory.server_id == SERVER_ID)
+            .group_by(ItemPriceHistory.gid)
+            .order_by(func.count().desc())
+            .limit(1)
+        ).scalar_one()
+
+
+def get_method_cases(gid: int, type_id: int) -> dict[str, Callable]:
+    payloads = [
+        CreateItemPriceHistorySchema(
+            gid=gid, quantity=quantity, price=1_000, server_id=SERVER_ID
+        )
+        for quantity in QuantityEnum
+    ]
+    return {
+        "bulk_insert": lambda session: ItemPriceHistoryController.bulk_insert(
+            session, payloads
+        ),
+        "get_sales_speed_from_prices": lambda session: (
+            ItemPriceHistoryController.get_sales_speed_from_prices(
+                session, QuantityEnum.HUNDRED, SERVER_ID, [gid]
+            )
+        ),
+        "get_evolution_price": lambda session: list(
+            ItemPriceHistoryController.get_evolution_price(
+                session, QuantityEnum.HUNDRED, SERVER_ID, type_id, gid
+            )
+        ),
+        "is_price_resell_profitable": lambda session: (
+            ItemPriceHistoryController.is_price_resell_profitable(
+                session, gid, None, SERVER_ID, 1_000
+            )
+        ),
+        "get_top_profitable_items": lambda session: (
+            ItemPriceHistoryController.get_top_profitable_items(session, SERVER_ID)
+        ),
+        "get_top_profitable_crafts": lambda session: (
+            ItemPriceHistoryController.get_top_profitable_crafts(session, SERVER_ID)
+        ),
+    }
+
+
+def get_route_cases(gid: int, type_id: int) -> dict[str, tuple[str, str, dict | list]]:
+    """name -> (method, url, params or json body)"""
+    return {
+        "POST /item_price_history/bulk_insert": (
+            "POST",
+            "/item_price_history/bulk_insert",
+            [
+                {
+                    "gid": gid,
+                    "quantity": quantity,
+                    "price": 1_000,
+                    "server_id": SERVER_ID,
+                }
+                for quantity in QuantityEnum
+            ],
+        ),
+        "POST /item_price_history/get_sales_speed": (
+            "POST",
+            f"/item_price_history/get_sales_speed?server_id={SERVER_ID}",
+            [gid],
+        ),
+        "GET /item_price_history/evolution_price": (
+            "GET",
+            "/item_price_history/evolution_price",
+            {"server_id": SERVER_ID, "type_id": type_id, "item_gid": gid},
+        ),
+        "GET /item_price_history/evaluate_resell": (
+            "GET",
+            "/item_price_history/evaluate_resell",
+            {"gid": gid, "observed_price": 1_000, "server_id": SERVER_ID},
+        ),
+        "GET /item_price_history/top_profitable_items": (
+            "GET",
+            "/item_price_history/top_profitable_items",
+            {"server_id": SERVER_ID},
+        ),
+        "GET /item_price_history/top_profitable_crafts": (
+            "GET",
+            "/item_price_history/top_profitable_crafts",
+            {"server_id": SERVER_ID},
+        ),
+        "GET /character/mule_accept_bank_ids": (
+            "GET",
+            "/character/mule_accept_bank_ids",
+            {"server_id": SERVER_ID},
+        ),
+        "GET /data_center/item": ("GET", "/data_center/item", {"type_id": type_id}),
+    }
+
+
+def bench_methods(cases: dict[str, Callable], repeat: int) -> dict[str, dict]:
+    report = {}
+    for name, case in cases.items():
+        latencies = []
+        errors = 0
+        started_at = time.perf_counter()
+        for _ in range(repeat):
+            with SessionMaker(bind=get_engine()) as session:
+                call_started_at = time.perf_counter()
+                try:
+                    case(session)
+                except Exception:
+                    errors += 1
+                latencies.append(time.perf_counter() - call_started_at)
+        report[name] = summarize(latencies, time.perf_counter() - started_at, errors)
+    return report
+
+
+async def bench_routes(
+    app: FastAPI,
+    cases: dict[str, tuple[str, str, dict | list]],
+    repeat: int,
+    concurrency: int,
+) -> dict[str, dict]:
+    report = {}
+    # a failing route is reported as an error, not raised
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench", timeout=None
+    ) as client:
+        for name, (method, url, data) in cases.items():
+
+            async def call(method=method, url=url, data=data) -> bool:
+                if method == "GET":
+                    response = await client.get(url, params=data)
+                else:
+                    response = await client.request(method, url, json=data)
+                return response.is_success
+
+            latencies, errors, elapsed = await run_concurrently(
+                (call for _ in range(repeat)), concurrency
+            )
+            report[name] = summarize(latencies, elapsed, errors)
+    return report
+
+
+def get_git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def main(args: argparse.Namespace):
+    gids = get_gids(args.items)
+    app = build_app()
+    report = {
+        "meta": {
+            "started_at": datetime.now().isoformat(),
+            "git_revision": get_git_revision(),
+            "python": platform.python_version(),
+            "seed": args.seed,
+            "servers": args.servers,
+            "repeat": args.repeat,
+            "concurrency": args.concurrency,
+        },
+        "scales": {},
+    }
+    for scale in args.scales:
+        rows = SCALES[scale]
+        generated_in = generate_dataset(
+            get_engine(),
+            rows,
+            list(range(SERVER_ID, SERVER_ID + args.servers)),
+            seed=args.seed,
+            gids=gids,
+            truncate=True,
+        )
+        gid = get_bench_gid()
+        item = DataReader().item_by_id.get(gid)
+        type_id = item.typeId if item is not None else 0
+        methods = bench_methods(get_method_cases(gid, type_id), args.repeat)
+        routes = await bench_routes(
+            app, get_route_cases(gid, type_id), args.repeat, args.concurrency
+        )
+        report["scales"][scale] = {
+            "rows": rows,
+            "generation_s": round(generated_in, 3),
+            "methods": methods,
+            "routes": routes,
+        }
+        print(f"\n{scale} ({rows} rows, generated in {generated_in:.1f}s)")
+        print_report(methods | routes)
+
+    if args.output is not None:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--scales", nargs="+", choices=SCALES, default=["10k", "100k"])
+    parser.add_argument("--servers", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--items", type=int, help="number of synthetic items")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--output", help="write the json report to this path")
+    asyncio.run(main(parser.parse_args()))
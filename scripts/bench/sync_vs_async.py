@@ -0,0 +1,96 @@
+"""Compare sync and async route handlers latency under the same workload.
+
+Both apps run the same controller queries against the database configured in
+`.env`, the sync one through the threadpool with `session_local`, the async one
+through the real routers with `async_session_local`.
+
+    python -m scripts.bench.sync_vs_async --server-id 1 --gid 289 --concurrency 200
+"""
+
+import argparse
+import asyncio
+
+import httpx
+from fastapi import Depends, FastAPI
+from sqlalchemy.orm import Session
+
+from scripts.bench.utils import print_report, run_concurrently, summarize
+from src.controllers.item_price_history import ItemPriceHistoryController
+from src.database import session_local
+from src.routers import item_price_history
+
+
+def build_sync_app() -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/item_price_history/evaluate_resell")
+    def evaluate_resell(
+        gid: int,
+        observed_price: float,
+        server_id: int,
+        session: Session = Depends(session_local),
+    ):
+        return ItemPriceHistoryController.is_price_resell_profitable(
+            session, gid, None, server_id, observed_price
+        )
+
+    @app.get("/item_price_history/top_profitable_items")
+    def get_top_profitable_items(
+        server_id: int, session: Session = Depends(session_local)
+    ):
+        return ItemPriceHistoryController.get_top_profitable_items(session, server_id)
+
+    return app
+
+
+def build_async_app() -> FastAPI:
+    app = FastAPI()
+    app.include_router(item_price_history.router)
+    return app
+
+
+async def bench(app: FastAPI, args: argparse.Namespace) -> dict[str, dict]:
+    transport = httpx.ASGITransport(app=app)
+    routes = {
+        "evaluate_resell": (
+            "/item_price_history/evaluate_resell",
+            {"gid": args.gid, "observed_price": 1, "server_id": args.server_id},
+        ),
+        "top_profitable_items": (
+            "/item_price_history/top_profitable_items",
+            {"server_id": args.server_id},
+        ),
+    }
+    report = {}
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench", timeout=None
+    ) as client:
+        for name, (url, params) in routes.items():
+
+            async def call(url=url, params=params) -> bool:
+                response = await client.get(url, params=params)
+                return response.status_code == 200
+
+            latencies, errors, elapsed = await run_concurrently(
+                (call for _ in range(args.requests)), args.concurrency
+            )
+            report[name] = summarize(latencies, elapsed, errors)
+    return report
+
+
+async def main(args: argparse.Namespace):
+    report = {}
+    for mode, app in (("sync", build_sync_app()), ("async", build_async_app())):
+        for route, row in (await bench(app, args)).items():
+            report[f"{mode}:{route}"] = row
+    print_report(report, args.output)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--server-id", type=int, required=True)
+    parser.add_argument("--gid", type=int, required=True)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--output", help="write the json report to this path")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,70 @@
+import asyncio
+import json
+import math
+import time
+from typing import Awaitable, Callable, Iterable
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    """Nearest-rank percentile, `samples` must be sorted."""
+    if not samples:
+        return 0.0
+    rank = max(math.ceil(pct / 100 * len(samples)) - 1, 0)
+    return samples[rank]
+
+
+def summarize(latencies: list[float], elapsed: float, errors: int = 0) -> dict:
+    """Latencies are in seconds, the report is in milliseconds."""
+    ordered = sorted(latencies)
+    return {
+        "requests": len(ordered),
+        "errors": errors,
+        "throughput_rps": round(len(ordered) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(ordered, 50) * 1000, 3),
+        "p95_ms": round(percentile(ordered, 95) * 1000, 3),
+        "p99_ms": round(percentile(ordered, 99) * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3) if ordered else 0.0,
+    }
+
+
+async def run_concurrently(
+    calls: Iterable[Callable[[], Awaitable[bool]]], concurrency: int
+) -> tuple[list[float], int, float]:
+    """Run `calls` with at most `concurrency` in flight.
+
+    Each call returns whether it succeeded, returns (latencies, errors, elapsed).
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+    for call in calls:
+        queue.put_nowait(call)
+
+    latencies: list[float] = []
+    errors = 0
+
+    async def worker():
+        nonlocal errors
+        while not queue.empty():
+            call = queue.get_nowait()
+            start = time.perf_counter()
+            ok = await call()
+            latencies.append(time.perf_counter() - start)
+            if not ok:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, errors, time.perf_counter() - start
+
+
+def print_report(report: dict[str, dict], output: str | None = None):
+    columns = ["requests", "errors", "throughput_rps", "p50_ms", "p95_ms", "p99_ms"]
+    width = max((len(name) for name in report), default=0) + 2
+    print("".ljust(width) + "".join(column.rjust(16) for column in columns))
+    for name, row in report.items():
+        print(
+            name.ljust(width)
+            + "".join(str(row[column]).rjust(16) for column in columns)
+        )
+    if output is not None:
+        with open(output, "w") as file:
+            json.dump(report, file, indent=2)
@@ -0,0 +1,89 @@
+"""Measure throughput scaling of the multi-process serving mode across cores.
+
+Starts `gunicorn --config gunicorn.conf.py main:app` for each worker count and
+drives it over localhost with the same workload.
+
+    python -m scripts.bench.worker_scaling --server-id 1 --workers 1 2 4 8
+"""
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+from scripts.bench.utils import print_report, run_concurrently, summarize
+
+ROOT_PATH = Path(__file__).parent.parent.parent
+
+
+def start_server(workers: int, port: int) -> subprocess.Popen:
+    env = os.environ | {"WEB_WORKERS": str(workers), "BIND": f"127.0.0.1:{port}"}
+    return subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "--config", "gunicorn.conf.py", "main:app"],
+        cwd=ROOT_PATH,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+async def wait_until_serving(client: httpx.AsyncClient, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            await client.get("/docs")
+            return
+        except httpx.TransportError:
+            await asyncio.sleep(0.2)
+    raise TimeoutError("server did not start")
+
+
+async def bench(workers: int, args: argparse.Namespace) -> dict:
+    server = start_server(workers, args.port)
+    try:
+        async with httpx.AsyncClient(
+            base_url=f"http://127.0.0.1:{args.port}",
+            timeout=None,
+            limits=httpx.Limits(max_connections=args.concurrency),
+        ) as client:
+            await wait_until_serving(client)
+
+            async def call() -> bool:
+                response = await client.get(
+                    "/item_price_history/top_profitable_items",
+                    params={"server_id": args.server_id},
+                )
+                return response.status_code == 200
+
+            latencies, errors, elapsed = await run_concurrently(
+                (call for _ in range(args.requests)), args.concurrency
+            )
+            return summarize(latencies, elapsed, errors)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+async def main(args: argparse.Namespace):
+    report = {}
+    for workers in args.workers:
+        report[f"workers={workers}"] = await bench(workers, args)
+    print_report(report, args.output)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--server-id", type=int, required=True)
+    parser.add_argument(
+        "--workers", type=int, nargs="+", default=[1, 2, os.cpu_count() or 1]
+    )
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--output", help="write the json report to this path")
+    asyncio.run(main(parser.parse_args()))
@@ -1,5 +1,3 @@
 #!/bin/bash
 
-poetry run poe migrate
-
-poetry run uvicorn --workers 1 --host 0.0.0.0 main:app
\ No newline at end of file
+poetry run gunicorn --config gunicorn.conf.py main:app
\ No newline at end of file
@@ -0,0 +1,58 @@
+"""Export the price history of a server over a time range as Parquet or as an Arrow
+IPC stream, read through a server-side cursor in bounded batches. The archived
+months are read from their Parquet files.
+
+    python -m scripts.export_prices --server-id 1 --start 2026-01-01 \\
+        --end 2026-02-01 --format parquet --output prices.parquet
+"""
+
+import argparse
+import sys
+import time
+from datetime import datetime
+
+from src.controllers.cold_storage import ColdStorageController
+from src.controllers.export import ExportController
+from src.database import SessionMaker, get_engine
+from src.export import BATCH_ROWS, ExportFormatEnum
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--server-id", type=int, required=True)
+    parser.add_argument("--start", type=datetime.fromisoformat, required=True)
+    parser.add_argument(
+        "--end", type=datetime.fromisoformat, default=None, help="now by default"
+    )
+    parser.add_argument(
+        "--format",
+        choices=[export_format.value for export_format in ExportFormatEnum],
+        default=ExportFormatEnum.PARQUET.value,
+    )
+    parser.add_argument("--batch-rows", type=int, default=BATCH_ROWS)
+    parser.add_argument("--output", required=True, help="file path, - for stdout")
+    args = parser.parse_args()
+
+    started_at = time.perf_counter()
+    end = args.end or datetime.now()
+    with SessionMaker(bind=get_engine()) as session:
+        paths = ColdStorageController.get_paths(
+            session, args.server_id, args.start, end
+        )
+        output = sys.stdout.buffer if args.output == "-" else open(args.output, "wb")
+        with output:
+            rows = ExportController.export(
+                session,
+                output,
+                ExportFormatEnum(args.format),
+                args.server_id,
+                args.start,
+                end,
+                args.batch_rows,
+                ColdStorageController.read_export_batches(
+                    paths, args.server_id, args.start, end, args.batch_rows
+                ),
+            )
+    print(
+        f"exported {rows} rows in {time.perf_counter() - started_at:.3f}s",
+        file=sys.stderr,
+    )
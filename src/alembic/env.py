@@ -23,7 +23,10 @@ config.set_main_option(
 )
 # Interpret the config file for Python logging.
 # This line sets up loggers basically.
-if config.config_file_name is not None:
+# Skipped when migrations run inside the API process, which owns its logging.
+if config.config_file_name is not None and config.attributes.get(
+    "configure_logger", True
+):
     fileConfig(config.config_file_name)
 
 # add your model's MetaData object here
@@ -73,13 +76,7 @@ def run_migrations_online() -> None:
                 directives[:] = []
                 print("No changes in schema detected.")
 
-    connectable = engine_from_config(
-        config.get_section(config.config_ini_section, {}),
-        prefix="sqlalchemy.",
-        poolclass=pool.NullPool,
-    )
-
-    with connectable.connect() as connection:
+    def run_with_connection(connection):
         context.configure(
             connection=connection,
             target_metadata=target_metadata,
@@ -90,6 +87,21 @@ def run_migrations_online() -> None:
         with context.begin_transaction():
             context.run_migrations()
 
+    # the API passes its own connection when it migrates in process
+    connection = config.attributes.get("connection")
+    if connection is not None:
+        run_with_connection(connection)
+        return
+
+    connectable = engine_from_config(
+        config.get_section(config.config_ini_section, {}),
+        prefix="sqlalchemy.",
+        poolclass=pool.NullPool,
+    )
+
+    with connectable.connect() as connection:
+        run_with_connection(connection)
+
 
 if context.is_offline_mode():
     run_migrations_offline()
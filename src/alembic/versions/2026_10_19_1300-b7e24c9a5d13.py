@@ -0,0 +1,29 @@
+"""item price history keyset index
+
+Revision ID: b7e24c9a5d13
+Revises: 3c5b0e7d2f41
+Create Date: 2026-10-19 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7e24c9a5d13'
+down_revision: Union[str, None] = '3c5b0e7d2f41'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # built without locking the writes out of the table, outside of a transaction
+    with op.get_context().autocommit_block():
+        op.create_index('ix_item_price_history_keyset', 'item_price_history', ['server_id', 'quantity', 'recorded_at', 'id'], unique=False, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_item_price_history_keyset', table_name='item_price_history', postgresql_concurrently=True)
@@ -0,0 +1,18 @@
+"""Game catalog used by the API, selected by the CATALOG_PROVIDER setting.
+
+Import `DataReader`, `I18N` and `CategoryEnum` from here rather than from
+D3Database, so the synthetic catalog can replace it.
+"""
+
+from src.const import CATALOG_PROVIDER
+
+if CATALOG_PROVIDER == "synthetic":
+    from src.synthetic.catalog import CategoryEnum, DataReader, I18N
+elif CATALOG_PROVIDER == "d3database":
+    from D3Database.data_center.data_reader import DataReader
+    from D3Database.data_center.i18n import I18N
+    from D3Database.enums.category_item_enum import CategoryEnum
+else:
+    raise ValueError(f"unknown CATALOG_PROVIDER {CATALOG_PROVIDER}")
+
+__all__ = ["CategoryEnum", "DataReader", "I18N"]
@@ -0,0 +1,124 @@
+"""Parquet files of the archived price history, one or more per server and month:
+
+    <root>/server_id=<id>/month=<YYYY-MM>/part-<uuid>.parquet
+
+The rows of a file are sorted by (gid, recorded_at) and written in row groups of
+ROW_GROUP_ROWS, so the min/max statistics of the row groups let the scans skip
+the gids and dates filtered out without reading them (predicate pushdown).
+
+Which files are live is decided by the cold_partition table, not by the listing
+of the directory: a file left by an interrupted archive is never read.
+"""
+
+import os
+import uuid
+from datetime import date, datetime
+from pathlib import Path
+from typing import Iterable, Iterator, Sequence
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+from src.export import EXPORT_SCHEMA, BatchWriter, ExportFormatEnum
+from src.models.item_price_history import QuantityEnum
+
+ROW_GROUP_ROWS = 64 * 1024
+
+
+def get_filter(
+    server_id: int,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    gids: Sequence[int] | None = None,
+    quantity: QuantityEnum | None = None,
+    since_version: int | None = None,
+    until_version: int | None = None,
+    priced: bool = False,
+    after: tuple[datetime, int] | None = None,
+) -> pc.Expression:
+    expression = pc.field("server_id") == server_id
+    if start is not None:
+        expression &= pc.field("recorded_at") >= pa.scalar(start, pa.timestamp("us"))
+    if end is not None:
+        expression &= pc.field("recorded_at") < pa.scalar(end, pa.timestamp("us"))
+    if gids is not None:
+        expression &= pc.field("gid").isin(pa.array(gids, pa.int64()))
+    if quantity is not None:
+        expression &= pc.field("quantity") == quantity.value
+    if since_version is not None:
+        expression &= pc.field("change_version") > since_version
+    if until_version is not None:
+        expression &= pc.field("change_version") <= until_version
+    if priced:
+        expression &= pc.field("price").is_valid()
+    if after is not None:
+        recorded_at = pa.scalar(after[0], pa.timestamp("us"))
+        # the lower bound alone lets the statistics skip the row groups before it
+        expression &= (pc.field("recorded_at") >= recorded_at) & (
+            (pc.field("recorded_at") > recorded_at) | (pc.field("id") > after[1])
+        )
+    return expression
+
+
+class ColdStorage:
+    def __init__(self, root: str | Path):
+        self.root = Path(root)
+
+    @staticmethod
+    def get_partition_path(server_id: int, month: date) -> str:
+        return (
+            f"server_id={server_id}/month={month:%Y-%m}/part-{uuid.uuid4().hex}.parquet"
+        )
+
+    def write(self, path: str, batches: Iterable[Sequence[Sequence]]) -> int:
+        """Write the batches of rows, in the columns order of EXPORT_SCHEMA, to a new
+        file at `path`, returns the rows written. The file only appears complete."""
+        final_path = self.root / path
+        final_path.parent.mkdir(parents=True, exist_ok=True)
+        temporary_path = final_path.with_suffix(".tmp")
+        with open(temporary_path, "wb") as output:
+            writer = BatchWriter(ExportFormatEnum.PARQUET, output)
+            for rows in batches:
+                writer.write_rows(rows)
+            writer.close()
+            output.flush()
+            os.fsync(output.fileno())
+        os.replace(temporary_path, final_path)
+        return writer.rows
+
+    def delete(self, path: str):
+        (self.root / path).unlink(missing_ok=True)
+
+    def scan(
+        self,
+        paths: Sequence[str],
+        expression: pc.Expression,
+        columns: list[str] | None = None,
+    ) -> pa.Table:
+        """Rows of the files matching `expression`, the row groups whose statistics
+        exclude it are not read."""
+        if not paths:
+            return EXPORT_SCHEMA.empty_table().select(columns or EXPORT_SCHEMA.names)
+        dataset = ds.dataset(
+            [str(self.root / path) for path in paths],
+            schema=EXPORT_SCHEMA,
+            format="parquet",
+        )
+        return dataset.to_table(columns=columns, filter=expression)
+
+    def scan_batches(
+        self, paths: Sequence[str], expression: pc.Expression, batch_rows: int
+    ) -> Iterator[pa.RecordBatch]:
+        """Every column of the rows matching `expression`, by batches of at most
+        `batch_rows` rows read one at a time."""
+        if not paths:
+            return
+        dataset = ds.dataset(
+            [str(self.root / path) for path in paths],
+            schema=EXPORT_SCHEMA,
+            format="parquet",
+        )
+        for batch in dataset.to_batches(filter=expression, batch_size=batch_rows):
+            if batch.num_rows:
+                yield batch
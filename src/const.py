@@ -1,4 +1,128 @@
 import os
 from pathlib import Path
 
+from dotenv import dotenv_values
+
 ENV_PATH = os.path.join(Path(__file__).parent.parent, ".env")
+ENV_VALUES = dotenv_values(ENV_PATH)
+
+
+def get_setting(key: str, default: str | None = None) -> str | None:
+    """Read a setting, the process environment takes precedence over the .env file."""
+    return os.environ.get(key) or ENV_VALUES.get(key) or default
+
+
+# number of serving processes, the connection budget is shared between them
+WEB_WORKERS = int(get_setting("WEB_WORKERS", "1"))  # type: ignore
+DB_MAX_CONNECTIONS = int(get_setting("DB_MAX_CONNECTIONS", "90"))  # type: ignore
+
+# comma separated "host" or "host:port" of streaming replicas used for analytics
+DB_REPLICA_HOSTS = [
+    host.strip()
+    for host in (get_setting("DB_REPLICA_HOSTS") or "").split(",")
+    if host.strip()
+]
+# replicas lagging more than this are skipped in favor of the primary
+DB_REPLICA_MAX_LAG_SECONDS = float(
+    get_setting("DB_REPLICA_MAX_LAG_SECONDS", "5")  # type: ignore
+)
+DB_REPLICA_LAG_CHECK_SECONDS = float(
+    get_setting("DB_REPLICA_LAG_CHECK_SECONDS", "2")  # type: ignore
+)
+# statements prepared and kept per asyncpg connection, above its default of 100 to
+# hold every query of the API, 0 behind a pgbouncer in transaction pooling mode
+DB_PREPARED_STATEMENT_CACHE_SIZE = int(
+    get_setting("DB_PREPARED_STATEMENT_CACHE_SIZE", "500")  # type: ignore
+)
+
+# top items/crafts rankings precomputed for the default filters, by the API process
+# or alone with `python -m src.workers.materializer` when IN_PROCESS is 0
+RANKING_MATERIALIZER_IN_PROCESS = get_setting("RANKING_MATERIALIZER_IN_PROCESS") != "0"
+RANKING_MATERIALIZER_INTERVAL_SECONDS = float(
+    get_setting("RANKING_MATERIALIZER_INTERVAL_SECONDS", "300")  # type: ignore
+)
+RANKING_LOOKBACK_DAYS = 30
+RANKING_MIN_SAMPLES = 5
+RANKING_TOP_N = 200
+
+# "d3database" reads the game catalog from the D3Database submodule, "synthetic"
+# generates a seeded one of the configured size, for benchmarks without the game data
+CATALOG_PROVIDER = get_setting("CATALOG_PROVIDER", "d3database")
+SYNTHETIC_CATALOG_ITEMS = int(
+    get_setting("SYNTHETIC_CATALOG_ITEMS", "20000")  # type: ignore
+)
+SYNTHETIC_CATALOG_TYPES = int(
+    get_setting("SYNTHETIC_CATALOG_TYPES", "200")  # type: ignore
+)
+SYNTHETIC_CATALOG_RECIPES = int(
+    get_setting("SYNTHETIC_CATALOG_RECIPES", "5000")  # type: ignore
+)
+SYNTHETIC_CATALOG_SEED = int(get_setting("SYNTHETIC_CATALOG_SEED", "0"))  # type: ignore
+
+# "console" logs a tree of the spans of each request, "file" appends them as json
+# lines to TRACING_FILE, nothing is recorded when unset
+TRACING_EXPORTER = get_setting("TRACING_EXPORTER")
+TRACING_FILE = get_setting("TRACING_FILE") or "traces.jsonl"
+# allow any request to be profiled with ?profile=1, for debugging only
+PROFILING_ENABLED = get_setting("PROFILING_ENABLED") == "1"
+PROFILING_INTERVAL_SECONDS = float(
+    get_setting("PROFILING_INTERVAL_SECONDS", "0.001")  # type: ignore
+)
+
+# statements slower than the threshold are kept, with their plan, for /admin/slow_queries
+SLOW_QUERY_THRESHOLD_SECONDS = float(
+    get_setting("SLOW_QUERY_THRESHOLD_SECONDS", "0.5")  # type: ignore
+)
+SLOW_QUERY_LOG_SIZE = int(get_setting("SLOW_QUERY_LOG_SIZE", "100"))  # type: ignore
+# the plans are captured by running the slow queries again, only when enabled
+SLOW_QUERY_EXPLAIN = get_setting("SLOW_QUERY_EXPLAIN") == "1"
+SLOW_QUERY_EXPLAIN_COOLDOWN_SECONDS = float(
+    get_setting("SLOW_QUERY_EXPLAIN_COOLDOWN_SECONDS", "300")  # type: ignore
+)
+SLOW_QUERY_EXPLAIN_TIMEOUT_SECONDS = float(
+    get_setting("SLOW_QUERY_EXPLAIN_TIMEOUT_SECONDS", "30")  # type: ignore
+)
+# token expected in the X-Admin-Token header, the /admin routes are disabled when unset
+ADMIN_TOKEN = get_setting("ADMIN_TOKEN")
+
+# recent priced samples kept in memory by each API process, for the analytics of the
+# last HOT_WINDOW_DAYS days, within HOT_WINDOW_MAX_BYTES
+HOT_WINDOW_ENABLED = get_setting("HOT_WINDOW_ENABLED") == "1"
+HOT_WINDOW_DAYS = int(get_setting("HOT_WINDOW_DAYS", "30"))  # type: ignore
+HOT_WINDOW_MAX_BYTES = int(
+    get_setting("HOT_WINDOW_MAX_BYTES", "268435456")  # type: ignore
+)
+# the writes of the other processes are caught up at most this often
+HOT_WINDOW_SYNC_INTERVAL_SECONDS = float(
+    get_setting("HOT_WINDOW_SYNC_INTERVAL_SECONDS", "1")  # type: ignore
+)
+HOT_WINDOW_REFRESH_INTERVAL_SECONDS = float(
+    get_setting("HOT_WINDOW_REFRESH_INTERVAL_SECONDS", "60")  # type: ignore
+)
+
+# profits of the recipes kept in memory by each API process and re-evaluated on every
+# new price of their items, for the crafts ranking with the RANKING_* parameters
+CRAFT_RANKING_ENABLED = get_setting("CRAFT_RANKING_ENABLED") == "1"
+CRAFT_RANKING_SYNC_INTERVAL_SECONDS = float(
+    get_setting("CRAFT_RANKING_SYNC_INTERVAL_SECONDS", "1")  # type: ignore
+)
+# full rebuild, the samples past RANKING_LOOKBACK_DAYS only leave the averages then
+CRAFT_RANKING_REFRESH_INTERVAL_SECONDS = float(
+    get_setting("CRAFT_RANKING_REFRESH_INTERVAL_SECONDS", "300")  # type: ignore
+)
+
+# price history older than COLD_STORAGE_AFTER_MONTHS whole months is moved to Parquet
+# files under this directory by `python -m src.workers.tiering`, disabled when unset
+COLD_STORAGE_DIR = get_setting("COLD_STORAGE_DIR")
+COLD_STORAGE_AFTER_MONTHS = int(
+    get_setting("COLD_STORAGE_AFTER_MONTHS", "6")  # type: ignore
+)
+COLD_STORAGE_INTERVAL_SECONDS = float(
+    get_setting("COLD_STORAGE_INTERVAL_SECONDS", "86400")  # type: ignore
+)
+
+# rows per page of /item_price_history/evolution_price, and the most a client can ask
+EVOLUTION_PAGE_SIZE = int(get_setting("EVOLUTION_PAGE_SIZE", "1000"))  # type: ignore
+EVOLUTION_MAX_PAGE_SIZE = int(
+    get_setting("EVOLUTION_MAX_PAGE_SIZE", "10000")  # type: ignore
+)
@@ -0,0 +1,135 @@
+from sqlalchemy import (
+    CTE,
+    Insert,
+    Select,
+    StatementLambdaElement,
+    lambda_stmt,
+    literal,
+    select,
+)
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from src.controllers.utils import UpsertInsert
+from src.models.server_change_version import ServerChangeVersion
+
+
+class ChangeVersionController:
+    """Versions de changement monotones par serveur, pour la synchronisation delta.
+
+    L'incrément verrouille la ligne du serveur jusqu'au commit : les versions sont
+    donc visibles dans l'ordre, une fois la version V lue toutes les écritures
+    jusqu'à V sont commitées. Les écritures d'un même serveur sont sérialisées le
+    temps du verrou, il est donc pris au plus près du commit : sur PostgreSQL,
+    l'insertion de l'historique incrémente la version dans sa propre requête.
+
+    Lues et incrémentées à chaque insertion et synchronisation, leurs requêtes sont
+    des lambda statements : construites une seule fois, seules les valeurs
+    changent d'un appel à l'autre.
+    """
+
+    @staticmethod
+    def _increment_version(statement: UpsertInsert, server_id: int) -> Insert:
+        statement = statement.values(server_id=server_id, version=1)
+        return statement.on_conflict_do_update(
+            index_elements=["server_id"],
+            set_={"version": ServerChangeVersion.version + 1},
+        ).returning(ServerChangeVersion.version)
+
+    @staticmethod
+    def _next_version_statement(
+        session: Session | AsyncSession, server_id: int
+    ) -> StatementLambdaElement:
+        dialect = session.get_bind().dialect.name
+        if dialect == "postgresql":
+            return lambda_stmt(
+                lambda: ChangeVersionController._increment_version(
+                    postgresql.insert(ServerChangeVersion), server_id
+                )
+            )
+        if dialect == "sqlite":
+            return lambda_stmt(
+                lambda: ChangeVersionController._increment_version(
+                    sqlite.insert(ServerChangeVersion), server_id
+                )
+            )
+        raise NotImplementedError(f"upsert is not supported by {dialect}")
+
+    @staticmethod
+    def versions_cte(server_ids: set[int] | Select) -> CTE:
+        """PostgreSQL increment of the versions of the servers, as a (server_id,
+        version) CTE of the write statement carrying them: the rows are locked
+        from that statement to the commit only.
+
+        The servers are given, or selected by the statement: `server_ids` is then
+        a select of a single server_id column, only the servers it returns get a
+        version."""
+        statement = postgresql.insert(ServerChangeVersion)
+        # always locked in the same order, concurrent writers cannot deadlock
+        if isinstance(server_ids, Select):
+            servers = server_ids.subquery()
+            statement = statement.from_select(
+                ["server_id", "version"],
+                select(servers.c.server_id, literal(1))
+                .distinct()
+                .order_by(servers.c.server_id),
+            )
+        else:
+            statement = statement.values(
+                [
+                    {"server_id": server_id, "version": 1}
+                    for server_id in sorted(server_ids)
+                ]
+            )
+        return (
+            statement.on_conflict_do_update(
+                index_elements=["server_id"],
+                set_={"version": ServerChangeVersion.version + 1},
+            )
+            .returning(ServerChangeVersion.server_id, ServerChangeVersion.version)
+            .cte("version")
+        )
+
+    @staticmethod
+    def next_versions(session: Session, server_ids: set[int]) -> dict[int, int]:
+        """Allocate a version per server, in the current transaction."""
+        # always locked in the same order, concurrent writers cannot deadlock
+        return {
+            server_id: session.scalar(
+                ChangeVersionController._next_version_statement(session, server_id)
+            )
+            for server_id in sorted(server_ids)
+        }
+
+    @staticmethod
+    async def next_versions_async(
+        session: AsyncSession, server_ids: set[int]
+    ) -> dict[int, int]:
+        return {
+            server_id: await session.scalar(
+                ChangeVersionController._next_version_statement(session, server_id)
+            )
+            for server_id in sorted(server_ids)
+        }
+
+    @staticmethod
+    def _version_statement(server_id: int) -> StatementLambdaElement:
+        return lambda_stmt(
+            lambda: select(ServerChangeVersion.version).filter(
+                ServerChangeVersion.server_id == server_id
+            )
+        )
+
+    @staticmethod
+    def get_version(session: Session, server_id: int) -> int:
+        return (
+            session.scalar(ChangeVersionController._version_statement(server_id)) or 0
+        )
+
+    @staticmethod
+    async def get_version_async(session: AsyncSession, server_id: int) -> int:
+        return (
+            await session.scalar(ChangeVersionController._version_statement(server_id))
+            or 0
+        )
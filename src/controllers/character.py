@@ -1,20 +1,391 @@
 from fastapi import HTTPException
-from sqlalchemy import select
+from sqlalchemy import (
+    BigInteger,
+    Integer,
+    Row,
+    Select,
+    bindparam,
+    case,
+    false,
+    func,
+    literal_column,
+    null,
+    or_,
+    select,
+    text,
+    true,
+    union,
+    union_all,
+)
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.types import Text
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from src.controllers.utils import get_or_create
-from src.models.character import Character, CharacterActionEnum
+from src.controllers.change_version import ChangeVersionController
+from src.controllers.utils import in_array, insert_statement
+from src.database import AsyncSessionMaker, get_async_engine
+from src.models.character import Character, CharacterActionEnum, CharacterDeparture
+from src.mule_registry import (
+    CHARACTER_ACTION_CHANNEL,
+    MuleRegistry,
+    dump_action_change,
+)
 from src.schemas.character import CharacterCreateSchema
 
+NOTIFY_ACTION_CHANGES_STATEMENT = text(
+    "SELECT pg_notify(:channel, payload) FROM unnest(:payloads) AS payload"
+).bindparams(
+    bindparam("channel", CHARACTER_ACTION_CHANNEL),
+    bindparam("payloads", type_=ARRAY(Text())),
+)
+
 
 class CharacterController:
+    @staticmethod
+    def _action_changes(characters: list[Character], force: bool) -> list[str]:
+        # an upsert only moves a character between servers, which matters for mules
+        return [
+            dump_action_change(character.id, character.server_id, character.action)
+            for character in characters
+            if force or character.action is not None
+        ]
+
+    @staticmethod
+    def notify_action_changes(
+        session: Session, characters: list[Character], force: bool = False
+    ):
+        """Notify the other workers of the changes, delivered on commit."""
+        payloads = CharacterController._action_changes(characters, force)
+        if payloads and session.get_bind().dialect.name == "postgresql":
+            session.execute(NOTIFY_ACTION_CHANGES_STATEMENT, {"payloads": payloads})
+
+    @staticmethod
+    async def notify_action_changes_async(
+        session: AsyncSession, characters: list[Character], force: bool = False
+    ):
+        payloads = CharacterController._action_changes(characters, force)
+        if payloads and session.get_bind().dialect.name == "postgresql":
+            await session.execute(
+                NOTIFY_ACTION_CHANGES_STATEMENT, {"payloads": payloads}
+            )
+
+    @staticmethod
+    def apply_action_changes(characters: list[Character]):
+        """Write-through of committed changes into the registry of this worker."""
+        for character in characters:
+            MULE_REGISTRY.apply(character.id, character.server_id, character.action)
+
+    @staticmethod
+    def _batch_upsert_statement(
+        session: Session | AsyncSession,
+        payloads: list[CharacterCreateSchema],
+        version_by_server: dict[int, int],
+    ):
+        statement = insert_statement(session, Character).values(
+            [
+                {
+                    "id": payload.id,
+                    "server_id": payload.server_id,
+                    "change_version": version_by_server[payload.server_id],
+                }
+                for payload in CharacterController._latest_payloads(payloads)
+            ]
+        )
+        # a character is only a change for its new server when it moved
+        return statement.on_conflict_do_update(
+            index_elements=["id"],
+            set_={
+                "server_id": statement.excluded.server_id,
+                "change_version": case(
+                    (
+                        Character.server_id != statement.excluded.server_id,
+                        statement.excluded.change_version,
+                    ),
+                    else_=Character.change_version,
+                ),
+            },
+        ).returning(Character)
+
+    @staticmethod
+    def _latest_payloads(
+        payloads: list[CharacterCreateSchema],
+    ) -> list[CharacterCreateSchema]:
+        # a row can only be upserted once per statement, the last payload wins
+        return list({payload.id: payload for payload in payloads}.values())
+
+    @staticmethod
+    def _upsert_statement(payloads: list[CharacterCreateSchema]):
+        """PostgreSQL statement registering the new characters and moving the ones
+        changing servers, with a version allocated to the servers of these changes
+        only: the servers joined, and the ones left where the departure is recorded.
+        Returns every character of `payloads` and whether it was written, the
+        characters logging in again unchanged are only read."""
+        payloads = CharacterController._latest_payloads(payloads)
+        requested = (
+            func.unnest(
+                bindparam(
+                    "ids", [payload.id for payload in payloads], ARRAY(BigInteger())
+                ),
+                bindparam(
+                    "server_ids",
+                    [payload.server_id for payload in payloads],
+                    ARRAY(Integer()),
+                ),
+            )
+            .table_valued("id", "server_id")
+            .render_derived(name="requested")
+        )
+        changed = (
+            select(
+                requested.c.id,
+                requested.c.server_id,
+                Character.server_id.label("former_server_id"),
+            )
+            .outerjoin(Character, Character.id == requested.c.id)
+            .filter(
+                or_(
+                    Character.id.is_(None),
+                    Character.server_id != requested.c.server_id,
+                )
+            )
+            .cte("changed")
+        )
+        servers = union(
+            select(changed.c.server_id),
+            select(changed.c.former_server_id).filter(
+                changed.c.former_server_id.isnot(None)
+            ),
+        ).subquery()
+        version = ChangeVersionController.versions_cte(select(servers.c.server_id))
+        statement = postgresql.insert(Character).from_select(
+            ["id", "server_id", "change_version"],
+            select(changed.c.id, changed.c.server_id, version.c.version).join(
+                version, version.c.server_id == changed.c.server_id
+            ),
+        )
+        upserted = (
+            statement.on_conflict_do_update(
+                index_elements=["id"],
+                set_={
+                    "server_id": statement.excluded.server_id,
+                    "change_version": statement.excluded.change_version,
+                },
+                # moved there meanwhile by a concurrent statement
+                where=Character.server_id.is_distinct_from(
+                    statement.excluded.server_id
+                ),
+            )
+            .returning(*Character.__table__.c)
+            .cte("upserted")
+        )
+        former_version = version.alias("former_version")
+        departure = postgresql.insert(CharacterDeparture).from_select(
+            ["character_id", "server_id", "change_version"],
+            select(upserted.c.id, changed.c.former_server_id, former_version.c.version)
+            .join(changed, changed.c.id == upserted.c.id)
+            .join(
+                former_version,
+                former_version.c.server_id == changed.c.former_server_id,
+            ),
+        )
+        departed = departure.on_conflict_do_update(
+            index_elements=["character_id", "server_id"],
+            set_={"change_version": departure.excluded.change_version},
+        ).cte("departed")
+        # read in the snapshot of the statement, before the upsert
+        unchanged = select(Character.__table__, false().label("written")).filter(
+            in_array(Character.id, [payload.id for payload in payloads]),
+            Character.id.not_in(select(upserted.c.id)),
+        )
+        return select(Character, literal_column("written")).from_statement(
+            union_all(
+                select(upserted, true().label("written")).add_cte(departed),
+                unchanged,
+            )
+        )
+
+    @staticmethod
+    def _characters_statement(ids: set[int]) -> Select:
+        return select(Character).filter(in_array(Character.id, ids))
+
+    @staticmethod
+    def _changed_payloads(
+        payloads: list[CharacterCreateSchema], character_by_id: dict[int, Character]
+    ) -> list[CharacterCreateSchema]:
+        """The payloads creating a character or moving it to another server."""
+        return [
+            payload
+            for payload in CharacterController._latest_payloads(payloads)
+            if payload.id not in character_by_id
+            or character_by_id[payload.id].server_id != payload.server_id
+        ]
+
+    @staticmethod
+    def _departures(
+        changed: list[CharacterCreateSchema], character_by_id: dict[int, Character]
+    ) -> dict[int, int]:
+        """Server left by each moved character, by character id."""
+        return {
+            payload.id: character_by_id[payload.id].server_id
+            for payload in changed
+            if payload.id in character_by_id
+        }
+
+    @staticmethod
+    def _departures_statement(
+        session: Session | AsyncSession,
+        departures: dict[int, int],
+        version_by_server: dict[int, int],
+    ):
+        statement = insert_statement(session, CharacterDeparture).values(
+            [
+                {
+                    "character_id": id,
+                    "server_id": server_id,
+                    "change_version": version_by_server[server_id],
+                }
+                for id, server_id in departures.items()
+            ]
+        )
+        return statement.on_conflict_do_update(
+            index_elements=["character_id", "server_id"],
+            set_={"change_version": statement.excluded.change_version},
+        )
+
+    @staticmethod
+    def _ordered_characters(
+        payloads: list[CharacterCreateSchema], character_by_id: dict[int, Character]
+    ) -> list[Character]:
+        return [
+            character_by_id[id]
+            for id in dict.fromkeys(payload.id for payload in payloads)
+        ]
+
+    @staticmethod
+    def upsert_characters(
+        session: Session, payloads: list[CharacterCreateSchema]
+    ) -> list[Character]:
+        """Register the new characters and move the ones changing servers. A
+        version is allocated only when one of them changed: on PostgreSQL in the
+        single statement upserting them, other databases read them first."""
+        if session.get_bind().dialect.name == "postgresql":
+            rows = session.execute(
+                CharacterController._upsert_statement(payloads),
+                execution_options={"populate_existing": True},
+            ).all()
+            character_by_id = {character.id: character for character, _ in rows}
+            characters = [character for character, written in rows if written]
+        else:
+            character_by_id = {
+                character.id: character
+                for character in session.scalars(
+                    CharacterController._characters_statement(
+                        {payload.id for payload in payloads}
+                    )
+                )
+            }
+            changed = CharacterController._changed_payloads(payloads, character_by_id)
+            characters = []
+            if changed:
+                departures = CharacterController._departures(changed, character_by_id)
+                version_by_server = ChangeVersionController.next_versions(
+                    session,
+                    {payload.server_id for payload in changed}
+                    | set(departures.values()),
+                )
+                characters = list(
+                    session.scalars(
+                        CharacterController._batch_upsert_statement(
+                            session, changed, version_by_server
+                        ),
+                        execution_options={"populate_existing": True},
+                    )
+                )
+                if departures:
+                    session.execute(
+                        CharacterController._departures_statement(
+                            session, departures, version_by_server
+                        )
+                    )
+                character_by_id.update(
+                    (character.id, character) for character in characters
+                )
+        if characters:
+            CharacterController.notify_action_changes(session, characters)
+            session.commit()
+            CharacterController.apply_action_changes(characters)
+        return CharacterController._ordered_characters(payloads, character_by_id)
+
+    @staticmethod
+    async def upsert_characters_async(
+        session: AsyncSession, payloads: list[CharacterCreateSchema]
+    ) -> list[Character]:
+        if session.get_bind().dialect.name == "postgresql":
+            rows = (
+                await session.execute(
+                    CharacterController._upsert_statement(payloads),
+                    execution_options={"populate_existing": True},
+                )
+            ).all()
+            character_by_id = {character.id: character for character, _ in rows}
+            characters = [character for character, written in rows if written]
+        else:
+            character_by_id = {
+                character.id: character
+                for character in await session.scalars(
+                    CharacterController._characters_statement(
+                        {payload.id for payload in payloads}
+                    )
+                )
+            }
+            changed = CharacterController._changed_payloads(payloads, character_by_id)
+            characters = []
+            if changed:
+                departures = CharacterController._departures(changed, character_by_id)
+                version_by_server = await ChangeVersionController.next_versions_async(
+                    session,
+                    {payload.server_id for payload in changed}
+                    | set(departures.values()),
+                )
+                characters = list(
+                    await session.scalars(
+                        CharacterController._batch_upsert_statement(
+                            session, changed, version_by_server
+                        ),
+                        execution_options={"populate_existing": True},
+                    )
+                )
+                if departures:
+                    await session.execute(
+                        CharacterController._departures_statement(
+                            session, departures, version_by_server
+                        )
+                    )
+                character_by_id.update(
+                    (character.id, character) for character in characters
+                )
+        if characters:
+            await CharacterController.notify_action_changes_async(session, characters)
+            await session.commit()
+            CharacterController.apply_action_changes(characters)
+        return CharacterController._ordered_characters(payloads, character_by_id)
+
     @staticmethod
     def get_or_create_character(
         session: Session, payload: CharacterCreateSchema
     ) -> Character:
-        return get_or_create(
-            session, Character, id=payload.id, server_id=payload.server_id
-        )[0]
+        return CharacterController.upsert_characters(session, [payload])[0]
+
+    @staticmethod
+    async def get_or_create_character_async(
+        session: AsyncSession, payload: CharacterCreateSchema
+    ) -> Character:
+        characters = await CharacterController.upsert_characters_async(
+            session, [payload]
+        )
+        return characters[0]
 
     @staticmethod
     def update_action(session: Session, id: int, action: CharacterActionEnum | None):
@@ -22,13 +393,107 @@ class CharacterController:
         if character is None:
             raise HTTPException(404, f"did not found character {id}")
         character.action = action
+        CharacterController.notify_action_changes(session, [character], force=True)
+        # the version is locked from its increment to the commit, taken last and
+        # written with the action by a single UPDATE at the commit
+        with session.no_autoflush:
+            character.change_version = ChangeVersionController.next_versions(
+                session, {character.server_id}
+            )[character.server_id]
         session.commit()
+        CharacterController.apply_action_changes([character])
+
+    @staticmethod
+    async def update_action_async(
+        session: AsyncSession, id: int, action: CharacterActionEnum | None
+    ):
+        character = await session.scalar(select(Character).filter(Character.id == id))
+        if character is None:
+            raise HTTPException(404, f"did not found character {id}")
+        character.action = action
+        await CharacterController.notify_action_changes_async(
+            session, [character], force=True
+        )
+        with session.no_autoflush:
+            character.change_version = (
+                await ChangeVersionController.next_versions_async(
+                    session, {character.server_id}
+                )
+            )[character.server_id]
+        await session.commit()
+        CharacterController.apply_action_changes([character])
+
+    @staticmethod
+    def _mule_accept_bank_ids_statement(server_id: int):
+        return select(Character.id).where(
+            Character.action == CharacterActionEnum.MULE_ACCEPT_BANK,
+            Character.server_id == server_id,
+        )
 
     @staticmethod
     def get_mule_accept_bank_ids(session: Session, server_id: int):
         return session.scalars(
-            select(Character.id).where(
-                Character.action == CharacterActionEnum.MULE_ACCEPT_BANK,
-                Character.server_id == server_id,
+            CharacterController._mule_accept_bank_ids_statement(server_id)
+        )
+
+    @staticmethod
+    async def get_mule_accept_bank_ids_async(
+        session: AsyncSession, server_id: int
+    ) -> list[int]:
+        return list(
+            await session.scalars(
+                CharacterController._mule_accept_bank_ids_statement(server_id)
+            )
+        )
+
+    @staticmethod
+    def _action_changes_statement(server_id: int, since_version: int, version: int):
+        filters = [
+            Character.server_id == server_id,
+            Character.change_version <= version,
+        ]
+        if not since_version:
+            # first sync, only the current state is needed
+            filters.append(Character.action.isnot(None))
+            return select(Character.id, Character.action).filter(*filters)
+        filters.append(Character.change_version > since_version)
+        # the characters which left, unless they came back since
+        departed = select(CharacterDeparture.character_id, null()).filter(
+            CharacterDeparture.server_id == server_id,
+            CharacterDeparture.change_version > since_version,
+            CharacterDeparture.change_version <= version,
+            CharacterDeparture.character_id.not_in(
+                select(Character.id).filter(Character.server_id == server_id)
+            ),
+        )
+        return union_all(
+            select(Character.id, Character.action).filter(*filters), departed
+        )
+
+    @staticmethod
+    async def get_action_changes_async(
+        session: AsyncSession, server_id: int, since_version: int
+    ) -> tuple[int, list[Row[tuple[int, CharacterActionEnum | None]]]]:
+        """Current change version of the server and the actions of the characters
+        changed on it since `since_version`, a character which left the server is
+        reported without action."""
+        # read first: every change up to this version is already committed
+        version = await ChangeVersionController.get_version_async(session, server_id)
+        changes = (
+            await session.execute(
+                CharacterController._action_changes_statement(
+                    server_id, since_version, version
+                )
             )
+        ).all()
+        return version, list(changes)
+
+
+async def load_mule_accept_bank_ids(server_id: int) -> list[int]:
+    async with AsyncSessionMaker(bind=get_async_engine()) as session:
+        return await CharacterController.get_mule_accept_bank_ids_async(
+            session, server_id
         )
+
+
+MULE_REGISTRY = MuleRegistry(load_mule_accept_bank_ids)
@@ -0,0 +1,427 @@
+import asyncio
+import itertools
+import logging
+from datetime import date, datetime
+from typing import Iterator, Sequence, cast
+
+import numpy as np
+import pyarrow as pa
+from dateutil.relativedelta import relativedelta
+from sqlalchemy import Select, delete, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from src.cold_storage import ROW_GROUP_ROWS, ColdStorage, get_filter
+from src.const import COLD_STORAGE_AFTER_MONTHS, COLD_STORAGE_DIR
+from src.controllers.export import ExportController
+from src.export import BATCH_ROWS
+from src.models.cold_partition import ColdPartition
+from src.models.item_price_history import ItemPriceHistory, QuantityEnum
+from src.price_stats import PriceColumns
+
+logger = logging.getLogger(__name__)
+
+COLD_STORAGE = None if COLD_STORAGE_DIR is None else ColdStorage(COLD_STORAGE_DIR)
+
+
+class ColdStorageController:
+    """Archivage de l'historique ancien en Parquet, et lecture transparente des
+    archives par les analyses qui remontent avant la date de coupure."""
+
+    @staticmethod
+    def get_cutoff(
+        months: int = COLD_STORAGE_AFTER_MONTHS, now: datetime | None = None
+    ) -> datetime:
+        """Start of the oldest month kept in the database, whole months are archived."""
+        month_start = (now or datetime.now()).replace(
+            day=1, hour=0, minute=0, second=0, microsecond=0
+        )
+        return month_start - relativedelta(months=months)
+
+    @staticmethod
+    def archive_month(
+        session: Session, storage: ColdStorage, server_id: int, month: date
+    ) -> int:
+        """Move the prices of a server recorded during `month` to a Parquet file,
+        returns the rows moved."""
+        start = datetime(month.year, month.month, 1)
+        end = start + relativedelta(months=1)
+        path = storage.get_partition_path(server_id, month)
+        result = session.execute(
+            ExportController._export_statement(server_id, start, end)
+            .order_by(ItemPriceHistory.gid, ItemPriceHistory.recorded_at)
+            .execution_options(yield_per=ROW_GROUP_ROWS)
+        )
+        rows = storage.write(path, result.partitions())
+        if not rows:
+            storage.delete(path)
+            session.rollback()
+            return 0
+        # the rows of a past month are not written anymore, the range is stable
+        session.execute(
+            delete(ItemPriceHistory).filter(
+                ItemPriceHistory.server_id == server_id,
+                ItemPriceHistory.recorded_at >= start,
+                ItemPriceHistory.recorded_at < end,
+            )
+        )
+        session.add(
+            ColdPartition(
+                server_id=server_id,
+                month=month,
+                path=path,
+                rows=rows,
+                archived_at=datetime.now(),
+            )
+        )
+        try:
+            session.commit()
+        except Exception:
+            session.rollback()
+            storage.delete(path)
+            raise
+        return rows
+
+    @staticmethod
+    def archive(
+        session: Session, storage: ColdStorage, cutoff: datetime
+    ) -> dict[tuple[int, date], int]:
+        """Archive every month of every server before `cutoff`, a transaction per
+        month, returns the rows moved by (server, month)."""
+        oldest_by_server = session.execute(
+            select(ItemPriceHistory.server_id, func.min(ItemPriceHistory.recorded_at))
+            .filter(ItemPriceHistory.recorded_at < cutoff)
+            .group_by(ItemPriceHistory.server_id)
+        ).all()
+        session.rollback()
+        archived = {}
+        for server_id, oldest in oldest_by_server:
+            month = date(oldest.year, oldest.month, 1)
+            while month < cutoff.date():
+                rows = ColdStorageController.archive_month(
+                    session, storage, server_id, month
+                )
+                if rows:
+                    logger.info(
+                        "archived %s rows of server %s for %s",
+                        rows,
+                        server_id,
+                        f"{month:%Y-%m}",
+                    )
+                    archived[(server_id, month)] = rows
+                month += relativedelta(months=1)
+        return archived
+
+    @staticmethod
+    def _paths_statement(
+        server_ids: list[int], start: datetime | None, end: datetime | None = None
+    ) -> Select:
+        statement = select(ColdPartition.server_id, ColdPartition.path).filter(
+            ColdPartition.server_id.in_(server_ids)
+        )
+        if start is not None:
+            statement = statement.filter(
+                ColdPartition.month >= date(start.year, start.month, 1)
+            )
+        if end is not None:
+            statement = statement.filter(ColdPartition.month <= end.date())
+        return statement.order_by(ColdPartition.month, ColdPartition.id)
+
+    @staticmethod
+    def _is_archived(start: datetime | None) -> bool:
+        """Whether archives may hold rows recorded since `start`, without query:
+        the archived months all precede the current cutoff."""
+        return COLD_STORAGE is not None and (
+            start is None or start < ColdStorageController.get_cutoff()
+        )
+
+    @staticmethod
+    def _group_paths(rows: Sequence, server_ids: list[int]) -> dict[int, list[str]]:
+        paths_by_server: dict[int, list[str]] = {
+            server_id: [] for server_id in server_ids
+        }
+        for server_id, path in rows:
+            paths_by_server[server_id].append(path)
+        return paths_by_server
+
+    @staticmethod
+    def get_paths_by_server(
+        session: Session,
+        server_ids: list[int],
+        start: datetime | None,
+        end: datetime | None = None,
+    ) -> dict[int, list[str]]:
+        if not ColdStorageController._is_archived(start):
+            return {server_id: [] for server_id in server_ids}
+        return ColdStorageController._group_paths(
+            session.execute(
+                ColdStorageController._paths_statement(server_ids, start, end)
+            ).all(),
+            server_ids,
+        )
+
+    @staticmethod
+    async def get_paths_by_server_async(
+        session: AsyncSession,
+        server_ids: list[int],
+        start: datetime | None,
+        end: datetime | None = None,
+    ) -> dict[int, list[str]]:
+        if not ColdStorageController._is_archived(start):
+            return {server_id: [] for server_id in server_ids}
+        return ColdStorageController._group_paths(
+            (
+                await session.execute(
+                    ColdStorageController._paths_statement(server_ids, start, end)
+                )
+            ).all(),
+            server_ids,
+        )
+
+    @staticmethod
+    def _month_paths_statement(server_id: int, start: datetime | None) -> Select:
+        statement = select(ColdPartition.month, ColdPartition.path).filter(
+            ColdPartition.server_id == server_id
+        )
+        if start is not None:
+            statement = statement.filter(
+                ColdPartition.month >= date(start.year, start.month, 1)
+            )
+        return statement.order_by(ColdPartition.month, ColdPartition.id)
+
+    @staticmethod
+    def _group_paths_by_month(rows: Sequence) -> list[list[str]]:
+        return [
+            [path for _, path in month_rows]
+            for _, month_rows in itertools.groupby(rows, key=lambda row: row[0])
+        ]
+
+    @staticmethod
+    def get_month_paths(
+        session: Session, server_id: int, start: datetime | None
+    ) -> list[list[str]]:
+        """Files of the server by month, oldest first, from the month of `start`."""
+        if not ColdStorageController._is_archived(start):
+            return []
+        return ColdStorageController._group_paths_by_month(
+            session.execute(
+                ColdStorageController._month_paths_statement(server_id, start)
+            ).all()
+        )
+
+    @staticmethod
+    async def get_month_paths_async(
+        session: AsyncSession, server_id: int, start: datetime | None
+    ) -> list[list[str]]:
+        if not ColdStorageController._is_archived(start):
+            return []
+        return ColdStorageController._group_paths_by_month(
+            (
+                await session.execute(
+                    ColdStorageController._month_paths_statement(server_id, start)
+                )
+            ).all()
+        )
+
+    @staticmethod
+    def get_paths(
+        session: Session,
+        server_id: int,
+        start: datetime | None,
+        end: datetime | None = None,
+    ) -> list[str]:
+        return ColdStorageController.get_paths_by_server(
+            session, [server_id], start, end
+        )[server_id]
+
+    @staticmethod
+    async def get_paths_async(
+        session: AsyncSession,
+        server_id: int,
+        start: datetime | None,
+        end: datetime | None = None,
+    ) -> list[str]:
+        return (
+            await ColdStorageController.get_paths_by_server_async(
+                session, [server_id], start, end
+            )
+        )[server_id]
+
+    @staticmethod
+    def read_export_batches(
+        paths: Sequence[str],
+        server_id: int,
+        start: datetime,
+        end: datetime,
+        batch_rows: int = BATCH_ROWS,
+    ) -> Iterator[pa.RecordBatch]:
+        """Archived rows recorded in [start, end), in the columns of the export, by
+        batches read one at a time."""
+        if COLD_STORAGE is None:
+            return iter(())
+        return COLD_STORAGE.scan_batches(
+            paths, get_filter(server_id, start=start, end=end), batch_rows
+        )
+
+    @staticmethod
+    def read_price_history(
+        paths_by_month: Sequence[Sequence[str]],
+        server_id: int,
+        quantity: QuantityEnum,
+        gids: Sequence[int],
+        since_version: int | None = None,
+        until_version: int | None = None,
+        after: tuple[datetime, int] | None = None,
+        limit: int | None = None,
+    ) -> list[tuple[int, QuantityEnum, int | None, datetime, int]]:
+        """Archived (gid, quantity, price, recorded_at, id) rows, by (recorded_at, id),
+        the first `limit` ones after the key `after` when given.
+
+        The files of a month are sorted by gid, their statistics barely skip the
+        dates: the months are read in order, one at a time, until `limit` rows are
+        found, a page costs the months it spans instead of the whole archive."""
+        expression = get_filter(
+            server_id,
+            gids=gids,
+            quantity=quantity,
+            since_version=since_version,
+            until_version=until_version,
+            after=after,
+        )
+        rows: list[tuple[int, QuantityEnum, int | None, datetime, int]] = []
+        if COLD_STORAGE is None:
+            return rows
+        for paths in paths_by_month:
+            if limit is not None and len(rows) >= limit:
+                break
+            table = COLD_STORAGE.scan(
+                paths,
+                expression,
+                columns=["gid", "quantity", "price", "recorded_at", "id"],
+            ).sort_by([("recorded_at", "ascending"), ("id", "ascending")])
+            if limit is not None:
+                table = table.slice(0, limit - len(rows))
+            # the months do not overlap, their rows follow each other, and only the
+            # price is nullable in the archives
+            rows.extend(
+                zip(
+                    cast(list[int], table.column("gid").to_pylist()),
+                    map(
+                        QuantityEnum,
+                        cast(list[int], table.column("quantity").to_pylist()),
+                    ),
+                    table.column("price").to_pylist(),
+                    cast(list[datetime], table.column("recorded_at").to_pylist()),
+                    cast(list[int], table.column("id").to_pylist()),
+                )
+            )
+        return rows
+
+    @staticmethod
+    def read_price_columns(
+        paths: Sequence[str],
+        server_id: int,
+        quantity: QuantityEnum | None,
+        since: datetime,
+        gid: int | None = None,
+    ) -> PriceColumns:
+        """(gid, price) columns of the archived samples recorded since `since`."""
+        if COLD_STORAGE is None:
+            return PriceColumns.from_arrays(None, None)
+        table = COLD_STORAGE.scan(
+            paths,
+            get_filter(
+                server_id,
+                start=since,
+                gids=None if gid is None else [gid],
+                quantity=quantity,
+                priced=True,
+            ),
+            columns=["gid", "price"],
+        )
+        return PriceColumns(
+            gids=table.column("gid").to_numpy().astype(np.int64),
+            prices=table.column("price").to_numpy().astype(np.int64),
+        )
+
+    @staticmethod
+    def _read_price_columns_by_server(
+        paths_by_server: dict[int, list[str]],
+        quantity: QuantityEnum | None,
+        since: datetime,
+        gid: int | None = None,
+    ) -> dict[int, PriceColumns]:
+        """Archived samples of the servers having files, a scan per server: the
+        files are partitioned by server."""
+        return {
+            server_id: ColdStorageController.read_price_columns(
+                paths, server_id, quantity, since, gid
+            )
+            for server_id, paths in paths_by_server.items()
+            if paths
+        }
+
+    @staticmethod
+    def get_price_columns(
+        session: Session,
+        server_id: int,
+        quantity: QuantityEnum | None,
+        since: datetime,
+        gid: int | None = None,
+    ) -> PriceColumns | None:
+        """Archived samples since `since`, None when there is none to read."""
+        return ColdStorageController.get_price_columns_by_server(
+            session, [server_id], quantity, since, gid
+        ).get(server_id)
+
+    @staticmethod
+    async def get_price_columns_async(
+        session: AsyncSession,
+        server_id: int,
+        quantity: QuantityEnum | None,
+        since: datetime,
+        gid: int | None = None,
+    ) -> PriceColumns | None:
+        return (
+            await ColdStorageController.get_price_columns_by_server_async(
+                session, [server_id], quantity, since, gid
+            )
+        ).get(server_id)
+
+    @staticmethod
+    def get_price_columns_by_server(
+        session: Session,
+        server_ids: list[int],
+        quantity: QuantityEnum | None,
+        since: datetime,
+        gid: int | None = None,
+    ) -> dict[int, PriceColumns]:
+        """Archived samples since `since` of the servers having some to read."""
+        paths_by_server = ColdStorageController.get_paths_by_server(
+            session, server_ids, since
+        )
+        return ColdStorageController._read_price_columns_by_server(
+            paths_by_server, quantity, since, gid
+        )
+
+    @staticmethod
+    async def get_price_columns_by_server_async(
+        session: AsyncSession,
+        server_ids: list[int],
+        quantity: QuantityEnum | None,
+        since: datetime,
+        gid: int | None = None,
+    ) -> dict[int, PriceColumns]:
+        paths_by_server = await ColdStorageController.get_paths_by_server_async(
+            session, server_ids, since
+        )
+        if not any(paths_by_server.values()):
+            return {}
+        # the scans decompress in the arrow threads, off the event loop
+        return await asyncio.to_thread(
+            ColdStorageController._read_price_columns_by_server,
+            paths_by_server,
+            quantity,
+            since,
+            gid,
+        )
@@ -0,0 +1,238 @@
+import asyncio
+import collections
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import Select, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.catalog import CategoryEnum, DataReader
+from src.const import (
+    CRAFT_RANKING_ENABLED,
+    CRAFT_RANKING_SYNC_INTERVAL_SECONDS,
+    RANKING_LOOKBACK_DAYS,
+    RANKING_MIN_SAMPLES,
+)
+from src.controllers.change_version import ChangeVersionController
+from src.craft_ranking import CraftCandidate, CraftRanking, RecipeIndex, ServerCrafts
+from src.models.item_price_history import ItemPriceHistory, QuantityEnum
+from src.models.latest_item_price import LatestItemPrice
+
+CRAFT_RANKING = CraftRanking()
+
+# the changes of a server are applied one at a time, caught up or inserted: their
+# evaluations, run in a thread, are published in order
+_sync_locks: dict[int, asyncio.Lock] = collections.defaultdict(asyncio.Lock)
+
+
+class CraftRankingController:
+    """Classement incrémental des crafts par profit de ce processus.
+
+    Chaque nouveau prix ne réévalue que les recettes de son item, le top est lu
+    dans l'ordre du tas. Comme la fenêtre chaude, les écritures des autres
+    processus sont rattrapées par les versions de changement du serveur.
+    """
+
+    @staticmethod
+    def is_served(
+        lookback_days: int,
+        min_samples: int,
+        category: CategoryEnum | None,
+        type_id: int | None,
+    ) -> bool:
+        """Seul le classement avec la période et le minimum d'échantillons par
+        défaut, sans filtre de catégorie ni de type, est tenu à jour."""
+        return (
+            CRAFT_RANKING_ENABLED
+            and lookback_days == RANKING_LOOKBACK_DAYS
+            and min_samples == RANKING_MIN_SAMPLES
+            and category is None
+            and type_id is None
+        )
+
+    @staticmethod
+    def get_index(ranking: CraftRanking = CRAFT_RANKING) -> RecipeIndex:
+        if ranking.index is None:
+            data_reader = DataReader()
+            ranking.index = RecipeIndex(data_reader.recipes, data_reader.item_by_id)
+        return ranking.index
+
+    @staticmethod
+    def _stats_statement(server_id: int, since: datetime, until_version: int) -> Select:
+        return (
+            select(
+                ItemPriceHistory.gid,
+                ItemPriceHistory.quantity,
+                func.count(),
+                func.sum(ItemPriceHistory.price),
+            )
+            .filter(
+                ItemPriceHistory.server_id == server_id,
+                ItemPriceHistory.recorded_at >= since,
+                ItemPriceHistory.price.isnot(None),
+                ItemPriceHistory.change_version <= until_version,
+            )
+            .group_by(ItemPriceHistory.gid, ItemPriceHistory.quantity)
+        )
+
+    @staticmethod
+    def _latest_statement(server_id: int) -> Select:
+        # a latest price past the version read is applied again by the catch up,
+        # without effect
+        return select(
+            LatestItemPrice.gid,
+            LatestItemPrice.quantity,
+            LatestItemPrice.price,
+            LatestItemPrice.recorded_at,
+        ).filter(LatestItemPrice.server_id == server_id)
+
+    @staticmethod
+    def _delta_statement(
+        server_id: int, since_version: int, until_version: int
+    ) -> Select:
+        return select(
+            ItemPriceHistory.gid,
+            ItemPriceHistory.quantity,
+            ItemPriceHistory.price,
+            ItemPriceHistory.recorded_at,
+            ItemPriceHistory.change_version,
+        ).filter(
+            ItemPriceHistory.server_id == server_id,
+            ItemPriceHistory.change_version > since_version,
+            ItemPriceHistory.change_version <= until_version,
+        )
+
+    @staticmethod
+    async def warm_server_async(
+        session: AsyncSession,
+        server_id: int,
+        ranking: CraftRanking = CRAFT_RANKING,
+        days: int = RANKING_LOOKBACK_DAYS,
+        min_samples: int = RANKING_MIN_SAMPLES,
+    ) -> ServerCrafts:
+        """Recalcule entièrement le classement d'un serveur et remplace le
+        précédent, les échantillons sortis de la période en disparaissent."""
+        server_crafts = ServerCrafts(
+            since=datetime.now() - timedelta(days=days),
+            version=await ChangeVersionController.get_version_async(session, server_id),
+            min_samples=min_samples,
+        )
+        stats_rows = (
+            await session.execute(
+                CraftRankingController._stats_statement(
+                    server_id, server_crafts.since, server_crafts.version
+                )
+            )
+        ).all()
+        latest_rows = (
+            await session.execute(CraftRankingController._latest_statement(server_id))
+        ).all()
+        # every recipe is evaluated, off the event loop before being published
+        await asyncio.to_thread(
+            server_crafts.load,
+            stats_rows,
+            latest_rows,
+            CraftRankingController.get_index(ranking),
+        )
+        server_crafts.synced_at = time.monotonic()
+        ranking.servers[server_id] = server_crafts
+        return server_crafts
+
+    @staticmethod
+    async def sync_server_async(
+        session: AsyncSession,
+        server_id: int,
+        server_crafts: ServerCrafts,
+        ranking: CraftRanking = CRAFT_RANKING,
+        max_age: float = 0,
+    ):
+        """Rattrape les prix écrits par les autres processus, si la dernière
+        synchronisation date de plus de `max_age` secondes."""
+        async with _sync_locks[server_id]:
+            if time.monotonic() - server_crafts.synced_at < max_age:
+                return
+            version = await ChangeVersionController.get_version_async(
+                session, server_id
+            )
+            if version > server_crafts.version:
+                rows_by_version: dict[int, list] = collections.defaultdict(list)
+                for row in await session.execute(
+                    CraftRankingController._delta_statement(
+                        server_id, server_crafts.version, version
+                    )
+                ):
+                    rows_by_version[row.change_version].append(row[:4])
+                await CraftRankingController._rerank_async(
+                    server_crafts,
+                    server_crafts.apply_delta(version, rows_by_version),
+                    ranking,
+                )
+            server_crafts.synced_at = time.monotonic()
+
+    @staticmethod
+    async def get_top_async(
+        session: AsyncSession,
+        server_id: int,
+        quantity: QuantityEnum | None,
+        current_prices: bool,
+        top_n: int,
+        ranking: CraftRanking = CRAFT_RANKING,
+    ) -> tuple[ServerCrafts, list[tuple[object, CraftCandidate]]] | None:
+        """Table à jour du serveur et ses `top_n` meilleures (recette, évaluation),
+        None si le serveur n'est pas chargé."""
+        server_crafts = ranking.servers.get(server_id)
+        if server_crafts is None:
+            return None
+        await CraftRankingController.sync_server_async(
+            session,
+            server_id,
+            server_crafts,
+            ranking,
+            max_age=CRAFT_RANKING_SYNC_INTERVAL_SECONDS,
+        )
+        recipes = CraftRankingController.get_index(ranking).recipes
+        return server_crafts, [
+            (recipes[recipe_index], candidate)
+            for recipe_index, candidate in server_crafts.top(
+                quantity, current_prices, top_n
+            )
+        ]
+
+    @staticmethod
+    async def _rerank_async(
+        server_crafts: ServerCrafts,
+        touched: dict[QuantityEnum, set[int]],
+        ranking: CraftRanking = CRAFT_RANKING,
+    ):
+        """Re-rank the recipes of the gids touched, evaluated off the event loop
+        and published on it, where the heaps are read."""
+        if not any(touched.values()):
+            return
+        evaluations = await asyncio.to_thread(
+            server_crafts.evaluate_touched,
+            touched,
+            CraftRankingController.get_index(ranking),
+        )
+        server_crafts.publish(evaluations)
+
+    @staticmethod
+    async def apply_inserted_rows_async(
+        rows: list[dict], ranking: CraftRanking = CRAFT_RANKING
+    ):
+        """Ajoute les lignes tout juste commitées par ce processus aux classements."""
+        rows_by_version: dict[tuple[int, int], list] = collections.defaultdict(list)
+        for row in rows:
+            if row["server_id"] in ranking.servers:
+                rows_by_version[(row["server_id"], row["change_version"])].append(
+                    (row["gid"], row["quantity"], row["price"], row["recorded_at"])
+                )
+        for (server_id, version), version_rows in rows_by_version.items():
+            async with _sync_locks[server_id]:
+                # the table may have been rebuilt meanwhile
+                server_crafts = ranking.servers.get(server_id)
+                if server_crafts is not None:
+                    await CraftRankingController._rerank_async(
+                        server_crafts,
+                        server_crafts.apply(version, version_rows),
+                        ranking,
+                    )
@@ -0,0 +1,91 @@
+import asyncio
+from datetime import datetime
+from typing import AsyncIterator, BinaryIO, Iterable
+
+import pyarrow as pa
+from sqlalchemy import Select, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from src.export import BATCH_ROWS, BatchWriter, ChunkSink, ExportFormatEnum
+from src.models.item_price_history import ItemPriceHistory
+
+
+class ExportController:
+    """Export de l'historique des prix d'un serveur, lu par un curseur côté serveur."""
+
+    @staticmethod
+    def _export_statement(server_id: int, start: datetime, end: datetime) -> Select:
+        # no ORDER BY: the table is append only, its physical order is already
+        # close to recorded_at and sorting a whole server would spill to disk
+        return select(
+            ItemPriceHistory.id,
+            ItemPriceHistory.gid,
+            ItemPriceHistory.quantity,
+            ItemPriceHistory.price,
+            ItemPriceHistory.average_price,
+            ItemPriceHistory.recorded_at,
+            ItemPriceHistory.server_id,
+            ItemPriceHistory.change_version,
+        ).filter(
+            ItemPriceHistory.server_id == server_id,
+            ItemPriceHistory.recorded_at >= start,
+            ItemPriceHistory.recorded_at < end,
+        )
+
+    @staticmethod
+    def export(
+        session: Session,
+        output: BinaryIO,
+        export_format: ExportFormatEnum,
+        server_id: int,
+        start: datetime,
+        end: datetime,
+        batch_rows: int = BATCH_ROWS,
+        archived_batches: Iterable[pa.RecordBatch] = (),
+    ) -> int:
+        """Write the prices recorded in [start, end) to `output`, the archived ones
+        first, returns the rows."""
+        writer = BatchWriter(export_format, output)
+        for batch in archived_batches:
+            writer.write_batch(batch)
+        result = session.execute(
+            ExportController._export_statement(server_id, start, end).execution_options(
+                yield_per=batch_rows
+            )
+        )
+        for rows in result.partitions():
+            writer.write_rows(rows)
+        writer.close()
+        return writer.rows
+
+    @staticmethod
+    async def stream_export_async(
+        session: AsyncSession,
+        export_format: ExportFormatEnum,
+        server_id: int,
+        start: datetime,
+        end: datetime,
+        batch_rows: int = BATCH_ROWS,
+        archived_batches: Iterable[pa.RecordBatch] = (),
+    ) -> AsyncIterator[bytes]:
+        """Encoded export of the prices recorded in [start, end), the archived ones
+        first, a chunk per batch."""
+        sink = ChunkSink()
+        writer = BatchWriter(export_format, sink)
+        archived = iter(archived_batches)
+        # the archives are read and decompressed off the event loop
+        while (batch := await asyncio.to_thread(next, archived, None)) is not None:
+            await asyncio.to_thread(writer.write_batch, batch)
+            yield sink.drain()
+        result = await session.stream(
+            ExportController._export_statement(server_id, start, end).execution_options(
+                yield_per=batch_rows
+            )
+        )
+        async for rows in result.partitions():
+            # the encoding and compression are CPU bound
+            await asyncio.to_thread(writer.write_rows, rows)
+            yield sink.drain()
+        writer.close()
+        yield sink.drain()
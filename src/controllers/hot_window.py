@@ -0,0 +1,218 @@
+import asyncio
+import collections
+import logging
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import Select, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.const import (
+    HOT_WINDOW_DAYS,
+    HOT_WINDOW_ENABLED,
+    HOT_WINDOW_MAX_BYTES,
+    HOT_WINDOW_SYNC_INTERVAL_SECONDS,
+)
+from src.controllers.change_version import ChangeVersionController
+from src.hot_window import HotWindow, PriceChunk, ServerWindow
+from src.models.item_price_history import ItemPriceHistory, QuantityEnum
+from src.price_stats import PriceColumns
+
+logger = logging.getLogger(__name__)
+
+HOT_WINDOW = HotWindow(HOT_WINDOW_MAX_BYTES)
+
+# a single catch up per server at a time, the concurrent readers wait for it; the
+# windows are only modified on the event loop, the ranking threads only read them
+_sync_locks: dict[int, asyncio.Lock] = collections.defaultdict(asyncio.Lock)
+
+
+class HotWindowController:
+    """Remplit et synchronise la fenêtre des prix récents de ce processus.
+
+    Chaque processus rattrape les écritures des autres par les versions de
+    changement du serveur, ses propres insertions y sont ajoutées directement.
+    """
+
+    @staticmethod
+    def _window_rows_statement(
+        server_id: int,
+        since: datetime,
+        until_version: int,
+        since_version: int | None = None,
+    ) -> Select:
+        filters = [
+            ItemPriceHistory.server_id == server_id,
+            ItemPriceHistory.recorded_at >= since,
+            ItemPriceHistory.price.isnot(None),
+            ItemPriceHistory.change_version <= until_version,
+        ]
+        if since_version is not None:
+            filters.append(ItemPriceHistory.change_version > since_version)
+        return select(
+            ItemPriceHistory.gid,
+            ItemPriceHistory.price,
+            ItemPriceHistory.quantity,
+            ItemPriceHistory.recorded_at,
+            ItemPriceHistory.change_version,
+        ).filter(*filters)
+
+    @staticmethod
+    async def warm_server_async(
+        session: AsyncSession,
+        server_id: int,
+        window: HotWindow = HOT_WINDOW,
+        days: int = HOT_WINDOW_DAYS,
+        chunk_rows: int = 100_000,
+    ) -> ServerWindow | None:
+        """Charge les échantillons récents d'un serveur, None s'ils dépassent le
+        budget mémoire restant : le serveur est alors écarté jusqu'à ce qu'assez de
+        budget se libère."""
+        server_window = ServerWindow(
+            since=datetime.now() - timedelta(days=days),
+            version=await ChangeVersionController.get_version_async(session, server_id),
+        )
+        result = await session.stream(
+            HotWindowController._window_rows_statement(
+                server_id, server_window.since, server_window.version
+            ).execution_options(yield_per=chunk_rows)
+        )
+        async for rows in result.partitions():
+            chunk = await asyncio.to_thread(PriceChunk.from_rows, rows)
+            server_window.chunks.append(chunk)
+            if window.nbytes + server_window.nbytes > window.max_bytes:
+                await result.close()
+                logger.warning("hot window budget exceeded by server %s", server_id)
+                window.rejected[server_id] = server_window.nbytes
+                return None
+        server_window.synced_at = time.monotonic()
+        window.rejected.pop(server_id, None)
+        window.servers[server_id] = server_window
+        return server_window
+
+    @staticmethod
+    async def sync_server_async(
+        session: AsyncSession,
+        server_id: int,
+        server_window: ServerWindow,
+        max_age: float = 0,
+    ):
+        """Rattrape les échantillons écrits par les autres processus, si la
+        dernière synchronisation date de plus de `max_age` secondes."""
+        async with _sync_locks[server_id]:
+            if time.monotonic() - server_window.synced_at < max_age:
+                return
+            version = await ChangeVersionController.get_version_async(
+                session, server_id
+            )
+            if version > server_window.version:
+                rows_by_version: dict[int, list] = collections.defaultdict(list)
+                for row in await session.execute(
+                    HotWindowController._window_rows_statement(
+                        server_id,
+                        server_window.since,
+                        version,
+                        since_version=server_window.version,
+                    )
+                ):
+                    rows_by_version[row.change_version].append(row)
+                server_window.apply_delta(version, rows_by_version)
+            server_window.synced_at = time.monotonic()
+
+    @staticmethod
+    async def get_window_async(
+        session: AsyncSession,
+        server_id: int,
+        since: datetime,
+        window: HotWindow = HOT_WINDOW,
+    ) -> ServerWindow | None:
+        """Fenêtre à jour du serveur si elle couvre `since`, sinon None et
+        l'analyse passe par la base."""
+        if not HOT_WINDOW_ENABLED:
+            return None
+        server_window = window.get(server_id, since)
+        if server_window is None:
+            return None
+        await HotWindowController.sync_server_async(
+            session, server_id, server_window, max_age=HOT_WINDOW_SYNC_INTERVAL_SECONDS
+        )
+        return server_window
+
+    @staticmethod
+    async def get_columns_async(
+        session: AsyncSession,
+        server_id: int,
+        quantity: QuantityEnum | None,
+        lookback_days: int,
+    ) -> PriceColumns | None:
+        since = datetime.now() - timedelta(days=lookback_days)
+        server_window = await HotWindowController.get_window_async(
+            session, server_id, since
+        )
+        if server_window is None:
+            return None
+        return await asyncio.to_thread(server_window.get_columns, since, quantity)
+
+    @staticmethod
+    async def get_prices_async(
+        session: AsyncSession,
+        gid: int,
+        quantity: QuantityEnum | None,
+        server_id: int,
+        lookback_days: int,
+    ) -> list[int] | None:
+        since = datetime.now() - timedelta(days=lookback_days)
+        server_window = await HotWindowController.get_window_async(
+            session, server_id, since
+        )
+        if server_window is None:
+            return None
+        return server_window.get_prices(gid, since, quantity).tolist()
+
+    @staticmethod
+    def apply_inserted_rows(rows: list[dict], window: HotWindow = HOT_WINDOW):
+        """Ajoute les lignes tout juste commitées par ce processus aux fenêtres."""
+        rows_by_version: dict[tuple[int, int], list] = collections.defaultdict(list)
+        for row in rows:
+            if row["price"] is not None and row["server_id"] in window.servers:
+                rows_by_version[(row["server_id"], row["change_version"])].append(
+                    (row["gid"], row["price"], row["quantity"], row["recorded_at"])
+                )
+        for (server_id, version), version_rows in rows_by_version.items():
+            window.servers[server_id].apply(version, PriceChunk.from_rows(version_rows))
+
+    @staticmethod
+    async def check_consistency_async(
+        session: AsyncSession, server_id: int, window: HotWindow = HOT_WINDOW
+    ) -> dict | None:
+        """Compare le nombre et la somme des prix de la fenêtre avec la base, sur
+        la même période et jusqu'à la même version."""
+        server_window = window.servers.get(server_id)
+        if server_window is None:
+            return None
+        await HotWindowController.sync_server_async(session, server_id, server_window)
+        since, version = server_window.since, server_window.version
+        columns = server_window.get_columns(since, None)
+        filters = [
+            ItemPriceHistory.server_id == server_id,
+            ItemPriceHistory.recorded_at >= since,
+            ItemPriceHistory.price.isnot(None),
+            ItemPriceHistory.change_version <= version,
+        ]
+        db_rows, db_sum = (
+            await session.execute(
+                select(func.count(), func.sum(ItemPriceHistory.price)).filter(*filters)
+            )
+        ).one()
+        window_rows, window_sum = len(columns), int(np.sum(columns.prices))
+        return {
+            "server_id": server_id,
+            "since": since.isoformat(),
+            "version": version,
+            "window_rows": window_rows,
+            "window_price_sum": window_sum,
+            "database_rows": db_rows,
+            "database_price_sum": int(db_sum or 0),
+            "consistent": (window_rows, window_sum) == (db_rows, int(db_sum or 0)),
+        }
@@ -1,50 +1,176 @@
-import random
+import asyncio
+import heapq
+from dataclasses import asdict
 from datetime import datetime, timedelta
-
-from sqlalchemy import Float, case, func, select
+from typing import Callable, Sequence
+
+import numpy as np
+from sqlalchemy import (
+    Float,
+    Select,
+    StatementLambdaElement,
+    case,
+    func,
+    insert,
+    lambda_stmt,
+    literal,
+    select,
+    tuple_,
+)
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from D3Database.data_center.data_reader import DataReader
-from D3Database.data_center.i18n import I18N
-from D3Database.enums.category_item_enum import CategoryEnum
+from src.catalog import CategoryEnum, DataReader, I18N
+from src.controllers.change_version import ChangeVersionController
+from src.controllers.cold_storage import ColdStorageController
+from src.controllers.craft_ranking import CraftRankingController
+from src.controllers.hot_window import HotWindowController
+from src.controllers.latest_item_price import LatestItemPriceController
+from src.controllers.utils import in_array
+from src.craft_ranking import CraftCandidate, evaluate_recipe
+from src.metrics import count_ingested_rows
+from src.pagination import KeysetCursor
+from src.price_stats import (
+    PriceColumns,
+    fetch_price_columns,
+    fetch_price_columns_async,
+    fetch_price_columns_by_server,
+    fetch_price_columns_by_server_async,
+    group_price_stats,
+)
 from src.models.item_price_history import ItemPriceHistory, QuantityEnum
 from src.schemas.item_price_history import (
     CreateItemPriceHistorySchema,
-    IngredientDetailSchema,
+    IngredientDetailStruct,
     PriceResellEvaluationSchema,
-    ProfitableCraftSchema,
-    ProfitableItemSchema,
+    ProfitableCraftStruct,
+    ProfitableItemStruct,
+    ReadItemPriceHistoryStruct,
 )
+from src.synthetic.prices import generate_price_rows
+from src.tracing import span
+
+# largest category/type filter applied in SQL: beyond, the planner spends longer
+# estimating the selectivity of every gid of the array than the filter saves, the
+# prices are then filtered once read
+MAX_SQL_FILTERED_GIDS = 1000
 
 
 class ItemPriceHistoryController:
     @staticmethod
-    def bulk_insert(session: Session, payloads: list[CreateItemPriceHistorySchema]):
-        items_prices_histories = [
-            ItemPriceHistory(
-                gid=payload.gid,
-                quantity=payload.quantity,
-                price=payload.price,
-                recorded_at=datetime.now(),
-                server_id=payload.server_id,
-            )
+    def _bulk_insert_rows(payloads: list[CreateItemPriceHistorySchema]) -> list[dict]:
+        recorded_at = datetime.now()
+        return [
+            {
+                "gid": payload.gid,
+                "quantity": payload.quantity,
+                "price": payload.price,
+                "recorded_at": recorded_at,
+                "server_id": payload.server_id,
+            }
             for payload in payloads
         ]
-        session.bulk_save_objects(items_prices_histories)
+
+    @staticmethod
+    def _set_versions(rows: list[dict], version_by_server: dict[int, int]):
+        for row in rows:
+            row["change_version"] = version_by_server[row["server_id"]]
+
+    @staticmethod
+    def _versioned_insert_statement(rows: list[dict]) -> Select:
+        """PostgreSQL statement incrementing the versions of the servers, inserting
+        the history rows with them and upserting the latest prices, returns the
+        (server_id, version) allocated. Sent last, the versions stay locked for
+        the commit only."""
+        version = ChangeVersionController.versions_cte(
+            {row["server_id"] for row in rows}
+        )
+        history = (
+            insert(ItemPriceHistory)
+            .values(
+                [
+                    row
+                    | {
+                        "change_version": select(version.c.version)
+                        .filter(version.c.server_id == row["server_id"])
+                        .scalar_subquery()
+                    }
+                    for row in rows
+                ]
+            )
+            .returning(
+                ItemPriceHistory.id,
+                ItemPriceHistory.server_id,
+                ItemPriceHistory.gid,
+                ItemPriceHistory.quantity,
+                ItemPriceHistory.price,
+                ItemPriceHistory.recorded_at,
+                ItemPriceHistory.change_version,
+            )
+            .cte("history")
+        )
+        latest = LatestItemPriceController.upsert_from_statement(history).cte("latest")
+        return select(version.c.server_id, version.c.version).add_cte(history, latest)
+
+    @staticmethod
+    def bulk_insert(session: Session, payloads: list[CreateItemPriceHistorySchema]):
+        rows = ItemPriceHistoryController._bulk_insert_rows(payloads)
+        if session.get_bind().dialect.name == "postgresql":
+            version_by_server = dict(
+                session.execute(
+                    ItemPriceHistoryController._versioned_insert_statement(rows)
+                )
+                .tuples()
+                .all()
+            )
+            ItemPriceHistoryController._set_versions(rows, version_by_server)
+        else:
+            version_by_server = ChangeVersionController.next_versions(
+                session, {row["server_id"] for row in rows}
+            )
+            ItemPriceHistoryController._set_versions(rows, version_by_server)
+            session.execute(insert(ItemPriceHistory), rows)
+            LatestItemPriceController.upsert(session, rows)
         session.commit()
+        count_ingested_rows(payload.server_id for payload in payloads)
 
     @staticmethod
-    def get_sales_speed_from_prices(
-        session: Session, quantity: QuantityEnum, server_id: int, gids: list[int]
+    async def bulk_insert_async(
+        session: AsyncSession, payloads: list[CreateItemPriceHistorySchema]
     ):
-        """
-        Calculate sales speed based on price history.
-        """
+        rows = ItemPriceHistoryController._bulk_insert_rows(payloads)
+        if session.get_bind().dialect.name == "postgresql":
+            version_by_server = dict(
+                (
+                    await session.execute(
+                        ItemPriceHistoryController._versioned_insert_statement(rows)
+                    )
+                )
+                .tuples()
+                .all()
+            )
+            ItemPriceHistoryController._set_versions(rows, version_by_server)
+        else:
+            version_by_server = await ChangeVersionController.next_versions_async(
+                session, {row["server_id"] for row in rows}
+            )
+            ItemPriceHistoryController._set_versions(rows, version_by_server)
+            await session.execute(insert(ItemPriceHistory), rows)
+            await LatestItemPriceController.upsert_async(session, rows)
+        await session.commit()
+        count_ingested_rows(payload.server_id for payload in payloads)
+        HotWindowController.apply_inserted_rows(rows)
+        await CraftRankingController.apply_inserted_rows_async(rows)
+
+    @staticmethod
+    def _sales_speed_select(
+        quantity: QuantityEnum, server_ids_filter, gids_filter
+    ) -> Select:
         increase_flag = case(
             (
                 ItemPriceHistory.price
                 > func.lag(ItemPriceHistory.price).over(
-                    partition_by=ItemPriceHistory.gid,
+                    partition_by=(ItemPriceHistory.server_id, ItemPriceHistory.gid),
                     order_by=ItemPriceHistory.recorded_at,
                 ),
                 1,
@@ -53,30 +179,265 @@ class ItemPriceHistoryController:
         )
 
         subq = (
-            session.query(
+            select(
+                ItemPriceHistory.server_id.label("server_id"),
                 ItemPriceHistory.gid.label("gid"),
                 increase_flag.label("increase_flag"),
             )
             .filter(
-                ItemPriceHistory.gid.in_(gids),
+                gids_filter,
                 ItemPriceHistory.quantity == quantity,
-                ItemPriceHistory.server_id == server_id,
+                server_ids_filter,
             )
             .subquery()
         )
 
+        return select(
+            subq.c.server_id,
+            subq.c.gid,
+            (func.sum(subq.c.increase_flag).cast(Float) / func.count()).label("speed"),
+        ).group_by(subq.c.server_id, subq.c.gid)
+
+    @staticmethod
+    def _sales_speed_statement(
+        quantity: QuantityEnum, server_ids: list[int], gids: list[int]
+    ) -> StatementLambdaElement:
+        # les listes sont des tableaux liés : un seul texte SQL quel que soit leur
+        # nombre d'éléments
+        server_ids_filter = in_array(ItemPriceHistory.server_id, server_ids)
+        gids_filter = in_array(ItemPriceHistory.gid, gids)
+        return lambda_stmt(
+            lambda: ItemPriceHistoryController._sales_speed_select(
+                quantity, server_ids_filter, gids_filter
+            )
+        )
+
+    @staticmethod
+    def _group_sales_speeds(
+        results: Sequence, server_ids: list[int]
+    ) -> dict[int, dict[int, float]]:
+        speeds_by_server: dict[int, dict[int, float]] = {
+            server_id: {} for server_id in server_ids
+        }
+        for server_id, gid, speed in results:
+            speeds_by_server[server_id][gid] = speed
+        return speeds_by_server
+
+    @staticmethod
+    def get_sales_speed_from_prices(
+        session: Session, quantity: QuantityEnum, server_id: int, gids: list[int]
+    ):
+        """
+        Calculate sales speed based on price history.
+        """
+        return ItemPriceHistoryController.get_sales_speed_by_server(
+            session, quantity, [server_id], gids
+        )[server_id]
+
+    @staticmethod
+    async def get_sales_speed_from_prices_async(
+        session: AsyncSession, quantity: QuantityEnum, server_id: int, gids: list[int]
+    ):
+        return (
+            await ItemPriceHistoryController.get_sales_speed_by_server_async(
+                session, quantity, [server_id], gids
+            )
+        )[server_id]
+
+    @staticmethod
+    def get_sales_speed_by_server(
+        session: Session, quantity: QuantityEnum, server_ids: list[int], gids: list[int]
+    ) -> dict[int, dict[int, float]]:
+        """Vitesse de vente des items de chaque serveur, en une seule requête
+        groupée par serveur."""
+        results = session.execute(
+            ItemPriceHistoryController._sales_speed_statement(
+                quantity, server_ids, gids
+            )
+        ).all()
+        return ItemPriceHistoryController._group_sales_speeds(results, server_ids)
+
+    @staticmethod
+    async def get_sales_speed_by_server_async(
+        session: AsyncSession,
+        quantity: QuantityEnum,
+        server_ids: list[int],
+        gids: list[int],
+    ) -> dict[int, dict[int, float]]:
         results = (
-            session.query(
-                subq.c.gid,
-                (func.sum(subq.c.increase_flag).cast(Float) / func.count()).label(
-                    "speed"
-                ),
+            await session.execute(
+                ItemPriceHistoryController._sales_speed_statement(
+                    quantity, server_ids, gids
+                )
+            )
+        ).all()
+        return ItemPriceHistoryController._group_sales_speeds(results, server_ids)
+
+    @staticmethod
+    def _get_evolution_gids(type_id: int, item_gid: int | None) -> list[int]:
+        if item_gid is not None:
+            return [item_gid]
+        return sorted(DataReader().item_ids_by_type_id.get(type_id, set()))
+
+    @staticmethod
+    def _evolution_price_statement(
+        quantity: QuantityEnum,
+        server_id: int,
+        gids: list[int],
+        since_version: int | None = None,
+        until_version: int | None = None,
+        after: tuple[datetime, int] | None = None,
+        limit: int | None = None,
+    ) -> Select:
+        filters = [
+            ItemPriceHistory.quantity == quantity,
+            ItemPriceHistory.server_id == server_id,
+            in_array(ItemPriceHistory.gid, gids),
+        ]
+        if since_version is not None:
+            filters.append(ItemPriceHistory.change_version > since_version)
+        if until_version is not None:
+            filters.append(ItemPriceHistory.change_version <= until_version)
+        if after is not None:
+            # row comparison, a range scan of ix_item_price_history_keyset
+            filters.append(
+                tuple_(ItemPriceHistory.recorded_at, ItemPriceHistory.id)
+                > tuple_(*(literal(value) for value in after))
+            )
+        return (
+            select(
+                ItemPriceHistory.gid,
+                ItemPriceHistory.quantity,
+                ItemPriceHistory.price,
+                ItemPriceHistory.recorded_at,
+                ItemPriceHistory.id,
+            )
+            .filter(*filters)
+            .order_by(ItemPriceHistory.recorded_at, ItemPriceHistory.id)
+            .limit(limit)
+        )
+
+    @staticmethod
+    def _merge_evolution_rows(
+        archived: Sequence, rows: Sequence, limit: int | None
+    ) -> list:
+        """Lignes archivées et récentes, toutes deux triées par (recorded_at, id),
+        fusionnées dans cet ordre."""
+        merged = list(heapq.merge(archived, rows, key=lambda row: (row[3], row[4])))
+        return merged if limit is None else merged[:limit]
+
+    @staticmethod
+    def _to_evolution_structs(rows: list) -> list[ReadItemPriceHistoryStruct]:
+        """Lignes (gid, quantity, price, recorded_at, id) avec le nom de l'item,
+        résolu une fois par item comme `ItemPriceHistory.name`."""
+        data_reader, i18n = DataReader(), I18N()
+        name_by_gid = {}
+        for gid in {row[0] for row in rows}:
+            name_id = data_reader.item_by_id[gid].nameId
+            name_by_gid[gid] = i18n.name_by_id[name_id] if name_id else ""
+        return [
+            ReadItemPriceHistoryStruct(
+                name=name_by_gid[gid],
+                quantity=quantity,
+                price=price,
+                recorded_at=recorded_at,
+            )
+            for gid, quantity, price, recorded_at, _ in rows
+        ]
+
+    @staticmethod
+    def _to_evolution_page(
+        rows: list, limit: int, version: int
+    ) -> tuple[list[ReadItemPriceHistoryStruct], KeysetCursor | None]:
+        """Page des `limit` premières lignes parmi `limit + 1` lues, et le curseur
+        de la suivante s'il en reste."""
+        if len(rows) <= limit:
+            return ItemPriceHistoryController._to_evolution_structs(rows), None
+        rows = rows[:limit]
+        last = rows[-1]
+        return ItemPriceHistoryController._to_evolution_structs(rows), KeysetCursor(
+            recorded_at=last[3], id=last[4], version=version
+        )
+
+    @staticmethod
+    def _fetch_evolution_rows(
+        session: Session,
+        quantity: QuantityEnum,
+        server_id: int,
+        gids: list[int],
+        since_version: int | None = None,
+        until_version: int | None = None,
+        after: tuple[datetime, int] | None = None,
+        limit: int | None = None,
+    ) -> list:
+        # the archives are walked from the month of the cursor
+        paths_by_month = ColdStorageController.get_month_paths(
+            session, server_id, None if after is None else after[0]
+        )
+        archived = (
+            ColdStorageController.read_price_history(
+                paths_by_month,
+                server_id,
+                quantity,
+                gids,
+                since_version,
+                until_version,
+                after,
+                limit,
             )
-            .group_by(subq.c.gid)
-            .all()
+            if paths_by_month
+            else []
         )
+        rows = session.execute(
+            ItemPriceHistoryController._evolution_price_statement(
+                quantity, server_id, gids, since_version, until_version, after, limit
+            )
+        ).all()
+        return ItemPriceHistoryController._merge_evolution_rows(archived, rows, limit)
 
-        return {gid: speed for gid, speed in results}
+    @staticmethod
+    async def _fetch_evolution_rows_async(
+        session: AsyncSession,
+        quantity: QuantityEnum,
+        server_id: int,
+        gids: list[int],
+        since_version: int | None = None,
+        until_version: int | None = None,
+        after: tuple[datetime, int] | None = None,
+        limit: int | None = None,
+    ) -> list:
+        paths_by_month = await ColdStorageController.get_month_paths_async(
+            session, server_id, None if after is None else after[0]
+        )
+        archived = (
+            await asyncio.to_thread(
+                ColdStorageController.read_price_history,
+                paths_by_month,
+                server_id,
+                quantity,
+                gids,
+                since_version,
+                until_version,
+                after,
+                limit,
+            )
+            if paths_by_month
+            else []
+        )
+        rows = (
+            await session.execute(
+                ItemPriceHistoryController._evolution_price_statement(
+                    quantity,
+                    server_id,
+                    gids,
+                    since_version,
+                    until_version,
+                    after,
+                    limit,
+                )
+            )
+        ).all()
+        return ItemPriceHistoryController._merge_evolution_rows(archived, rows, limit)
 
     @staticmethod
     def get_evolution_price(
@@ -85,87 +446,150 @@ class ItemPriceHistoryController:
         server_id: int,
         type_id: int,
         item_gid: int | None = None,
-    ):
-        """Get the price evolution for a specific item type and quantity"""
-        gids = (
-            [
-                item.id
-                for item in DataReader().item_by_id.values()
-                if item.typeId == type_id
-            ]
-            if item_gid is None
-            else [item_gid]
-        )
-        return session.scalars(
-            (
-                select(ItemPriceHistory)
-                .filter(
-                    ItemPriceHistory.quantity == quantity,
-                    ItemPriceHistory.server_id == server_id,
-                    ItemPriceHistory.gid.in_(gids),
-                )
-                .order_by(ItemPriceHistory.recorded_at)
+        since_version: int | None = None,
+        until_version: int | None = None,
+    ) -> list[ReadItemPriceHistoryStruct]:
+        """Get the price evolution for a specific item type and quantity,
+        only the prices recorded in (since_version, until_version] when given,
+        ordered by (recorded_at, id) across the archived and the recent ones"""
+        gids = ItemPriceHistoryController._get_evolution_gids(type_id, item_gid)
+        return ItemPriceHistoryController._to_evolution_structs(
+            ItemPriceHistoryController._fetch_evolution_rows(
+                session, quantity, server_id, gids, since_version, until_version
             )
         )
 
     @staticmethod
-    def _generate_random_item_history(session: Session):
-        """Just a helper function to generate random item price history, used for debug purpose"""
-        items: list[ItemPriceHistory] = []
-        for index in range(100):
-            for gid in DataReader().item_by_id:
-                items.append(
-                    ItemPriceHistory(
-                        gid=gid,
-                        quantity=random.choice(list(QuantityEnum)),
-                        price=gid + random.randint(0, 3),
-                        recorded_at=datetime.now() + timedelta(seconds=index),
-                        server_id=-1,
-                    )
-                )
-        session.bulk_save_objects(items)
-        session.commit()
+    async def get_evolution_price_async(
+        session: AsyncSession,
+        quantity: QuantityEnum,
+        server_id: int,
+        type_id: int,
+        item_gid: int | None = None,
+        since_version: int | None = None,
+        until_version: int | None = None,
+    ) -> list[ReadItemPriceHistoryStruct]:
+        gids = ItemPriceHistoryController._get_evolution_gids(type_id, item_gid)
+        return ItemPriceHistoryController._to_evolution_structs(
+            await ItemPriceHistoryController._fetch_evolution_rows_async(
+                session, quantity, server_id, gids, since_version, until_version
+            )
+        )
 
     @staticmethod
-    def is_price_resell_profitable(
+    def get_evolution_price_page(
         session: Session,
-        gid: int,
-        quantity: QuantityEnum | None,
+        quantity: QuantityEnum,
         server_id: int,
-        observed_price: float,
-        lookback_days: int = 30,
-        low_ratio: float = 0.6,
-        min_samples: int = 5,
-        fraction_higher_needed: float = 0.5,
-    ) -> PriceResellEvaluationSchema:
-        """Détermine si `observed_price` est suffisamment bas par rapport aux prix
-        historiques pour envisager un achat/revente rentable.
+        type_id: int,
+        version: int,
+        limit: int,
+        item_gid: int | None = None,
+        since_version: int | None = None,
+        cursor: KeysetCursor | None = None,
+    ) -> tuple[list[ReadItemPriceHistoryStruct], KeysetCursor | None]:
+        """Une page de l'évolution des prix jusqu'à `version`, après le curseur
+        donné, et le curseur de la page suivante s'il en reste une.
+
+        Chaque page est une lecture d'index bornée par `limit`, quel que soit le
+        nombre de pages déjà lues."""
+        gids = ItemPriceHistoryController._get_evolution_gids(type_id, item_gid)
+        rows = ItemPriceHistoryController._fetch_evolution_rows(
+            session,
+            quantity,
+            server_id,
+            gids,
+            since_version,
+            version,
+            None if cursor is None else cursor.key,
+            limit + 1,
+        )
+        return ItemPriceHistoryController._to_evolution_page(rows, limit, version)
 
-        Retourne un schéma contenant des métriques et une recommandation.
+    @staticmethod
+    async def get_evolution_price_page_async(
+        session: AsyncSession,
+        quantity: QuantityEnum,
+        server_id: int,
+        type_id: int,
+        version: int,
+        limit: int,
+        item_gid: int | None = None,
+        since_version: int | None = None,
+        cursor: KeysetCursor | None = None,
+    ) -> tuple[list[ReadItemPriceHistoryStruct], KeysetCursor | None]:
+        gids = ItemPriceHistoryController._get_evolution_gids(type_id, item_gid)
+        rows = await ItemPriceHistoryController._fetch_evolution_rows_async(
+            session,
+            quantity,
+            server_id,
+            gids,
+            since_version,
+            version,
+            None if cursor is None else cursor.key,
+            limit + 1,
+        )
+        return ItemPriceHistoryController._to_evolution_page(rows, limit, version)
 
-        Si quantity est None, évalue sur toutes les quantités disponibles.
-        """
-        since = datetime.now() - timedelta(days=lookback_days)
+    @staticmethod
+    def _generate_random_item_history(session: Session, rows: int | None = None):
+        """Just a helper function to generate random item price history, used for debug purpose.
 
-        # Construire les filtres de base
-        filters = [
-            ItemPriceHistory.gid == gid,
-            ItemPriceHistory.server_id == server_id,
-            ItemPriceHistory.recorded_at >= since,
-        ]
+        For realistic volumes, use `python -m scripts.bench.generate` which relies on COPY.
+        """
+        gids = list(DataReader().item_by_id)
+        session.execute(
+            insert(ItemPriceHistory),
+            [
+                asdict(row)
+                for row in generate_price_rows(rows or 100 * len(gids), gids, [-1])
+            ],
+        )
+        session.commit()
 
-        # Ajouter le filtre de quantité si spécifié
-        if quantity is not None:
-            filters.append(ItemPriceHistory.quantity == quantity)
+    @staticmethod
+    def _resell_prices_statement(
+        gid: int,
+        quantity: QuantityEnum | None,
+        server_id: int,
+        lookback_days: int,
+    ) -> StatementLambdaElement:
+        since = datetime.now() - timedelta(days=lookback_days)
 
-        prices_rows = (
-            session.query(ItemPriceHistory.price)
-            .filter(*filters)
+        # une requête par présence du filtre de quantité, chacune construite une
+        # seule fois
+        if quantity is None:
+            return lambda_stmt(
+                lambda: select(ItemPriceHistory.price)
+                .filter(
+                    ItemPriceHistory.gid == gid,
+                    ItemPriceHistory.server_id == server_id,
+                    ItemPriceHistory.recorded_at >= since,
+                    # un relevé sans prix n'est pas un échantillon
+                    ItemPriceHistory.price.isnot(None),
+                )
+                .order_by(ItemPriceHistory.recorded_at.desc())
+            )
+        return lambda_stmt(
+            lambda: select(ItemPriceHistory.price)
+            .filter(
+                ItemPriceHistory.gid == gid,
+                ItemPriceHistory.server_id == server_id,
+                ItemPriceHistory.recorded_at >= since,
+                ItemPriceHistory.price.isnot(None),
+                ItemPriceHistory.quantity == quantity,
+            )
             .order_by(ItemPriceHistory.recorded_at.desc())
-            .all()
         )
 
-        prices = [row[0] for row in prices_rows]
+    @staticmethod
+    def _evaluate_resell(
+        prices: list[int],
+        observed_price: float,
+        low_ratio: float,
+        min_samples: int,
+        fraction_higher_needed: float,
+    ) -> PriceResellEvaluationSchema:
         samples = len(prices)
 
         if samples == 0:
@@ -179,15 +603,17 @@ class ItemPriceHistoryController:
                 reason="no_data",
             )
 
-        avg_price = sum(prices) / samples
-        sorted_prices = sorted(prices)
-        mid = samples // 2
-        if samples % 2 == 1:
-            median_price = sorted_prices[mid]
-        else:
-            median_price = (sorted_prices[mid - 1] + sorted_prices[mid]) / 2
-
-        fraction_higher = sum(1 for price in prices if price > observed_price) / samples
+        prices_column = np.array(prices, dtype=np.int64)
+        stats = group_price_stats(
+            PriceColumns(gids=np.zeros(samples, np.int64), prices=prices_column),
+            with_medians=True,
+        )
+        avg_price = float(stats.means[0])
+        # asked for with_medians
+        median_price = float(stats.medians[0])  # type: ignore[index]
+        fraction_higher = (
+            float(np.count_nonzero(prices_column > observed_price)) / samples
+        )
 
         is_low_by_ratio = observed_price <= (avg_price * low_ratio)
         has_enough_samples = samples >= min_samples
@@ -216,33 +642,134 @@ class ItemPriceHistoryController:
         )
 
     @staticmethod
-    def get_top_profitable_items(
+    def is_price_resell_profitable(
         session: Session,
+        gid: int,
+        quantity: QuantityEnum | None,
         server_id: int,
-        quantity: QuantityEnum | None = None,
+        observed_price: float,
         lookback_days: int = 30,
+        low_ratio: float = 0.6,
         min_samples: int = 5,
-        top_n: int = 50,
-        category: CategoryEnum | None = None,
-        type_id: int | None = None,
-    ) -> list[ProfitableItemSchema]:
-        """Retourne un classement des items les plus rentables à acheter pour revendre.
-
-        Calcule pour chaque item ayant des données historiques :
-        - Le prix moyen actuel (derniers enregistrements)
-        - Le prix minimum observé
-        - Le potentiel de profit (différence entre prix moyen et prix minimum)
-        - La volatilité des prix (écart-type)
+        fraction_higher_needed: float = 0.5,
+    ) -> PriceResellEvaluationSchema:
+        """Détermine si `observed_price` est suffisamment bas par rapport aux prix
+        historiques pour envisager un achat/revente rentable.
 
-        Retourne une liste triée par rentabilité potentielle.
+        Retourne un schéma contenant des métriques et une recommandation.
 
-        Peut être filtré par catégorie, type d'item et quantité.
+        Si quantity est None, évalue sur toutes les quantités disponibles.
         """
+        with span("sql"):
+            prices = list(
+                session.scalars(
+                    ItemPriceHistoryController._resell_prices_statement(
+                        gid, quantity, server_id, lookback_days
+                    )
+                )
+            )
+        with span("cold storage"):
+            archived = ColdStorageController.get_price_columns(
+                session,
+                server_id,
+                quantity,
+                datetime.now() - timedelta(days=lookback_days),
+                gid,
+            )
+        if archived is not None:
+            prices += archived.prices.tolist()
+        with span("evaluate"):
+            return ItemPriceHistoryController._evaluate_resell(
+                prices, observed_price, low_ratio, min_samples, fraction_higher_needed
+            )
+
+    @staticmethod
+    async def is_price_resell_profitable_async(
+        session: AsyncSession,
+        gid: int,
+        quantity: QuantityEnum | None,
+        server_id: int,
+        observed_price: float,
+        lookback_days: int = 30,
+        low_ratio: float = 0.6,
+        min_samples: int = 5,
+        fraction_higher_needed: float = 0.5,
+    ) -> PriceResellEvaluationSchema:
+        with span("hot window"):
+            prices = await HotWindowController.get_prices_async(
+                session, gid, quantity, server_id, lookback_days
+            )
+        if prices is None:
+            with span("sql"):
+                prices = list(
+                    await session.scalars(
+                        ItemPriceHistoryController._resell_prices_statement(
+                            gid, quantity, server_id, lookback_days
+                        )
+                    )
+                )
+            with span("cold storage"):
+                archived = await ColdStorageController.get_price_columns_async(
+                    session,
+                    server_id,
+                    quantity,
+                    datetime.now() - timedelta(days=lookback_days),
+                    gid,
+                )
+            if archived is not None:
+                prices += archived.prices.tolist()
+        with span("evaluate"):
+            return ItemPriceHistoryController._evaluate_resell(
+                prices, observed_price, low_ratio, min_samples, fraction_higher_needed
+            )
+
+    @staticmethod
+    def _get_filtered_gids(
+        category: CategoryEnum | None, type_id: int | None
+    ) -> set[int] | None:
+        """Items de la catégorie et du type, None sans filtre."""
+        if category is None and type_id is None:
+            return None
+        data_reader = DataReader()
+        filtered_gids = None
+        if category is not None:
+            filtered_gids = set(data_reader.item_ids_by_category.get(category, set()))
+        if type_id is not None:
+            type_gids = data_reader.item_ids_by_type_id.get(type_id, set())
+            filtered_gids = (
+                set(type_gids) if filtered_gids is None else filtered_gids & type_gids
+            )
+        return filtered_gids
+
+    @staticmethod
+    def _get_craft_gids(result_gids: set[int] | None) -> set[int] | None:
+        """Items dont les prix sont nécessaires pour évaluer les recettes de
+        `result_gids` : leurs résultats et leurs ingrédients."""
+        if result_gids is None:
+            return None
+        return {
+            gid
+            for recipe in DataReader().recipes
+            if recipe.resultId in result_gids
+            for gid in (recipe.resultId, *recipe.ingredientIds)
+        }
+
+    @staticmethod
+    def _get_sql_gids(gids: set[int] | None) -> set[int] | None:
+        """Items à filtrer en base, None si le filtre est trop large pour y
+        gagner."""
+        if gids is None or len(gids) > MAX_SQL_FILTERED_GIDS:
+            return None
+        return gids
+
+    @staticmethod
+    def _profitable_prices_filters(
+        quantity: QuantityEnum | None, lookback_days: int, gids: set[int] | None
+    ) -> list:
         since = datetime.now() - timedelta(days=lookback_days)
 
         # Construire les filtres de base
         filters = [
-            ItemPriceHistory.server_id == server_id,
             ItemPriceHistory.recorded_at >= since,
             ItemPriceHistory.price.isnot(None),
         ]
@@ -251,85 +778,252 @@ class ItemPriceHistoryController:
         if quantity is not None:
             filters.append(ItemPriceHistory.quantity == quantity)
 
-        # Récupérer les données de prix
-        prices_data = (
-            session.query(
-                ItemPriceHistory.gid,
-                ItemPriceHistory.price,
-                ItemPriceHistory.recorded_at,
-            )
-            .filter(*filters)
-            .order_by(ItemPriceHistory.gid, ItemPriceHistory.recorded_at)
-            .all()
-        )
-
-        items_data = {}
-        for gid, price, _ in prices_data:
-            if gid not in items_data:
-                items_data[gid] = []
-            items_data[gid].append(price)
+        # Seulement les items du catalogue filtré, en un seul paramètre tableau
+        if gids is not None:
+            filters.append(in_array(ItemPriceHistory.gid, gids))
 
-        # Filtrer par catégorie ou type d'item si spécifié
-        data_reader = DataReader()
-        if category is not None or type_id is not None:
-            filtered_gids = set(items_data.keys())
-
-            if category is not None:
-                category_gids = data_reader.item_ids_by_category.get(category, set())
-                filtered_gids &= category_gids
-
-            if type_id is not None:
-                type_gids = data_reader.item_ids_by_type_id.get(type_id, set())
-                filtered_gids &= type_gids
-
-            # Ne garder que les items filtrés
-            items_data = {gid: prices for gid, prices in items_data.items() if gid in filtered_gids}
+        return filters
 
-        profitable_items = []
-
-        for gid, prices in items_data.items():
-            if len(prices) < min_samples:
-                continue
+    @staticmethod
+    def _profitable_prices_statement(
+        server_id: int,
+        quantity: QuantityEnum | None,
+        lookback_days: int,
+        gids: set[int] | None = None,
+    ) -> Select:
+        return select(ItemPriceHistory.gid, ItemPriceHistory.price).filter(
+            ItemPriceHistory.server_id == server_id,
+            *ItemPriceHistoryController._profitable_prices_filters(
+                quantity, lookback_days, gids
+            ),
+        )
 
-            avg_price = sum(prices) / len(prices)
-            min_price = min(prices)
-            max_price = max(prices)
+    @staticmethod
+    def _profitable_prices_by_server_statement(
+        server_ids: list[int],
+        quantity: QuantityEnum | None,
+        lookback_days: int,
+        gids: set[int] | None = None,
+    ) -> Select:
+        return select(
+            ItemPriceHistory.server_id, ItemPriceHistory.gid, ItemPriceHistory.price
+        ).filter(
+            in_array(ItemPriceHistory.server_id, server_ids),
+            *ItemPriceHistoryController._profitable_prices_filters(
+                quantity, lookback_days, gids
+            ),
+        )
 
-            variance = sum((p - avg_price) ** 2 for p in prices) / len(prices)
-            std_dev = variance**0.5
+    @staticmethod
+    def _fetch_profitable_columns(
+        session: Session,
+        server_id: int,
+        quantity: QuantityEnum | None,
+        lookback_days: int,
+        gids: set[int] | None = None,
+    ) -> PriceColumns:
+        """Prix de la période, précédés des prix archivés si elle remonte jusqu'à
+        eux."""
+        with span("cold storage"):
+            archived = ColdStorageController.get_price_columns(
+                session,
+                server_id,
+                quantity,
+                datetime.now() - timedelta(days=lookback_days),
+            )
+        with span("sql"):
+            columns = fetch_price_columns(
+                session,
+                ItemPriceHistoryController._profitable_prices_statement(
+                    server_id, quantity, lookback_days, gids
+                ),
+            )
+        return columns if archived is None else PriceColumns.concat([archived, columns])
 
-            profit_potential = avg_price - min_price
+    @staticmethod
+    async def _fetch_profitable_columns_async(
+        session: AsyncSession,
+        server_id: int,
+        quantity: QuantityEnum | None,
+        lookback_days: int,
+        gids: set[int] | None = None,
+    ) -> PriceColumns:
+        """Prix de la période depuis la fenêtre en mémoire quand elle la couvre,
+        sinon depuis la base et les archives."""
+        with span("hot window"):
+            columns = await HotWindowController.get_columns_async(
+                session, server_id, quantity, lookback_days
+            )
+        if columns is not None:
+            return columns
+        with span("cold storage"):
+            archived = await ColdStorageController.get_price_columns_async(
+                session,
+                server_id,
+                quantity,
+                datetime.now() - timedelta(days=lookback_days),
+            )
+        with span("sql"):
+            columns = await fetch_price_columns_async(
+                session,
+                ItemPriceHistoryController._profitable_prices_statement(
+                    server_id, quantity, lookback_days, gids
+                ),
+            )
+        return columns if archived is None else PriceColumns.concat([archived, columns])
 
-            if min_price > 0:
-                profit_margin_pct = (profit_potential / min_price) * 100
-            else:
-                profit_margin_pct = 0
+    @staticmethod
+    def _merge_columns_by_server(
+        server_ids: list[int],
+        archived: dict[int, PriceColumns],
+        columns: dict[int, PriceColumns],
+    ) -> dict[int, PriceColumns]:
+        empty = PriceColumns.from_rows([])
+        return {
+            server_id: PriceColumns.concat(
+                [
+                    *([archived[server_id]] if server_id in archived else []),
+                    columns.get(server_id, empty),
+                ]
+            )
+            for server_id in server_ids
+        }
 
-            profitability_score = profit_potential * profit_margin_pct
+    @staticmethod
+    def _fetch_profitable_columns_by_server(
+        session: Session,
+        server_ids: list[int],
+        quantity: QuantityEnum | None,
+        lookback_days: int,
+        gids: set[int] | None = None,
+    ) -> dict[int, PriceColumns]:
+        """Prix de la période de chaque serveur, lus en une seule requête groupée
+        par serveur, précédés des prix archivés."""
+        with span("cold storage"):
+            archived = ColdStorageController.get_price_columns_by_server(
+                session,
+                server_ids,
+                quantity,
+                datetime.now() - timedelta(days=lookback_days),
+            )
+        with span("sql"):
+            columns = fetch_price_columns_by_server(
+                session,
+                ItemPriceHistoryController._profitable_prices_by_server_statement(
+                    server_ids, quantity, lookback_days, gids
+                ),
+            )
+        return ItemPriceHistoryController._merge_columns_by_server(
+            server_ids, archived, columns
+        )
 
-            item_name = I18N().name_by_id[data_reader.item_by_id[gid].nameId]
+    @staticmethod
+    async def _fetch_profitable_columns_by_server_async(
+        session: AsyncSession,
+        server_ids: list[int],
+        quantity: QuantityEnum | None,
+        lookback_days: int,
+        gids: set[int] | None = None,
+    ) -> dict[int, PriceColumns]:
+        """Prix de la période depuis la fenêtre en mémoire pour les serveurs
+        qu'elle couvre, les autres en une seule requête groupée par serveur."""
+        columns_by_server: dict[int, PriceColumns] = {}
+        with span("hot window"):
+            for server_id in server_ids:
+                window_columns = await HotWindowController.get_columns_async(
+                    session, server_id, quantity, lookback_days
+                )
+                if window_columns is not None:
+                    columns_by_server[server_id] = window_columns
+        missing = [
+            server_id for server_id in server_ids if server_id not in columns_by_server
+        ]
+        if not missing:
+            return columns_by_server
+        with span("cold storage"):
+            archived = await ColdStorageController.get_price_columns_by_server_async(
+                session,
+                missing,
+                quantity,
+                datetime.now() - timedelta(days=lookback_days),
+            )
+        with span("sql"):
+            columns = await fetch_price_columns_by_server_async(
+                session,
+                ItemPriceHistoryController._profitable_prices_by_server_statement(
+                    missing, quantity, lookback_days, gids
+                ),
+            )
+        columns_by_server.update(
+            ItemPriceHistoryController._merge_columns_by_server(
+                missing, archived, columns
+            )
+        )
+        return {server_id: columns_by_server[server_id] for server_id in server_ids}
 
-            profitable_items.append(
-                ProfitableItemSchema(
-                    gid=gid,
-                    name=item_name,
-                    avg_price=round(avg_price, 2),
-                    min_price=min_price,
-                    max_price=max_price,
-                    profit_potential=round(profit_potential, 2),
-                    profit_margin_pct=round(profit_margin_pct, 2),
-                    profitability_score=round(profitability_score, 2),
-                    volatility=round(std_dev, 2),
-                    samples=len(prices),
+    @staticmethod
+    def _rank_profitable_items(
+        columns: PriceColumns,
+        min_samples: int,
+        top_n: int,
+        category: CategoryEnum | None,
+        type_id: int | None,
+    ) -> list[ProfitableItemStruct]:
+        with span("statistics"):
+            stats = group_price_stats(columns, min_samples)
+
+        # Filtrer par catégorie ou type d'item si spécifié, les prix lus en base
+        # le sont déjà mais pas ceux de la fenêtre en mémoire ni des archives
+        data_reader = DataReader()
+        filtered_gids = ItemPriceHistoryController._get_filtered_gids(category, type_id)
+        if filtered_gids is not None:
+            stats = stats.filter(np.isin(stats.gids, list(filtered_gids)))
+
+        profit_potentials = stats.means - stats.mins
+        profit_margin_pcts = (
+            np.divide(
+                profit_potentials,
+                stats.mins,
+                out=np.zeros(len(stats)),
+                where=stats.mins > 0,
+            )
+            * 100
+        )
+        profitability_scores = profit_potentials * profit_margin_pcts
+
+        with span("ranking"):
+            # dans l'ordre d'apparition des items, pour départager les égalités
+            ranked = sorted(
+                (-round(score, 2), first_row, index)
+                for index, (score, first_row) in enumerate(
+                    zip(profitability_scores.tolist(), stats.first_rows.tolist())
                 )
             )
 
-        profitable_items.sort(key=lambda x: x.profitability_score, reverse=True)
+        profitable_items = []
+        with span("details"):
+            for negative_score, _, index in ranked[:top_n]:
+                gid = int(stats.gids[index])
+                item_name = I18N().name_by_id[data_reader.item_by_id[gid].nameId]
+                profitable_items.append(
+                    ProfitableItemStruct(
+                        gid=gid,
+                        name=item_name,
+                        avg_price=round(float(stats.means[index]), 2),
+                        min_price=float(stats.mins[index]),
+                        max_price=float(stats.maxs[index]),
+                        profit_potential=round(float(profit_potentials[index]), 2),
+                        profit_margin_pct=round(float(profit_margin_pcts[index]), 2),
+                        profitability_score=-negative_score,
+                        volatility=round(float(stats.stds[index]), 2),
+                        samples=int(stats.counts[index]),
+                    )
+                )
 
-        return profitable_items[:top_n]
+        return profitable_items
 
     @staticmethod
-    def get_top_profitable_crafts(
+    def get_top_profitable_items(
         session: Session,
         server_id: int,
         quantity: QuantityEnum | None = None,
@@ -338,125 +1032,211 @@ class ItemPriceHistoryController:
         top_n: int = 50,
         category: CategoryEnum | None = None,
         type_id: int | None = None,
-    ) -> list[ProfitableCraftSchema]:
-        """Retourne un classement des items les plus rentables à crafter.
+    ) -> list[ProfitableItemStruct]:
+        """Retourne un classement des items les plus rentables à acheter pour revendre.
 
-        Pour chaque recette disponible :
-        - Calcule le coût total des ingrédients (basé sur les prix moyens)
-        - Calcule le prix de vente moyen de l'item crafté
-        - Vérifie que l'item crafté se vend (a un historique de prix)
-        - Calcule le profit potentiel (prix de vente - coût de craft)
-        - Calcule la marge de profit en pourcentage
+        Calcule pour chaque item ayant des données historiques :
+        - Le prix moyen actuel (derniers enregistrements)
+        - Le prix minimum observé
+        - Le potentiel de profit (différence entre prix moyen et prix minimum)
+        - La volatilité des prix (écart-type)
 
-        Retourne une liste triée par profit potentiel décroissant.
+        Retourne une liste triée par rentabilité potentielle.
 
         Peut être filtré par catégorie, type d'item et quantité.
         """
-        since = datetime.now() - timedelta(days=lookback_days)
+        columns = ItemPriceHistoryController._fetch_profitable_columns(
+            session,
+            server_id,
+            quantity,
+            lookback_days,
+            ItemPriceHistoryController._get_sql_gids(
+                ItemPriceHistoryController._get_filtered_gids(category, type_id)
+            ),
+        )
+        return ItemPriceHistoryController._rank_profitable_items(
+            columns, min_samples, top_n, category, type_id
+        )
 
-        # Construire les filtres de base
-        filters = [
-            ItemPriceHistory.server_id == server_id,
-            ItemPriceHistory.recorded_at >= since,
-            ItemPriceHistory.price.isnot(None),
-        ]
+    @staticmethod
+    async def get_top_profitable_items_async(
+        session: AsyncSession,
+        server_id: int,
+        quantity: QuantityEnum | None = None,
+        lookback_days: int = 30,
+        min_samples: int = 5,
+        top_n: int = 50,
+        category: CategoryEnum | None = None,
+        type_id: int | None = None,
+    ) -> list[ProfitableItemStruct]:
+        columns = await ItemPriceHistoryController._fetch_profitable_columns_async(
+            session,
+            server_id,
+            quantity,
+            lookback_days,
+            ItemPriceHistoryController._get_sql_gids(
+                ItemPriceHistoryController._get_filtered_gids(category, type_id)
+            ),
+        )
+        # the aggregation is CPU bound, keep the event loop free for other requests
+        return await asyncio.to_thread(
+            ItemPriceHistoryController._rank_profitable_items,
+            columns,
+            min_samples,
+            top_n,
+            category,
+            type_id,
+        )
 
-        # Ajouter le filtre de quantité si spécifié
-        if quantity is not None:
-            filters.append(ItemPriceHistory.quantity == quantity)
+    @staticmethod
+    def _rank_profitable_items_by_server(
+        columns_by_server: dict[int, PriceColumns],
+        min_samples: int,
+        top_n: int,
+        category: CategoryEnum | None,
+        type_id: int | None,
+    ) -> dict[int, list[ProfitableItemStruct]]:
+        return {
+            server_id: ItemPriceHistoryController._rank_profitable_items(
+                columns, min_samples, top_n, category, type_id
+            )
+            for server_id, columns in columns_by_server.items()
+        }
 
-        # Récupérer tous les prix historiques
-        prices_data = (
-            session.query(
-                ItemPriceHistory.gid,
-                ItemPriceHistory.price,
+    @staticmethod
+    def get_top_profitable_items_by_server(
+        session: Session,
+        server_ids: list[int],
+        quantity: QuantityEnum | None = None,
+        lookback_days: int = 30,
+        min_samples: int = 5,
+        top_n: int = 50,
+        category: CategoryEnum | None = None,
+        type_id: int | None = None,
+    ) -> dict[int, list[ProfitableItemStruct]]:
+        """Classement des items les plus rentables de chaque serveur, comme
+        `get_top_profitable_items`, les prix de tous les serveurs étant lus en une
+        seule requête."""
+        columns_by_server = (
+            ItemPriceHistoryController._fetch_profitable_columns_by_server(
+                session,
+                server_ids,
+                quantity,
+                lookback_days,
+                ItemPriceHistoryController._get_sql_gids(
+                    ItemPriceHistoryController._get_filtered_gids(category, type_id)
+                ),
             )
-            .filter(*filters)
-            .all()
+        )
+        return ItemPriceHistoryController._rank_profitable_items_by_server(
+            columns_by_server, min_samples, top_n, category, type_id
+        )
+
+    @staticmethod
+    async def get_top_profitable_items_by_server_async(
+        session: AsyncSession,
+        server_ids: list[int],
+        quantity: QuantityEnum | None = None,
+        lookback_days: int = 30,
+        min_samples: int = 5,
+        top_n: int = 50,
+        category: CategoryEnum | None = None,
+        type_id: int | None = None,
+    ) -> dict[int, list[ProfitableItemStruct]]:
+        columns_by_server = (
+            await ItemPriceHistoryController._fetch_profitable_columns_by_server_async(
+                session,
+                server_ids,
+                quantity,
+                lookback_days,
+                ItemPriceHistoryController._get_sql_gids(
+                    ItemPriceHistoryController._get_filtered_gids(category, type_id)
+                ),
+            )
+        )
+        # the aggregation is CPU bound, keep the event loop free for other requests
+        return await asyncio.to_thread(
+            ItemPriceHistoryController._rank_profitable_items_by_server,
+            columns_by_server,
+            min_samples,
+            top_n,
+            category,
+            type_id,
         )
 
+    @staticmethod
+    def _rank_profitable_crafts(
+        columns: PriceColumns,
+        min_samples: int,
+        top_n: int,
+        category: CategoryEnum | None,
+        type_id: int | None,
+        current_prices: dict[int, int] | None = None,
+    ) -> list[ProfitableCraftStruct]:
         # Calculer le prix moyen pour chaque item
-        items_prices = {}
-        items_price_counts = {}
-        for gid, price in prices_data:
-            if gid not in items_prices:
-                items_prices[gid] = 0
-                items_price_counts[gid] = 0
-            items_prices[gid] += price
-            items_price_counts[gid] += 1
-
-        avg_prices = {
-            gid: items_prices[gid] / items_price_counts[gid]
-            for gid in items_prices
-            if items_price_counts[gid] >= min_samples
-        }
+        with span("average prices"):
+            stats = group_price_stats(columns, min_samples)
+            avg_prices = stats.mean_by_gid()
+            items_price_counts = dict(zip(stats.gids.tolist(), stats.counts.tolist()))
+            # au prix courant, seulement les items en vente au dernier relevé
+            if current_prices is not None:
+                avg_prices = {
+                    gid: float(current_prices[gid])
+                    for gid in avg_prices
+                    if gid in current_prices
+                }
 
         # Filtrer les items par catégorie ou type si spécifié
         data_reader = DataReader()
-        filtered_result_ids = None
-        if category is not None or type_id is not None:
-            filtered_result_ids = set(avg_prices.keys())
-
-            if category is not None:
-                category_gids = data_reader.item_ids_by_category.get(category, set())
-                filtered_result_ids &= category_gids
-
-            if type_id is not None:
-                type_gids = data_reader.item_ids_by_type_id.get(type_id, set())
-                filtered_result_ids &= type_gids
-
-        profitable_crafts = []
-        recipes = data_reader.recipes
-
-        for recipe in recipes:
-            result_id = recipe.resultId
-
-            # Vérifier que l'item crafté se vend (a un historique de prix suffisant)
-            if result_id not in avg_prices:
-                continue
-
-            # Filtrer par catégorie/type si spécifié
-            if filtered_result_ids is not None and result_id not in filtered_result_ids:
-                continue
-
-            # Calculer le coût des ingrédients
-            craft_cost = 0
-            all_ingredients_available = True
-
-            for ingredient_id, quantity_needed in zip(
-                recipe.ingredientIds, recipe.quantities
-            ):
-                if ingredient_id not in avg_prices:
-                    # Si un ingrédient n'a pas de prix, on ne peut pas calculer le coût
-                    all_ingredients_available = False
-                    break
-                craft_cost += avg_prices[ingredient_id] * quantity_needed
-
-            if not all_ingredients_available:
-                continue
-
-            # Prix de vente moyen de l'item crafté
-            sell_price = avg_prices[result_id]
-
-            # Profit brut
-            profit = sell_price - craft_cost
+        filtered_result_ids = ItemPriceHistoryController._get_filtered_gids(
+            category, type_id
+        )
 
-            # Ignorer les recettes non rentables
-            if profit <= 0:
-                continue
+        # (recette, (prix de vente, coût, profit, marge)) des recettes rentables
+        candidates = []
+        with span("recipes"):
+            for recipe in data_reader.recipes:
+                # Vérifier que l'item crafté se vend (a un historique de prix suffisant)
+                if recipe.resultId not in avg_prices:
+                    continue
+
+                # Filtrer par catégorie/type si spécifié
+                if (
+                    filtered_result_ids is not None
+                    and recipe.resultId not in filtered_result_ids
+                ):
+                    continue
+
+                candidate = evaluate_recipe(
+                    recipe, avg_prices.get, data_reader.item_by_id
+                )
+                if candidate is not None:
+                    candidates.append((recipe, candidate))
 
-            # Marge de profit en pourcentage
-            if craft_cost > 0:
-                profit_margin_pct = (profit / craft_cost) * 100
-            else:
-                profit_margin_pct = 0
+        # Trier par profit décroissant, les détails ne sont construits que pour le top
+        candidates.sort(
+            key=lambda candidate: round(candidate[1].profit, 2), reverse=True
+        )
 
-            # Récupérer les informations de l'item
-            item = data_reader.item_by_id.get(result_id)
-            if not item or not item.nameId:
-                continue
+        with span("details"):
+            return ItemPriceHistoryController._to_profitable_crafts(
+                candidates[:top_n],
+                avg_prices.__getitem__,
+                items_price_counts.__getitem__,
+            )
 
-            item_name = I18N().name_by_id.get(item.nameId, f"Item {result_id}")
+    @staticmethod
+    def _to_profitable_crafts(
+        ranked: list[tuple[object, CraftCandidate]],
+        get_price: Callable[[int], float],
+        get_samples: Callable[[int], int],
+    ) -> list[ProfitableCraftStruct]:
+        """Détails des recettes classées, aux prix de `get_price`."""
+        data_reader = DataReader()
+        profitable_crafts = []
+        for recipe, candidate in ranked:
+            item = data_reader.item_by_id[recipe.resultId]
+            item_name = I18N().name_by_id.get(item.nameId, f"Item {recipe.resultId}")
 
             # Détails des ingrédients
             ingredients_detail = []
@@ -465,36 +1245,152 @@ class ItemPriceHistoryController:
             ):
                 ingredient_item = data_reader.item_by_id.get(ingredient_id)
                 ingredient_name = (
-                    I18N().name_by_id.get(ingredient_item.nameId, f"Item {ingredient_id}")
+                    I18N().name_by_id.get(
+                        ingredient_item.nameId, f"Item {ingredient_id}"
+                    )
                     if ingredient_item and ingredient_item.nameId
                     else f"Item {ingredient_id}"
                 )
+                unit_price = get_price(ingredient_id)
                 ingredients_detail.append(
-                    IngredientDetailSchema(
+                    IngredientDetailStruct(
                         id=ingredient_id,
                         name=ingredient_name,
                         quantity=quantity_needed,
-                        unit_price=round(avg_prices[ingredient_id], 2),
-                        total_price=round(
-                            avg_prices[ingredient_id] * quantity_needed, 2
-                        ),
+                        unit_price=round(unit_price, 2),
+                        total_price=round(unit_price * quantity_needed, 2),
                     )
                 )
 
             profitable_crafts.append(
-                ProfitableCraftSchema(
-                    result_id=result_id,
+                ProfitableCraftStruct(
+                    result_id=recipe.resultId,
                     result_name=item_name,
-                    sell_price=round(sell_price, 2),
-                    craft_cost=round(craft_cost, 2),
-                    profit=round(profit, 2),
-                    profit_margin_pct=round(profit_margin_pct, 2),
+                    sell_price=round(candidate.sell_price, 2),
+                    craft_cost=round(float(candidate.craft_cost), 2),
+                    profit=round(candidate.profit, 2),
+                    profit_margin_pct=round(float(candidate.profit_margin_pct), 2),
                     ingredients=ingredients_detail,
-                    samples=items_price_counts[result_id],
+                    samples=get_samples(recipe.resultId),
                 )
             )
 
-        # Trier par profit décroissant
-        profitable_crafts.sort(key=lambda x: x.profit, reverse=True)
+        return profitable_crafts
+
+    @staticmethod
+    async def get_incremental_top_crafts_async(
+        session: AsyncSession,
+        server_id: int,
+        quantity: QuantityEnum | None = None,
+        top_n: int = 50,
+        current_prices: bool = False,
+    ) -> tuple[datetime, list[ProfitableCraftStruct]] | None:
+        """Top des crafts du classement incrémental et la date de son dernier
+        recalcul complet, None si le serveur n'y est pas chargé."""
+        top = await CraftRankingController.get_top_async(
+            session, server_id, quantity, current_prices, top_n
+        )
+        if top is None:
+            return None
+        server_crafts, ranked = top
+
+        def get_price(gid: int) -> float:
+            # the ingredients of a ranked recipe all have a price
+            return server_crafts.get_price(gid, quantity, current_prices) or 0.0
+
+        return (
+            server_crafts.computed_at,
+            ItemPriceHistoryController._to_profitable_crafts(
+                ranked,
+                get_price,
+                lambda gid: server_crafts.get_samples(gid, quantity),
+            ),
+        )
+
+    @staticmethod
+    def get_top_profitable_crafts(
+        session: Session,
+        server_id: int,
+        quantity: QuantityEnum | None = None,
+        lookback_days: int = 30,
+        min_samples: int = 5,
+        top_n: int = 50,
+        category: CategoryEnum | None = None,
+        type_id: int | None = None,
+        current_prices: bool = False,
+    ) -> list[ProfitableCraftStruct]:
+        """Retourne un classement des items les plus rentables à crafter.
+
+        Pour chaque recette disponible :
+        - Calcule le coût total des ingrédients (basé sur les prix moyens)
+        - Calcule le prix de vente moyen de l'item crafté
+        - Vérifie que l'item crafté se vend (a un historique de prix)
+        - Calcule le profit potentiel (prix de vente - coût de craft)
+        - Calcule la marge de profit en pourcentage
+
+        Retourne une liste triée par profit potentiel décroissant.
+
+        Peut être filtré par catégorie, type d'item et quantité. Avec
+        `current_prices`, les recettes sont évaluées au dernier prix relevé des
+        items au lieu de leur prix moyen sur la période.
+        """
+        gids = ItemPriceHistoryController._get_sql_gids(
+            ItemPriceHistoryController._get_craft_gids(
+                ItemPriceHistoryController._get_filtered_gids(category, type_id)
+            )
+        )
+        columns = ItemPriceHistoryController._fetch_profitable_columns(
+            session, server_id, quantity, lookback_days, gids
+        )
+        return ItemPriceHistoryController._rank_profitable_crafts(
+            columns,
+            min_samples,
+            top_n,
+            category,
+            type_id,
+            (
+                LatestItemPriceController.get_current_prices(
+                    session, server_id, quantity, gids
+                )
+                if current_prices
+                else None
+            ),
+        )
 
-        return profitable_crafts[:top_n]
+    @staticmethod
+    async def get_top_profitable_crafts_async(
+        session: AsyncSession,
+        server_id: int,
+        quantity: QuantityEnum | None = None,
+        lookback_days: int = 30,
+        min_samples: int = 5,
+        top_n: int = 50,
+        category: CategoryEnum | None = None,
+        type_id: int | None = None,
+        current_prices: bool = False,
+    ) -> list[ProfitableCraftStruct]:
+        gids = ItemPriceHistoryController._get_sql_gids(
+            ItemPriceHistoryController._get_craft_gids(
+                ItemPriceHistoryController._get_filtered_gids(category, type_id)
+            )
+        )
+        columns = await ItemPriceHistoryController._fetch_profitable_columns_async(
+            session, server_id, quantity, lookback_days, gids
+        )
+        prices = (
+            await LatestItemPriceController.get_current_prices_async(
+                session, server_id, quantity, gids
+            )
+            if current_prices
+            else None
+        )
+        # the aggregation is CPU bound, keep the event loop free for other requests
+        return await asyncio.to_thread(
+            ItemPriceHistoryController._rank_profitable_crafts,
+            columns,
+            min_samples,
+            top_n,
+            category,
+            type_id,
+            prices,
+        )
@@ -0,0 +1,218 @@
+from sqlalchemy import CTE, Select, delete, func, insert, select
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from src.controllers.utils import UpsertInsert, in_array, insert_statement
+from src.models.item_price_history import ItemPriceHistory, QuantityEnum
+from src.models.latest_item_price import LatestItemPrice
+from src.schemas.item_price_history import LatestItemPriceStruct
+
+KEY_COLUMNS = ["server_id", "gid", "quantity"]
+COLUMNS = [*KEY_COLUMNS, "price", "recorded_at", "change_version"]
+
+
+class LatestItemPriceController:
+    """Prix courant des items, tenu à jour à l'insertion de l'historique."""
+
+    @staticmethod
+    def _on_conflict(statement: UpsertInsert) -> UpsertInsert:
+        # an older price, sent late, does not replace a newer one
+        return statement.on_conflict_do_update(
+            index_elements=KEY_COLUMNS,
+            set_={
+                "price": statement.excluded.price,
+                "recorded_at": statement.excluded.recorded_at,
+                "change_version": statement.excluded.change_version,
+            },
+            where=statement.excluded.recorded_at >= LatestItemPrice.recorded_at,
+        )
+
+    @staticmethod
+    def _upsert_statement(session: Session | AsyncSession, rows: list[dict]):
+        # a row can only be upserted once per statement, the last one wins
+        latest_rows = {
+            tuple(row[column] for column in KEY_COLUMNS): {
+                column: row[column] for column in COLUMNS
+            }
+            for row in rows
+        }
+        return LatestItemPriceController._on_conflict(
+            insert_statement(session, LatestItemPrice).values(
+                list(latest_rows.values())
+            )
+        )
+
+    @staticmethod
+    def upsert_from_statement(history: CTE) -> UpsertInsert:
+        """PostgreSQL upsert of the latest prices from the rows returned by the
+        insertion of the history `history`, in the same statement."""
+        keys = [history.c[column] for column in KEY_COLUMNS]
+        # a row can only be upserted once per statement, the last one wins
+        return LatestItemPriceController._on_conflict(
+            postgresql.insert(LatestItemPrice).from_select(
+                COLUMNS,
+                select(*(history.c[column] for column in COLUMNS))
+                .distinct(*keys)
+                .order_by(*keys, history.c.id.desc()),
+            )
+        )
+
+    @staticmethod
+    def upsert(session: Session, rows: list[dict]):
+        """Record the inserted history rows as the latest prices, in the current
+        transaction."""
+        if rows:
+            session.execute(LatestItemPriceController._upsert_statement(session, rows))
+
+    @staticmethod
+    async def upsert_async(session: AsyncSession, rows: list[dict]):
+        if rows:
+            await session.execute(
+                LatestItemPriceController._upsert_statement(session, rows)
+            )
+
+    @staticmethod
+    def _latest_prices_statement(
+        server_id: int, gids: list[int] | None, quantity: QuantityEnum | None
+    ) -> Select:
+        statement = select(
+            LatestItemPrice.gid,
+            LatestItemPrice.quantity,
+            LatestItemPrice.price,
+            LatestItemPrice.recorded_at,
+        ).filter(LatestItemPrice.server_id == server_id)
+        if gids is not None:
+            statement = statement.filter(in_array(LatestItemPrice.gid, gids))
+        if quantity is not None:
+            statement = statement.filter(LatestItemPrice.quantity == quantity)
+        return statement.order_by(LatestItemPrice.gid, LatestItemPrice.quantity)
+
+    @staticmethod
+    def get_latest_prices(
+        session: Session,
+        server_id: int,
+        gids: list[int] | None = None,
+        quantity: QuantityEnum | None = None,
+    ) -> list[LatestItemPriceStruct]:
+        """Dernier relevé des items `gids` (tous si None), pour chaque quantité ou
+        seulement `quantity`, par la clé primaire."""
+        return [
+            LatestItemPriceStruct(*row)
+            for row in session.execute(
+                LatestItemPriceController._latest_prices_statement(
+                    server_id, gids, quantity
+                )
+            )
+        ]
+
+    @staticmethod
+    async def get_latest_prices_async(
+        session: AsyncSession,
+        server_id: int,
+        gids: list[int] | None = None,
+        quantity: QuantityEnum | None = None,
+    ) -> list[LatestItemPriceStruct]:
+        return [
+            LatestItemPriceStruct(*row)
+            for row in await session.execute(
+                LatestItemPriceController._latest_prices_statement(
+                    server_id, gids, quantity
+                )
+            )
+        ]
+
+    @staticmethod
+    def _current_prices_statement(
+        server_id: int, quantity: QuantityEnum | None, gids: set[int] | None
+    ) -> Select:
+        return select(
+            LatestItemPrice.gid,
+            LatestItemPrice.quantity,
+            LatestItemPrice.price,
+            LatestItemPrice.recorded_at,
+        ).filter(
+            LatestItemPrice.server_id == server_id,
+            LatestItemPrice.price.isnot(None),
+            *([] if quantity is None else [LatestItemPrice.quantity == quantity]),
+            *([] if gids is None else [in_array(LatestItemPrice.gid, gids)]),
+        )
+
+    @staticmethod
+    def _to_current_prices(rows) -> dict[int, int]:
+        # the quantities of a bulk insert share their recorded_at, the largest wins
+        latest: dict[int, tuple[tuple, int]] = {}
+        for gid, quantity, price, recorded_at in rows:
+            key = (recorded_at, QuantityEnum(quantity).value)
+            if gid not in latest or key > latest[gid][0]:
+                latest[gid] = (key, price)
+        return {gid: price for gid, (_, price) in latest.items()}
+
+    @staticmethod
+    def get_current_prices(
+        session: Session,
+        server_id: int,
+        quantity: QuantityEnum | None = None,
+        gids: set[int] | None = None,
+    ) -> dict[int, int]:
+        """Prix courant des items en vente au dernier relevé, toutes quantités
+        confondues le plus récent, comme les moyennes sans quantité. Seulement ceux
+        des items `gids` s'ils sont donnés."""
+        return LatestItemPriceController._to_current_prices(
+            session.execute(
+                LatestItemPriceController._current_prices_statement(
+                    server_id, quantity, gids
+                )
+            )
+        )
+
+    @staticmethod
+    async def get_current_prices_async(
+        session: AsyncSession,
+        server_id: int,
+        quantity: QuantityEnum | None = None,
+        gids: set[int] | None = None,
+    ) -> dict[int, int]:
+        return LatestItemPriceController._to_current_prices(
+            await session.execute(
+                LatestItemPriceController._current_prices_statement(
+                    server_id, quantity, gids
+                )
+            )
+        )
+
+    @staticmethod
+    def rebuild(session: Session):
+        """Recompute every latest price from the history, after it was loaded
+        without `bulk_insert`."""
+        ranked = select(
+            ItemPriceHistory.server_id,
+            ItemPriceHistory.gid,
+            ItemPriceHistory.quantity,
+            ItemPriceHistory.price,
+            ItemPriceHistory.recorded_at,
+            ItemPriceHistory.change_version,
+            func.row_number()
+            .over(
+                partition_by=(
+                    ItemPriceHistory.server_id,
+                    ItemPriceHistory.gid,
+                    ItemPriceHistory.quantity,
+                ),
+                order_by=(
+                    ItemPriceHistory.recorded_at.desc(),
+                    ItemPriceHistory.id.desc(),
+                ),
+            )
+            .label("rank"),
+        ).subquery()
+        session.execute(delete(LatestItemPrice))
+        session.execute(
+            insert(LatestItemPrice).from_select(
+                COLUMNS,
+                select(*(ranked.c[column] for column in COLUMNS)).filter(
+                    ranked.c.rank == 1
+                ),
+            )
+        )
+        session.commit()
@@ -0,0 +1,183 @@
+import asyncio
+from datetime import datetime, timedelta
+from typing import Sequence
+
+import msgspec
+import numpy as np
+from sqlalchemy import delete, func, insert, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.catalog import CategoryEnum
+from src.const import (
+    RANKING_LOOKBACK_DAYS,
+    RANKING_MATERIALIZER_INTERVAL_SECONDS,
+    RANKING_MIN_SAMPLES,
+    RANKING_TOP_N,
+)
+from src.controllers.item_price_history import ItemPriceHistoryController
+from src.models.item_price_history import ItemPriceHistory, QuantityEnum
+from src.models.top_ranking import RankingKindEnum, TopRanking
+from src.price_stats import PriceColumns
+
+# arbitrary key, with the server id it keeps two workers off the same server
+MATERIALIZER_LOCK_ID = 7_340_013
+
+
+class TopRankingController:
+    @staticmethod
+    def is_materialized(
+        lookback_days: int, min_samples: int, top_n: int, type_id: int | None
+    ) -> bool:
+        """Seuls les classements avec les paramètres par défaut sont précalculés."""
+        return (
+            lookback_days == RANKING_LOOKBACK_DAYS
+            and min_samples == RANKING_MIN_SAMPLES
+            and top_n <= RANKING_TOP_N
+            and type_id is None
+        )
+
+    @staticmethod
+    async def get_ranking_async(
+        session: AsyncSession,
+        kind: RankingKindEnum,
+        server_id: int,
+        quantity: QuantityEnum | None,
+        category: CategoryEnum | None,
+        max_staleness: timedelta = timedelta(
+            seconds=3 * RANKING_MATERIALIZER_INTERVAL_SECONDS
+        ),
+    ) -> TopRanking | None:
+        """Return the materialized ranking, None when it is missing or too old."""
+        ranking = await session.scalar(
+            select(TopRanking).filter(
+                TopRanking.kind == kind,
+                TopRanking.server_id == server_id,
+                TopRanking.quantity == quantity,
+                TopRanking.category_id == (category.value if category else None),
+            )
+        )
+        if ranking is None or datetime.now() - ranking.computed_at > max_staleness:
+            return None
+        return ranking
+
+    @staticmethod
+    def _compute_server_rankings(
+        server_id: int,
+        # (gid, price, quantity) rows
+        prices_data: Sequence[Sequence],
+        computed_at: datetime,
+    ) -> list[dict]:
+        rankings = []
+        columns = PriceColumns.from_rows(prices_data)
+        quantities = np.array([row[2].value for row in prices_data], dtype=np.int64)
+        for quantity in [None, *QuantityEnum]:
+            quantity_columns = (
+                columns if quantity is None else columns.filter(quantities == quantity)
+            )
+            for category in [None, *CategoryEnum]:
+                items = ItemPriceHistoryController._rank_profitable_items(
+                    quantity_columns, RANKING_MIN_SAMPLES, RANKING_TOP_N, category, None
+                )
+                crafts = ItemPriceHistoryController._rank_profitable_crafts(
+                    quantity_columns, RANKING_MIN_SAMPLES, RANKING_TOP_N, category, None
+                )
+                for kind, ranking in (
+                    (RankingKindEnum.ITEMS, items),
+                    (RankingKindEnum.CRAFTS, crafts),
+                ):
+                    rankings.append(
+                        {
+                            "kind": kind,
+                            "server_id": server_id,
+                            "quantity": quantity,
+                            "category_id": category.value if category else None,
+                            "payload": msgspec.to_builtins(ranking),
+                            "computed_at": computed_at,
+                        }
+                    )
+        return rankings
+
+    @staticmethod
+    async def materialize_server_async(
+        session: AsyncSession,
+        server_id: int,
+        min_interval: timedelta = timedelta(
+            seconds=RANKING_MATERIALIZER_INTERVAL_SECONDS / 2
+        ),
+    ) -> bool:
+        """Recompute every ranking of a server, returns False when skipped because
+        another worker holds it or computed it recently."""
+        if session.bind.dialect.name == "postgresql":
+            locked = await session.scalar(
+                text("SELECT pg_try_advisory_xact_lock(:lock_id, :server_id)"),
+                {"lock_id": MATERIALIZER_LOCK_ID, "server_id": server_id},
+            )
+            if not locked:
+                await session.rollback()
+                return False
+
+        computed_at = datetime.now()
+        last_computed_at = await session.scalar(
+            select(func.max(TopRanking.computed_at)).filter(
+                TopRanking.server_id == server_id
+            )
+        )
+        if (
+            last_computed_at is not None
+            and computed_at - last_computed_at < min_interval
+        ):
+            await session.rollback()
+            return False
+
+        since = computed_at - timedelta(days=RANKING_LOOKBACK_DAYS)
+        prices_data = (
+            await session.execute(
+                select(
+                    ItemPriceHistory.gid,
+                    ItemPriceHistory.price,
+                    ItemPriceHistory.quantity,
+                ).filter(
+                    ItemPriceHistory.server_id == server_id,
+                    ItemPriceHistory.recorded_at >= since,
+                    ItemPriceHistory.price.isnot(None),
+                )
+            )
+        ).all()
+        rankings = await asyncio.to_thread(
+            TopRankingController._compute_server_rankings,
+            server_id,
+            prices_data,
+            computed_at,
+        )
+
+        await session.execute(
+            delete(TopRanking).where(TopRanking.server_id == server_id)
+        )
+        await session.execute(insert(TopRanking), rankings)
+        await session.commit()
+        return True
+
+    @staticmethod
+    async def get_active_server_ids_async(session: AsyncSession) -> list[int]:
+        since = datetime.now() - timedelta(days=RANKING_LOOKBACK_DAYS)
+        return list(
+            await session.scalars(
+                select(ItemPriceHistory.server_id)
+                .filter(ItemPriceHistory.recorded_at >= since)
+                .distinct()
+            )
+        )
+
+    @staticmethod
+    async def materialize_async(session: AsyncSession, **kwargs) -> list[int]:
+        """Materialize the rankings of every active server, returns the servers done."""
+        materialized = []
+        server_ids = await TopRankingController.get_active_server_ids_async(session)
+        for server_id in server_ids:
+            # one transaction per server, its advisory lock is released on commit
+            await session.rollback()
+            if await TopRankingController.materialize_server_async(
+                session, server_id, **kwargs
+            ):
+                materialized.append(server_id)
+        return materialized
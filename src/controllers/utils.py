@@ -1,8 +1,26 @@
-from typing import Type, TypeVar
+from typing import Iterable, Type, TypeVar
 
-from sqlalchemy import func
+from sqlalchemy import (
+    JSON,
+    Boolean,
+    ColumnElement,
+    Insert,
+    Integer,
+    TypeDecorator,
+    bindparam,
+    func,
+    inspect,
+    literal_column,
+    select,
+)
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.orm import Session
+from sqlalchemy.sql import coercions, roles
+from sqlalchemy.sql._typing import _ColumnExpressionArgument
 from sqlalchemy.sql.base import ExecutableOption
+from sqlalchemy.sql.visitors import InternalTraversal
 
 from src.models.base import Base
 
@@ -11,7 +29,111 @@ def get_auto_id(session: Session, model: Type[Base]) -> int:
     return session.query(func.max(model.id)).scalar() + 1  # type: ignore
 
 
-T = TypeVar("T")
+T = TypeVar("T", bound=Base)
+
+# the INSERT of the dialects supporting ON CONFLICT
+UpsertInsert = postgresql.Insert | sqlite.Insert
+
+
+class IntegerArray(TypeDecorator):
+    """A list of integers bound as one parameter: an integer[] on PostgreSQL, a
+    JSON array elsewhere."""
+
+    impl = JSON
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == "postgresql":
+            return dialect.type_descriptor(postgresql.ARRAY(Integer))
+        return dialect.type_descriptor(JSON())
+
+
+class in_array(ColumnElement[bool]):
+    """`column IN values` with the values in a single array parameter, rendered
+    `column = ANY(:values)` on PostgreSQL. Unlike an expanding IN, the SQL does not
+    depend on the number of values, the statement stays in the caches."""
+
+    inherit_cache = True
+    type = Boolean()
+    _traverse_internals = [
+        ("column", InternalTraversal.dp_clauseelement),
+        ("values", InternalTraversal.dp_clauseelement),
+    ]
+
+    def __init__(self, column: _ColumnExpressionArgument[int], values: Iterable[int]):
+        # an ORM attribute becomes its column, like in the operators of SQLAlchemy
+        self.column = coercions.expect(roles.ExpressionElementRole, column)
+        self.values = bindparam(None, sorted(values), type_=IntegerArray())
+
+
+@compiles(in_array)
+def _compile_in_array(element: in_array, compiler, **kw) -> str:
+    return "{} IN (SELECT value FROM json_each({}))".format(
+        compiler.process(element.column, **kw),
+        compiler.process(element.values, **kw),
+    )
+
+
+@compiles(in_array, "postgresql")
+def _compile_in_array_postgresql(element: in_array, compiler, **kw) -> str:
+    return "{} = ANY({})".format(
+        compiler.process(element.column, **kw),
+        compiler.process(element.values, **kw),
+    )
+
+
+def insert_statement(session: Session | AsyncSession, model: Type[T]) -> UpsertInsert:
+    """Dialect specific INSERT, exposing `on_conflict_do_update`/`excluded`."""
+    dialect = session.get_bind().dialect.name
+    if dialect == "postgresql":
+        return postgresql.insert(model)
+    if dialect == "sqlite":
+        return sqlite.insert(model)
+    raise NotImplementedError(f"upsert is not supported by {dialect}")
+
+
+def upsert_statement(
+    session: Session | AsyncSession,
+    model: Type[T],
+    rows: list[dict],
+    update_columns: list[str] | None = None,
+    index_elements: list[str] | None = None,
+) -> Insert:
+    """`INSERT ... ON CONFLICT DO UPDATE ... RETURNING model` for PostgreSQL and SQLite.
+
+    Conflicts are detected on `index_elements` (the primary key by default) and
+    `update_columns` are overwritten with the inserted values, the row is always
+    returned even when nothing has to be updated.
+    """
+    statement = insert_statement(session, model)
+    if index_elements is None:
+        index_elements = [column.name for column in inspect(model).primary_key]
+    # a no-op update on the conflict target still locks and returns the row
+    update_columns = update_columns or index_elements[:1]
+
+    statement = statement.values(rows)
+    return statement.on_conflict_do_update(
+        index_elements=index_elements,
+        set_={column: statement.excluded[column] for column in update_columns},
+    ).returning(model)
+
+
+def _upsert_one_statement(
+    session: Session | AsyncSession, model: Type[T], defaults: dict | None, kwargs: dict
+):
+    index_elements = [column.name for column in inspect(model).primary_key]
+    statement = upsert_statement(
+        session,
+        model,
+        [kwargs | (defaults or {})],
+        # defaults only apply on creation, like in the select mode
+        update_columns=[key for key in kwargs if key not in index_elements],
+        index_elements=index_elements,
+    )
+    if session.get_bind().dialect.name == "postgresql":
+        # xmax is 0 for a freshly inserted row version
+        statement = statement.returning(literal_column("xmax = 0").label("created"))
+    return statement
 
 
 def get_or_create(
@@ -20,8 +142,25 @@ def get_or_create(
     commit: bool = True,
     options: list[ExecutableOption] | None = None,
     defaults: dict | None = None,
+    upsert: bool = False,
     **kwargs,
 ) -> tuple[T, bool]:
+    """Get the row matching `kwargs` or create it with `defaults`.
+
+    With `upsert`, a single `INSERT ... ON CONFLICT` on the primary key replaces the
+    SELECT then INSERT: the row is created or its non key `kwargs` columns updated,
+    without race between concurrent callers. The created flag is only reported by
+    PostgreSQL, it is False on other databases.
+    """
+    if upsert:
+        row = session.execute(
+            _upsert_one_statement(session, model, defaults, kwargs),
+            execution_options={"populate_existing": True},
+        ).one()
+        if commit:
+            session.commit()
+        return row[0], bool(getattr(row, "created", False))
+
     query = session.query(model).filter_by(**kwargs)
     if options is not None:
         query = query.options(*options)
@@ -36,3 +175,39 @@ def get_or_create(
         if commit:
             session.commit()
         return instance, True
+
+
+async def get_or_create_async(
+    session: AsyncSession,
+    model: Type[T],
+    commit: bool = True,
+    options: list[ExecutableOption] | None = None,
+    defaults: dict | None = None,
+    upsert: bool = False,
+    **kwargs,
+) -> tuple[T, bool]:
+    if upsert:
+        row = (
+            await session.execute(
+                _upsert_one_statement(session, model, defaults, kwargs),
+                execution_options={"populate_existing": True},
+            )
+        ).one()
+        if commit:
+            await session.commit()
+        return row[0], bool(getattr(row, "created", False))
+
+    query = select(model).filter_by(**kwargs)
+    if options is not None:
+        query = query.options(*options)
+
+    instance = (await session.scalars(query.limit(1))).first()
+    if instance is not None:
+        return instance, False
+    else:
+        kwargs |= defaults or {}
+        instance = model(**kwargs)
+        session.add(instance)
+        if commit:
+            await session.commit()
+        return instance, True
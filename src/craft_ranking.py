@@ -0,0 +1,315 @@
+"""Incremental ranking of the crafts by profit, per server.
+
+A ServerCrafts keeps, for every item and quantity of a server, the count and sum of
+the prices recorded since `since` and the latest price, with the profit of every
+recipe in a heap per (quantity, pricing). A new price only re-evaluates the recipes
+using its item, found through the RecipeIndex, and the top crafts are read from the
+top of the heap instead of going through every recipe.
+
+The recipes are evaluated apart from the heaps being updated: the evaluations run
+in a thread, off the event loop, and are published to the heaps on it.
+
+The statistics of quantity None are the sums over the quantities, like the
+rankings without quantity filter. Samples older than `since` are not expired one by
+one: the whole table is rebuilt periodically.
+"""
+
+import heapq
+import itertools
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Callable, Iterable, Mapping, NamedTuple, Sequence
+
+from src.models.item_price_history import QuantityEnum
+
+QUANTITIES: list[QuantityEnum | None] = [None, *QuantityEnum]
+
+
+class CraftCandidate(NamedTuple):
+    sell_price: float
+    craft_cost: float
+    profit: float
+    profit_margin_pct: float
+
+
+# (-rounded profit, recipe index, counter, candidate) of a ProfitHeap
+HeapEntry = tuple[float, int, int, CraftCandidate]
+# (heap key, recipe index, candidate) of an evaluated recipe
+Evaluation = tuple[tuple[QuantityEnum | None, bool], int, CraftCandidate | None]
+
+
+def evaluate_recipe(
+    recipe, get_price: Callable[[int], float | None], item_by_id: Mapping
+) -> CraftCandidate | None:
+    """Profit of `recipe` at the prices of `get_price`, None when an item has no
+    price, when the craft is not profitable or when its result is unknown."""
+    sell_price = get_price(recipe.resultId)
+    if sell_price is None:
+        return None
+    craft_cost = 0
+    for ingredient_id, quantity_needed in zip(recipe.ingredientIds, recipe.quantities):
+        unit_price = get_price(ingredient_id)
+        if unit_price is None:
+            return None
+        craft_cost += unit_price * quantity_needed
+    profit = sell_price - craft_cost
+    if profit <= 0:
+        return None
+    profit_margin_pct = (profit / craft_cost) * 100 if craft_cost > 0 else 0
+    item = item_by_id.get(recipe.resultId)
+    if not item or not item.nameId:
+        return None
+    return CraftCandidate(sell_price, craft_cost, profit, profit_margin_pct)
+
+
+class RecipeIndex:
+    """The recipes, and the recipes of each item as result or ingredient."""
+
+    def __init__(self, recipes: Sequence, item_by_id: Mapping):
+        self.recipes = list(recipes)
+        self.item_by_id = item_by_id
+        self.recipes_by_gid: dict[int, list[int]] = {}
+        for index, recipe in enumerate(self.recipes):
+            for gid in {recipe.resultId, *recipe.ingredientIds}:
+                self.recipes_by_gid.setdefault(gid, []).append(index)
+
+    def get_recipes(self, gids: Iterable[int]) -> set[int]:
+        return {index for gid in gids for index in self.recipes_by_gid.get(gid, ())}
+
+
+class ProfitHeap:
+    """Profitable recipes by decreasing rounded profit then recipe order, the order
+    of the live ranking. A replaced entry stays in the heap until it reaches the
+    top, where it is dropped."""
+
+    def __init__(self):
+        self.candidates: dict[int, CraftCandidate] = {}
+        self.heap: list[HeapEntry] = []
+        self.counter = itertools.count()
+
+    def _entry(self, recipe_index: int, candidate: CraftCandidate) -> HeapEntry:
+        # the counter keeps the candidates out of the comparisons
+        return (
+            -round(candidate.profit, 2),
+            recipe_index,
+            next(self.counter),
+            candidate,
+        )
+
+    def set(self, recipe_index: int, candidate: CraftCandidate | None):
+        if candidate is None:
+            self.candidates.pop(recipe_index, None)
+            return
+        self.candidates[recipe_index] = candidate
+        heapq.heappush(self.heap, self._entry(recipe_index, candidate))
+        if len(self.heap) > 2 * len(self.candidates) + 1024:
+            self.heap = [
+                self._entry(index, candidate)
+                for index, candidate in self.candidates.items()
+            ]
+            heapq.heapify(self.heap)
+
+    def top(self, n: int) -> list[tuple[int, CraftCandidate]]:
+        """The `n` best (recipe index, candidate), in O(n log size)."""
+        top: list[tuple[int, CraftCandidate]] = []
+        kept: list[HeapEntry] = []
+        while self.heap and len(top) < n:
+            entry = heapq.heappop(self.heap)
+            if self.candidates.get(entry[1]) is entry[3]:
+                top.append((entry[1], entry[3]))
+                kept.append(entry)
+        for entry in kept:
+            heapq.heappush(self.heap, entry)
+        return top
+
+
+@dataclass
+class ServerCrafts:
+    since: datetime
+    version: int
+    min_samples: int
+    computed_at: datetime = field(default_factory=datetime.now)
+    # time.monotonic() of the last catch up
+    synced_at: float = 0
+    # by quantity then gid
+    counts: dict[QuantityEnum, dict[int, int]] = field(
+        default_factory=lambda: {quantity: {} for quantity in QuantityEnum}
+    )
+    sums: dict[QuantityEnum, dict[int, int]] = field(
+        default_factory=lambda: {quantity: {} for quantity in QuantityEnum}
+    )
+    # (recorded_at, price) of the latest row, the price is None when not on sale
+    latest: dict[QuantityEnum, dict[int, tuple[datetime, int | None]]] = field(
+        default_factory=lambda: {quantity: {} for quantity in QuantityEnum}
+    )
+    # by (quantity, at current prices)
+    heaps: dict[tuple[QuantityEnum | None, bool], ProfitHeap] = field(
+        default_factory=lambda: {
+            (quantity, current): ProfitHeap()
+            for quantity in QUANTITIES
+            for current in (False, True)
+        }
+    )
+    applied_versions: set[int] = field(default_factory=set)
+
+    def get_samples(self, gid: int, quantity: QuantityEnum | None) -> int:
+        if quantity is not None:
+            return self.counts[quantity].get(gid, 0)
+        return sum(counts.get(gid, 0) for counts in self.counts.values())
+
+    def get_latest_price(self, gid: int, quantity: QuantityEnum | None) -> int | None:
+        """Latest price on sale, over the quantities the most recent one, the
+        largest quantity on a tie, like `LatestItemPriceController`."""
+        if quantity is not None:
+            return self.latest[quantity].get(gid, (None, None))[1]
+        latest_key, latest_price = None, None
+        for latest_quantity, latest in self.latest.items():
+            recorded_at, price = latest.get(gid, (None, None))
+            if price is None:
+                continue
+            key = (recorded_at, latest_quantity.value)
+            if latest_key is None or key > latest_key:
+                latest_key, latest_price = key, price
+        return latest_price
+
+    def get_price(
+        self, gid: int, quantity: QuantityEnum | None, current: bool
+    ) -> float | None:
+        """Average or latest price of an item having enough samples."""
+        count = self.get_samples(gid, quantity)
+        if count < max(self.min_samples, 1):
+            return None
+        if current:
+            price = self.get_latest_price(gid, quantity)
+            return None if price is None else float(price)
+        if quantity is not None:
+            return self.sums[quantity][gid] / count
+        return sum(sums.get(gid, 0) for sums in self.sums.values()) / count
+
+    def add_stats(self, rows: Iterable[tuple[int, QuantityEnum, int, int]]):
+        """Add the (gid, quantity, count, sum) of the prices of the window."""
+        for gid, quantity, count, total in rows:
+            self.counts[quantity][gid] = self.counts[quantity].get(gid, 0) + count
+            self.sums[quantity][gid] = self.sums[quantity].get(gid, 0) + total
+
+    def add_latest(
+        self, rows: Iterable[tuple[int, QuantityEnum, int | None, datetime]]
+    ):
+        """Keep the (gid, quantity, price, recorded_at) rows more recent than the
+        latest known ones."""
+        for gid, quantity, price, recorded_at in rows:
+            latest = self.latest[quantity].get(gid)
+            if latest is None or recorded_at >= latest[0]:
+                self.latest[quantity][gid] = (recorded_at, price)
+
+    def load(self, stats_rows: Iterable, latest_rows: Iterable, index: RecipeIndex):
+        """Fill a new table from the statistics and latest prices of the database,
+        then rank every recipe."""
+        self.add_stats(stats_rows)
+        self.add_latest(latest_rows)
+        self.rank(index)
+
+    def add_samples(self, rows: Iterable[Sequence]) -> dict[QuantityEnum, set[int]]:
+        """Add new (gid, quantity, price, recorded_at) rows, returns the gids whose
+        recipes are to re-rank, by quantity."""
+        touched: dict[QuantityEnum, set[int]] = {
+            quantity: set() for quantity in QuantityEnum
+        }
+        for gid, quantity, price, recorded_at in rows:
+            quantity = QuantityEnum(quantity)
+            if price is not None and recorded_at >= self.since:
+                self.add_stats([(gid, quantity, 1, price)])
+            self.add_latest([(gid, quantity, price, recorded_at)])
+            touched[quantity].add(gid)
+        return touched
+
+    def evaluate(
+        self,
+        index: RecipeIndex,
+        recipe_indexes: Iterable[int] | None = None,
+        quantities: Iterable[QuantityEnum | None] = QUANTITIES,
+    ) -> list[Evaluation]:
+        """(heap, recipe index, candidate) of the recipes, all of them by default,
+        in the heaps of `quantities`. Only reads the table: it can run in a thread
+        while the heaps are read."""
+        if recipe_indexes is None:
+            recipe_indexes = range(len(index.recipes))
+        recipe_indexes = list(recipe_indexes)
+        evaluations: list[Evaluation] = []
+        for quantity in quantities:
+            for current in (False, True):
+
+                def get_price(gid: int) -> float | None:
+                    return self.get_price(gid, quantity, current)
+
+                for recipe_index in recipe_indexes:
+                    evaluations.append(
+                        (
+                            (quantity, current),
+                            recipe_index,
+                            evaluate_recipe(
+                                index.recipes[recipe_index], get_price, index.item_by_id
+                            ),
+                        )
+                    )
+        return evaluations
+
+    def evaluate_touched(
+        self, touched: dict[QuantityEnum, set[int]], index: RecipeIndex
+    ) -> list[Evaluation]:
+        """Evaluations of the recipes of the gids returned by `add_samples`."""
+        evaluations: list[Evaluation] = []
+        for quantity, gids in touched.items():
+            recipe_indexes = index.get_recipes(gids)
+            if recipe_indexes:
+                evaluations += self.evaluate(index, recipe_indexes, [quantity, None])
+        return evaluations
+
+    def publish(self, evaluations: Iterable[Evaluation]):
+        for key, recipe_index, candidate in evaluations:
+            self.heaps[key].set(recipe_index, candidate)
+
+    def rank(
+        self,
+        index: RecipeIndex,
+        recipe_indexes: Iterable[int] | None = None,
+        quantities: Iterable[QuantityEnum | None] = QUANTITIES,
+    ):
+        """Re-evaluate the recipes, all of them by default, in the heaps of
+        `quantities`."""
+        self.publish(self.evaluate(index, recipe_indexes, quantities))
+
+    def apply(self, version: int, rows: list[Sequence]) -> dict[QuantityEnum, set[int]]:
+        """Add the rows of a change version, once, returns the gids to re-rank."""
+        if version <= self.version or version in self.applied_versions:
+            return {}
+        self.applied_versions.add(version)
+        return self.add_samples(rows)
+
+    def apply_delta(
+        self, version: int, rows_by_version: dict[int, list]
+    ) -> dict[QuantityEnum, set[int]]:
+        """Add the rows of the versions up to `version` not applied yet, and
+        consider the table complete up to it, returns the gids to re-rank."""
+        touched = self.add_samples(
+            row
+            for row_version, rows in sorted(rows_by_version.items())
+            if row_version not in self.applied_versions
+            for row in rows
+        )
+        self.version = max(self.version, version)
+        self.applied_versions = {
+            applied for applied in self.applied_versions if applied > self.version
+        }
+        return touched
+
+    def top(
+        self, quantity: QuantityEnum | None, current: bool, n: int
+    ) -> list[tuple[int, CraftCandidate]]:
+        return self.heaps[(quantity, current)].top(n)
+
+
+class CraftRanking:
+    def __init__(self):
+        self.servers: dict[int, ServerCrafts] = {}
+        self.index: RecipeIndex | None = None
@@ -1,35 +1,287 @@
+import asyncio
+import itertools
+import logging
+import math
 import os
+import time
 from pathlib import Path
-from typing import Iterator
+from typing import AsyncIterator, Awaitable, Callable, Iterator
 
+from alembic import command
+from alembic.config import Config
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
 from dotenv import get_key
-from sqlalchemy import create_engine
+from fastapi import Header
+from sqlalchemy import Engine, create_engine, make_url, text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
 from sqlalchemy.orm import Session, sessionmaker
 
-from src.const import ENV_PATH
+from src.const import (
+    DB_MAX_CONNECTIONS,
+    DB_PREPARED_STATEMENT_CACHE_SIZE,
+    DB_REPLICA_HOSTS,
+    DB_REPLICA_LAG_CHECK_SECONDS,
+    DB_REPLICA_MAX_LAG_SECONDS,
+    ENV_PATH,
+    WEB_WORKERS,
+)
+from src.metrics import TimedAsyncAdaptedQueuePool, TimedQueuePool
 
 DB_PATH = f"postgresql://{get_key(ENV_PATH, "DB_USERNAME")}:{get_key(ENV_PATH, "DB_PASSWORD")}@{get_key(ENV_PATH, "DB_HOST")}:5432/{get_key(ENV_PATH, "DB_NAME")}"
 
+ASYNC_DB_PATH = DB_PATH.replace("postgresql://", "postgresql+asyncpg://", 1)
+
+
+def get_replica_db_paths() -> list[str]:
+    """Async urls of the replicas listed as "host" or "host:port" in DB_REPLICA_HOSTS."""
+    primary_url = make_url(ASYNC_DB_PATH)
+    paths = []
+    for host in DB_REPLICA_HOSTS:
+        hostname, _, port = host.partition(":")
+        replica_url = primary_url.set(host=hostname, port=int(port or 5432))
+        paths.append(replica_url.render_as_string(hide_password=False))
+    return paths
+
 
 ALEMBIC_INI_PATH = os.path.join(Path(__file__).parent, "alembic", "alembic.ini")
 
 
-def get_engine():
-    engine = create_engine(DB_PATH, echo=False)
-    return engine
+# the sync engine of a process only runs its migrations, or the sessions of the
+# scripts and background workers, one query at a time
+SYNC_POOL_OPTIONS = {"pool_size": 1, "max_overflow": 1}
+
+
+def get_pool_options(
+    workers: int = WEB_WORKERS,
+    max_connections: int = DB_MAX_CONNECTIONS,
+    engines: int = 1 + len(DB_REPLICA_HOSTS),
+) -> dict:
+    """Split the global connection budget between the serving processes, then the
+    share of a process between its async engines: the primary one and one per
+    replica. The connections of the sync engines are set aside first.
+    """
+    workers = max(workers, 1)
+    sync_connections = workers * sum(SYNC_POOL_OPTIONS.values())
+    per_engine = max(
+        (max_connections - sync_connections) // (workers * max(engines, 1)), 2
+    )
+    pool_size = max(per_engine // 2, 1)
+    return {"pool_size": pool_size, "max_overflow": per_engine - pool_size}
+
+
+# engines are created lazily and per process: a pool must never be shared
+# between a preloading parent and its forked workers
+_engines: dict[int, Engine] = {}
+_async_engines: dict[tuple[int, str], AsyncEngine] = {}
+
+
+def get_engine() -> Engine:
+    pid = os.getpid()
+    if pid not in _engines:
+        _engines[pid] = create_engine(
+            DB_PATH, echo=False, poolclass=TimedQueuePool, **SYNC_POOL_OPTIONS
+        )
+    return _engines[pid]
+
+
+def get_async_engine(url: str = ASYNC_DB_PATH) -> AsyncEngine:
+    key = (os.getpid(), url)
+    if key not in _async_engines:
+        _async_engines[key] = create_async_engine(
+            url,
+            echo=False,
+            poolclass=TimedAsyncAdaptedQueuePool,
+            # the hot queries keep the same SQL text whatever their values, their
+            # server-side prepared statements are reused by the connection
+            connect_args={
+                "prepared_statement_cache_size": DB_PREPARED_STATEMENT_CACHE_SIZE
+            },
+            **get_pool_options(),
+        )
+    return _async_engines[key]
 
 
-ENGINE = get_engine()
+def reset_engines():
+    """Forget engines inherited from the parent process, to call after a fork."""
+    pid = os.getpid()
+    for engine_pid in list(_engines):
+        if engine_pid != pid:
+            # leave the parent connections open, they still belong to it
+            _engines.pop(engine_pid).dispose(close=False)
+    for key in list(_async_engines):
+        if key[0] != pid:
+            _async_engines.pop(key).sync_engine.dispose(close=False)
 
 
-SessionMaker = sessionmaker(bind=ENGINE, autoflush=False)
+SessionMaker = sessionmaker(autoflush=False)
 
 
 def session_local() -> Iterator[Session]:
-    with SessionMaker() as session:
+    with SessionMaker(bind=get_engine()) as session:
         yield session
 
 
-def run_migrations():
-    os.system(f"alembic -c {ALEMBIC_INI_PATH} revision --autogenerate")
-    os.system(f"alembic -c {ALEMBIC_INI_PATH} upgrade head")
+# objects stay readable after commit, there is no lazy load in async context
+AsyncSessionMaker = async_sessionmaker(autoflush=False, expire_on_commit=False)
+
+
+async def async_session_local() -> AsyncIterator[AsyncSession]:
+    async with AsyncSessionMaker(bind=get_async_engine()) as session:
+        yield session
+
+
+REPLICATION_LAG_QUERY = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+    """)
+
+
+async def get_replication_lag(engine: AsyncEngine) -> float:
+    """Seconds the replica is behind the primary, 0 when it replayed everything."""
+    async with engine.connect() as connection:
+        return float(await connection.scalar(REPLICATION_LAG_QUERY))
+
+
+class ReplicaRouter:
+    """Pick a replica engine for read-only work, round robin between the replicas
+    whose lag is under `max_lag`, and fall back to the primary otherwise.
+
+    Lags are probed at most every `check_interval` seconds per replica.
+    """
+
+    def __init__(
+        self,
+        primary_url: str,
+        replica_urls: list[str],
+        max_lag: float = DB_REPLICA_MAX_LAG_SECONDS,
+        check_interval: float = DB_REPLICA_LAG_CHECK_SECONDS,
+        engine_factory: Callable[[str], AsyncEngine] = get_async_engine,
+        lag_probe: Callable[[AsyncEngine], Awaitable[float]] = get_replication_lag,
+    ):
+        self.primary_url = primary_url
+        self.replica_urls = replica_urls
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.engine_factory = engine_factory
+        self.lag_probe = lag_probe
+        self._lags: dict[str, tuple[float, float]] = {}  # url -> (checked_at, lag)
+        self._turn = itertools.count()
+
+    async def is_fresh(self, url: str) -> bool:
+        checked_at, lag = self._lags.get(url, (-math.inf, math.inf))
+        if time.monotonic() - checked_at >= self.check_interval:
+            try:
+                lag = await self.lag_probe(self.engine_factory(url))
+            except (OSError, SQLAlchemyError):
+                lag = math.inf
+            self._lags[url] = (time.monotonic(), lag)
+        return lag <= self.max_lag
+
+    async def get_engine(self) -> AsyncEngine:
+        if self.replica_urls:
+            start = next(self._turn) % len(self.replica_urls)
+            for url in self.replica_urls[start:] + self.replica_urls[:start]:
+                if await self.is_fresh(url):
+                    return self.engine_factory(url)
+        return self.engine_factory(self.primary_url)
+
+
+REPLICA_ROUTER = ReplicaRouter(ASYNC_DB_PATH, get_replica_db_paths())
+
+
+async def analytics_session_local(
+    x_read_your_writes: bool = Header(
+        False, description="Lire sur la base primaire, sans délai de réplication"
+    ),
+) -> AsyncIterator[AsyncSession]:
+    """Session for read-only analytics, served by a replica when one is fresh enough."""
+    engine = (
+        get_async_engine() if x_read_your_writes else await REPLICA_ROUTER.get_engine()
+    )
+    async with AsyncSessionMaker(bind=engine) as session:
+        yield session
+
+
+# arbitrary key, serializes migrations between workers starting together
+MIGRATION_LOCK_ID = 7_340_012
+MIGRATION_LOCK_RETRY_SECONDS = 0.5
+
+
+def get_alembic_config() -> Config:
+    config = Config(ALEMBIC_INI_PATH)
+    config.attributes["configure_logger"] = False
+    return config
+
+
+def is_schema_at_head(connection, config: Config) -> bool:
+    heads = set(ScriptDirectory.from_config(config).get_heads())
+    return set(MigrationContext.configure(connection).get_current_heads()) == heads
+
+
+def run_migrations() -> bool:
+    """Upgrade the schema to head in process, returns whether migrations were applied."""
+    config = get_alembic_config()
+    with get_engine().connect() as connection:
+        at_head = is_schema_at_head(connection, config)
+        connection.rollback()
+        if at_head:
+            return False
+        # held by the session, outside of the transactions Alembic opens and commits
+        # itself, some migrations run outside of any (CREATE INDEX CONCURRENTLY).
+        # Polled: such a migration waits for every open transaction, a blocking
+        # wait for the lock would be one and deadlock with it
+        while not connection.execute(
+            text("SELECT pg_try_advisory_lock(:id)"), {"id": MIGRATION_LOCK_ID}
+        ).scalar():
+            connection.rollback()
+            time.sleep(MIGRATION_LOCK_RETRY_SECONDS)
+        connection.commit()
+        try:
+            # another worker may have migrated while we were waiting for the lock
+            at_head = is_schema_at_head(connection, config)
+            connection.rollback()
+            if at_head:
+                return False
+            config.attributes["connection"] = connection
+            command.upgrade(config, "head")
+            return True
+        finally:
+            # the connection goes back to the pool, the lock must not go with it
+            connection.rollback()
+            connection.execute(
+                text("SELECT pg_advisory_unlock(:id)"), {"id": MIGRATION_LOCK_ID}
+            )
+            connection.commit()
+
+
+async def ping_database(engine: AsyncEngine | None = None) -> bool:
+    try:
+        async with (engine or get_async_engine()).connect() as connection:
+            await connection.execute(text("SELECT 1"))
+        return True
+    except (OSError, SQLAlchemyError):
+        return False
+
+
+async def wait_for_database(
+    timeout: float = 60, initial_delay: float = 0.05, max_delay: float = 2
+):
+    """Wait until the database accepts queries, retrying with exponential backoff."""
+    deadline = time.monotonic() + timeout
+    delay = initial_delay
+    while not await ping_database():
+        if time.monotonic() + delay > deadline:
+            raise TimeoutError(f"database not reachable after {timeout}s")
+        logging.info("waiting for reachable db, retry in %.2fs", delay)
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, max_delay)
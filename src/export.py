@@ -0,0 +1,116 @@
+"""Encoding of the price history exports as Parquet or Arrow IPC streams.
+
+The rows are converted by record batches of a bounded size, each one written as a
+Parquet row group or an IPC message and handed over before the next one is read:
+the memory used does not depend on the size of the export.
+"""
+
+from enum import Enum
+from io import IOBase
+from typing import BinaryIO, Sequence, cast
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from src.models.item_price_history import QuantityEnum
+
+# rows per record batch, and so per Parquet row group
+BATCH_ROWS = 128 * 1024
+
+EXPORT_SCHEMA = pa.schema(
+    [
+        pa.field("id", pa.int64(), nullable=False),
+        pa.field("gid", pa.int64(), nullable=False),
+        pa.field("quantity", pa.int16(), nullable=False),
+        pa.field("price", pa.int64()),
+        pa.field("average_price", pa.int64()),
+        pa.field("recorded_at", pa.timestamp("us"), nullable=False),
+        pa.field("server_id", pa.int64(), nullable=False),
+        pa.field("change_version", pa.int64(), nullable=False),
+    ]
+)
+
+
+class ExportFormatEnum(Enum):
+    PARQUET = "parquet"
+    ARROW = "arrow"
+
+    @property
+    def media_type(self) -> str:
+        if self is ExportFormatEnum.PARQUET:
+            return "application/vnd.apache.parquet"
+        return "application/vnd.apache.arrow.stream"
+
+
+def to_record_batch(rows: Sequence[Sequence]) -> pa.RecordBatch:
+    """Batch of rows with the columns of EXPORT_SCHEMA, in order."""
+    columns = [[row[index] for row in rows] for index in range(len(EXPORT_SCHEMA))]
+    quantity_index = EXPORT_SCHEMA.get_field_index("quantity")
+    columns[quantity_index] = [
+        QuantityEnum(quantity).value for quantity in columns[quantity_index]
+    ]
+    return pa.RecordBatch.from_arrays(
+        [
+            pa.array(column, type=field.type)
+            for column, field in zip(columns, EXPORT_SCHEMA)
+        ],
+        schema=EXPORT_SCHEMA,
+    )
+
+
+class ChunkSink:
+    """Write-only file keeping what was written until it is drained, to stream the
+    output of the Arrow writers."""
+
+    def __init__(self):
+        self._chunks: list[bytes] = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+class BatchWriter:
+    """Writes record batches to `sink` in the export format, one row group or IPC
+    message per batch."""
+
+    def __init__(self, export_format: ExportFormatEnum, sink: BinaryIO | ChunkSink):
+        # any python file with write works, the stubs only take io.IOBase ones
+        file = pa.PythonFile(cast(IOBase, sink), mode="w")
+        self._writer: pq.ParquetWriter | pa.ipc.RecordBatchStreamWriter
+        if export_format is ExportFormatEnum.PARQUET:
+            self._writer = pq.ParquetWriter(file, EXPORT_SCHEMA, compression="zstd")
+        else:
+            self._writer = pa.ipc.new_stream(
+                file, EXPORT_SCHEMA, options=pa.ipc.IpcWriteOptions(compression="zstd")
+            )
+        self.rows = 0
+
+    def write_rows(self, rows: Sequence[Sequence]):
+        self.write_batch(to_record_batch(rows))
+
+    def write_batch(self, batch: pa.RecordBatch):
+        """Write a batch already in the columns of EXPORT_SCHEMA."""
+        self._writer.write_batch(batch)
+        self.rows += batch.num_rows
+
+    def close(self):
+        self._writer.close()
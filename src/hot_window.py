@@ -0,0 +1,221 @@
+"""In-process columnar window of the recent prices of each server, so that the
+analytics of the last days run without scanning item_price_history.
+
+A server window is a list of immutable column chunks (gid, price, quantity,
+recorded_at) of the priced samples, appended to on ingestion and trimmed by age.
+It knows the change version it is complete up to and the date it is complete
+since, queries reaching before that date go to the database.
+
+Chunks are never modified and the chunk lists are replaced rather than mutated,
+readers in other threads always see a consistent window.
+"""
+
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Sequence
+
+import numpy as np
+
+from src.models.item_price_history import QuantityEnum
+from src.price_stats import PriceColumns
+
+# gid, price and recorded_at as int64, quantity as int16
+BYTES_PER_ROW = 8 + 8 + 2 + 8
+# the small chunks of the ingestion are merged past this count
+MAX_CHUNKS = 64
+
+
+def to_datetime64(moment: datetime) -> np.datetime64:
+    return np.datetime64(moment, "us")
+
+
+@dataclass(frozen=True)
+class PriceChunk:
+    gids: np.ndarray
+    prices: np.ndarray
+    quantities: np.ndarray
+    recorded_at: np.ndarray
+
+    @classmethod
+    def from_rows(cls, rows: Sequence[Sequence]) -> "PriceChunk":
+        """Chunk of (gid, price, quantity, recorded_at) rows, with a price."""
+        return cls(
+            gids=np.fromiter((row[0] for row in rows), np.int64, len(rows)),
+            prices=np.fromiter((row[1] for row in rows), np.int64, len(rows)),
+            quantities=np.fromiter(
+                (QuantityEnum(row[2]).value for row in rows), np.int16, len(rows)
+            ),
+            recorded_at=np.array([row[3] for row in rows], dtype="datetime64[us]"),
+        )
+
+    @classmethod
+    def concat(cls, chunks: list["PriceChunk"]) -> "PriceChunk":
+        if not chunks:
+            return cls.from_rows([])
+        return cls(
+            gids=np.concatenate([chunk.gids for chunk in chunks]),
+            prices=np.concatenate([chunk.prices for chunk in chunks]),
+            quantities=np.concatenate([chunk.quantities for chunk in chunks]),
+            recorded_at=np.concatenate([chunk.recorded_at for chunk in chunks]),
+        )
+
+    def __len__(self) -> int:
+        return len(self.gids)
+
+    def filter(self, mask: np.ndarray) -> "PriceChunk":
+        return PriceChunk(
+            gids=self.gids[mask],
+            prices=self.prices[mask],
+            quantities=self.quantities[mask],
+            recorded_at=self.recorded_at[mask],
+        )
+
+    def get_mask(
+        self,
+        since: datetime,
+        quantity: QuantityEnum | None = None,
+        gid: int | None = None,
+    ) -> np.ndarray:
+        mask = self.recorded_at >= to_datetime64(since)
+        if quantity is not None:
+            mask &= self.quantities == quantity.value
+        if gid is not None:
+            mask &= self.gids == gid
+        return mask
+
+
+@dataclass
+class ServerWindow:
+    # complete for the samples recorded since this date, up to this change version
+    since: datetime
+    version: int
+    chunks: list[PriceChunk] = field(default_factory=list)
+    # versions past `version` already applied by this worker's own ingestion
+    applied_versions: set[int] = field(default_factory=set)
+    synced_at: float = float("-inf")
+
+    @property
+    def rows(self) -> int:
+        return sum(len(chunk) for chunk in self.chunks)
+
+    @property
+    def nbytes(self) -> int:
+        return self.rows * BYTES_PER_ROW
+
+    def covers(self, since: datetime) -> bool:
+        return since >= self.since
+
+    def _append(self, chunks: list[PriceChunk]):
+        chunks = [*self.chunks, *(chunk for chunk in chunks if len(chunk))]
+        if len(chunks) > MAX_CHUNKS:
+            # the first chunk is the large one left by the last eviction
+            chunks = [chunks[0], PriceChunk.concat(chunks[1:])]
+        self.chunks = chunks
+
+    def apply(self, version: int, chunk: PriceChunk):
+        """Append the samples of a change version, once."""
+        if version <= self.version or version in self.applied_versions:
+            return
+        self.applied_versions.add(version)
+        self._append([chunk])
+
+    def apply_delta(self, version: int, rows_by_version: dict[int, list]):
+        """Append the samples of the versions up to `version` not applied yet, and
+        consider the window complete up to it."""
+        self._append(
+            [
+                PriceChunk.from_rows(rows)
+                for row_version, rows in sorted(rows_by_version.items())
+                if row_version not in self.applied_versions
+            ]
+        )
+        self.version = max(self.version, version)
+        self.applied_versions = {
+            applied for applied in self.applied_versions if applied > self.version
+        }
+
+    def evict(self, since: datetime):
+        """Drop the samples recorded before `since`, and merge the chunks."""
+        chunk = PriceChunk.concat(self.chunks)
+        self.chunks = [chunk.filter(chunk.get_mask(since))]
+        self.since = max(self.since, since)
+
+    def get_columns(
+        self, since: datetime, quantity: QuantityEnum | None
+    ) -> PriceColumns:
+        chunk = PriceChunk.concat(self.chunks)
+        mask = chunk.get_mask(since, quantity)
+        return PriceColumns(gids=chunk.gids[mask], prices=chunk.prices[mask])
+
+    def get_prices(
+        self, gid: int, since: datetime, quantity: QuantityEnum | None
+    ) -> np.ndarray:
+        return np.concatenate(
+            [
+                chunk.prices[chunk.get_mask(since, quantity, gid)]
+                for chunk in self.chunks
+            ]
+            or [np.zeros(0, np.int64)]
+        )
+
+
+class HotWindow:
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.servers: dict[int, ServerWindow] = {}
+        # bytes loaded of the servers not warmed for lack of budget, when it was
+        # exceeded: at least the size of their window
+        self.rejected: dict[int, int] = {}
+
+    @property
+    def nbytes(self) -> int:
+        return sum(window.nbytes for window in self.servers.values())
+
+    def get(self, server_id: int, since: datetime) -> ServerWindow | None:
+        """The window of the server when it holds every sample since `since`."""
+        window = self.servers.get(server_id)
+        if window is None or not window.covers(since):
+            return None
+        return window
+
+    def fits(self, server_id: int) -> bool:
+        """Whether a server rejected before may fit in the budget left."""
+        return self.rejected.get(server_id, 0) <= self.max_bytes - self.nbytes
+
+    def evict(self, since: datetime):
+        """Drop the samples older than `since`, then the oldest halves of the
+        largest windows until the memory budget is met."""
+        for window in self.servers.values():
+            window.evict(since)
+        while self.nbytes > self.max_bytes:
+            server_id, window = max(
+                self.servers.items(), key=lambda item: item[1].nbytes
+            )
+            chunk = window.chunks[0] if window.chunks else PriceChunk.from_rows([])
+            if len(chunk) < 2:
+                # nothing left to halve, forget the server
+                del self.servers[server_id]
+                continue
+            middle = np.sort(chunk.recorded_at)[len(chunk) // 2].astype(datetime)
+            rows = window.rows
+            window.evict(middle)
+            if window.rows == rows:
+                # the samples left share the middle date, a batch is recorded at a
+                # single date: drop them all
+                window.evict(middle + timedelta(microseconds=1))
+
+    def get_status(self) -> dict:
+        return {
+            "max_bytes": self.max_bytes,
+            "bytes": self.nbytes,
+            "servers": {
+                server_id: {
+                    "since": window.since.isoformat(),
+                    "version": window.version,
+                    "rows": window.rows,
+                    "chunks": len(window.chunks),
+                }
+                for server_id, window in self.servers.items()
+            },
+            "rejected": self.rejected,
+        }
@@ -0,0 +1,184 @@
+"""Prometheus metrics, exposed by the /metrics route.
+
+Requests are measured by `MetricsMiddleware`, SQL statements by engine events
+accumulated per request in a context variable and published once the response is
+sent, so the hot path only adds a few integer additions per statement.
+
+With several gunicorn workers, set PROMETHEUS_MULTIPROC_DIR to an empty directory
+so /metrics aggregates every process.
+"""
+
+import collections
+import os
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Iterable
+
+from prometheus_client import (
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from sqlalchemy import Engine, event
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from starlette.routing import Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# statements run outside of a request, like the materializer
+BACKGROUND_ROUTE = "background"
+UNMATCHED_ROUTE = "unmatched"
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Latency of the HTTP requests, until the response is sent",
+    ["method", "route", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress",
+    "HTTP requests being served",
+    ["method", "route"],
+    multiprocess_mode="livesum",
+)
+DB_STATEMENTS = Counter("db_statements_total", "SQL statements executed", ["route"])
+DB_STATEMENTS_PER_REQUEST = Histogram(
+    "db_statements_per_request",
+    "SQL statements executed by a single request",
+    ["route"],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 500),
+)
+DB_DURATION = Counter(
+    "db_statement_duration_seconds_total", "Time spent executing SQL", ["route"]
+)
+DB_ROWS_FETCHED = Counter(
+    "db_rows_fetched_total", "Rows returned by SQL queries", ["route"]
+)
+DB_POOL_CHECKOUT_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time waited for a pooled database connection",
+    ["pool"],
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30),
+)
+INGESTED_ROWS = Counter(
+    "item_price_history_ingested_rows_total",
+    "Price history rows inserted by the bots",
+    ["server_id"],
+)
+
+
+@dataclass
+class SqlStats:
+    statements: int = 0
+    duration: float = 0.0
+    rows: int = 0
+
+
+_request_sql_stats: ContextVar[SqlStats | None] = ContextVar(
+    "request_sql_stats", default=None
+)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started_at", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    duration = time.perf_counter() - conn.info["query_started_at"].pop()
+    # rowcount of a query is the number of rows it returned, with both drivers
+    rows = max(cursor.rowcount, 0) if cursor.description is not None else 0
+    stats = _request_sql_stats.get()
+    if stats is None:
+        DB_STATEMENTS.labels(BACKGROUND_ROUTE).inc()
+        DB_DURATION.labels(BACKGROUND_ROUTE).inc(duration)
+        DB_ROWS_FETCHED.labels(BACKGROUND_ROUTE).inc(rows)
+        return
+    stats.statements += 1
+    stats.duration += duration
+    stats.rows += rows
+
+
+class _TimedCheckoutMixin:
+    """Measure the wait for a connection, including when the pool is exhausted."""
+
+    def _do_get(self):
+        started_at = time.perf_counter()
+        try:
+            return super()._do_get()  # type: ignore[misc]
+        finally:
+            DB_POOL_CHECKOUT_WAIT.labels(type(self).__name__).observe(
+                time.perf_counter() - started_at
+            )
+
+
+class TimedQueuePool(_TimedCheckoutMixin, QueuePool):
+    pass
+
+
+class TimedAsyncAdaptedQueuePool(_TimedCheckoutMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def get_route_label(app: ASGIApp, scope: Scope) -> str:
+    """Path template of the matching route, to keep the labels cardinality bounded."""
+    for route in getattr(app, "routes", []):
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+    return UNMATCHED_ROUTE
+
+
+class MetricsMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        route = get_route_label(scope["app"], scope)
+        status = 500
+
+        async def send_wrapper(message: Message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        stats = SqlStats()
+        token = _request_sql_stats.set(stats)
+        in_progress = REQUESTS_IN_PROGRESS.labels(method, route)
+        in_progress.inc()
+        started_at = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            REQUEST_LATENCY.labels(method, route, str(status)).observe(
+                time.perf_counter() - started_at
+            )
+            in_progress.dec()
+            _request_sql_stats.reset(token)
+            DB_STATEMENTS.labels(route).inc(stats.statements)
+            DB_STATEMENTS_PER_REQUEST.labels(route).observe(stats.statements)
+            DB_DURATION.labels(route).inc(stats.duration)
+            DB_ROWS_FETCHED.labels(route).inc(stats.rows)
+
+
+def count_ingested_rows(server_ids: Iterable[int]):
+    for server_id, rows in collections.Counter(server_ids).items():
+        INGESTED_ROWS.labels(str(server_id)).inc(rows)
+
+
+def render_metrics() -> bytes:
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest()
@@ -1,3 +1,7 @@
 from .base import *
 from .item_price_history import *
 from .character import *
+from .top_ranking import *
+from .server_change_version import *
+from .cold_partition import *
+from .latest_item_price import *
@@ -1,5 +1,5 @@
 from enum import Enum
-from sqlalchemy import BigInteger
+from sqlalchemy import BigInteger, Index
 from sqlalchemy.orm import Mapped, mapped_column
 from sqlalchemy.types import Enum as SQLEnum
 from src.models.base import Base
@@ -10,8 +10,38 @@ class CharacterActionEnum(Enum):
 
 
 class Character(Base):
+    __table_args__ = (
+        Index("ix_character_server_id_change_version", "server_id", "change_version"),
+    )
+
     id: Mapped[int] = mapped_column(BigInteger(), primary_key=True, autoincrement=False)
     server_id: Mapped[int]
     action: Mapped[CharacterActionEnum | None] = mapped_column(
         SQLEnum(CharacterActionEnum, name="character_action"), default=None
     )
+    change_version: Mapped[int] = mapped_column(
+        BigInteger(), default=0, server_default="0"
+    )
+
+
+class CharacterDeparture(Base):
+    """Départ d'un personnage d'un serveur, à la version de ce serveur.
+
+    La synchronisation delta du serveur quitté retire le personnage de ses mules
+    avec cette ligne, le personnage n'y ayant plus de ligne. Seul le dernier départ
+    de chaque serveur est gardé.
+    """
+
+    __table_args__ = (
+        Index(
+            "ix_character_departure_server_id_change_version",
+            "server_id",
+            "change_version",
+        ),
+    )
+
+    character_id: Mapped[int] = mapped_column(
+        BigInteger(), primary_key=True, autoincrement=False
+    )
+    server_id: Mapped[int] = mapped_column(primary_key=True, autoincrement=False)
+    change_version: Mapped[int] = mapped_column(BigInteger())
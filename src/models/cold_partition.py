@@ -0,0 +1,26 @@
+from datetime import date, datetime
+
+from sqlalchemy import Index
+from sqlalchemy.orm import Mapped, mapped_column
+
+from src.models.base import Base
+
+
+class ColdPartition(Base):
+    """Fichier Parquet d'un mois d'historique des prix d'un serveur, archivé par le
+    tiering : ses lignes ne sont plus dans item_price_history.
+
+    Le fichier n'est lu qu'une fois sa ligne commitée, dans la même transaction que
+    la suppression des lignes archivées.
+    """
+
+    __table_args__ = (Index("ix_cold_partition_server_id_month", "server_id", "month"),)
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    server_id: Mapped[int]
+    # first day of the month of the rows
+    month: Mapped[date]
+    # relative to COLD_STORAGE_DIR
+    path: Mapped[str]
+    rows: Mapped[int]
+    archived_at: Mapped[datetime]
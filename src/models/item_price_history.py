@@ -1,12 +1,12 @@
 from datetime import datetime
 from enum import IntEnum
 
+from sqlalchemy import BigInteger, Index
 from sqlalchemy import Enum as SQLEnum
 from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import Mapped, mapped_column
 
-from D3Database.data_center.data_reader import DataReader
-from D3Database.data_center.i18n import I18N
+from src.catalog import DataReader, I18N
 from src.models.base import Base
 
 
@@ -21,6 +21,22 @@ QuantitySQLEnum = SQLEnum(QuantityEnum)
 
 
 class ItemPriceHistory(Base):
+    __table_args__ = (
+        Index(
+            "ix_item_price_history_server_id_change_version",
+            "server_id",
+            "change_version",
+        ),
+        # keyset pagination of the evolution, by (recorded_at, id) for a quantity
+        Index(
+            "ix_item_price_history_keyset",
+            "server_id",
+            "quantity",
+            "recorded_at",
+            "id",
+        ),
+    )
+
     id: Mapped[int] = mapped_column(primary_key=True)
     gid: Mapped[int]
     quantity: Mapped[QuantityEnum] = mapped_column(QuantitySQLEnum)
@@ -28,6 +44,9 @@ class ItemPriceHistory(Base):
     recorded_at: Mapped[datetime]
     server_id: Mapped[int]
     average_price: Mapped[int | None]
+    change_version: Mapped[int] = mapped_column(
+        BigInteger(), default=0, server_default="0"
+    )
 
     @hybrid_property
     def name(self) -> str:
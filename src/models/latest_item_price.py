@@ -0,0 +1,23 @@
+from datetime import datetime
+
+from sqlalchemy import BigInteger
+from sqlalchemy.orm import Mapped, mapped_column
+
+from src.models.base import Base
+from src.models.item_price_history import QuantityEnum, QuantitySQLEnum
+
+
+class LatestItemPrice(Base):
+    """Dernier relevé de prix de chaque item d'un serveur, par quantité.
+
+    Tenue à jour par `bulk_insert` dans la transaction de l'historique, le prix
+    courant d'un item est une lecture de clé primaire au lieu d'un parcours de
+    l'historique. Le prix est NULL si l'item n'était pas en vente au dernier relevé.
+    """
+
+    server_id: Mapped[int] = mapped_column(primary_key=True, autoincrement=False)
+    gid: Mapped[int] = mapped_column(primary_key=True, autoincrement=False)
+    quantity: Mapped[QuantityEnum] = mapped_column(QuantitySQLEnum, primary_key=True)
+    price: Mapped[int | None]
+    recorded_at: Mapped[datetime]
+    change_version: Mapped[int] = mapped_column(BigInteger())
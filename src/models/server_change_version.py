@@ -0,0 +1,16 @@
+from sqlalchemy import BigInteger
+from sqlalchemy.orm import Mapped, mapped_column
+
+from src.models.base import Base
+
+
+class ServerChangeVersion(Base):
+    """Dernière version de changement attribuée sur un serveur.
+
+    Chaque écriture de personnages ou d'historique de prix incrémente la version de
+    son serveur et l'inscrit sur les lignes écrites, les clients ne récupèrent que
+    les lignes au-delà de la dernière version qu'ils ont vue.
+    """
+
+    server_id: Mapped[int] = mapped_column(primary_key=True, autoincrement=False)
+    version: Mapped[int] = mapped_column(BigInteger())
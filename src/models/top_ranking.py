@@ -0,0 +1,38 @@
+from datetime import datetime
+from enum import Enum
+
+from sqlalchemy import JSON, UniqueConstraint
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy.types import Enum as SQLEnum
+
+from src.models.base import Base
+from src.models.item_price_history import QuantityEnum, QuantitySQLEnum
+
+
+class RankingKindEnum(Enum):
+    ITEMS = "items"
+    CRAFTS = "crafts"
+
+
+class TopRanking(Base):
+    """Classement précalculé par le materializer pour les filtres par défaut."""
+
+    __table_args__ = (
+        UniqueConstraint(
+            "kind",
+            "server_id",
+            "quantity",
+            "category_id",
+            postgresql_nulls_not_distinct=True,
+        ),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    kind: Mapped[RankingKindEnum] = mapped_column(
+        SQLEnum(RankingKindEnum, name="ranking_kind")
+    )
+    server_id: Mapped[int]
+    quantity: Mapped[QuantityEnum | None] = mapped_column(QuantitySQLEnum)
+    category_id: Mapped[int | None]
+    payload: Mapped[list[dict]] = mapped_column(JSON)
+    computed_at: Mapped[datetime]
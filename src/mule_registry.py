@@ -0,0 +1,112 @@
+import asyncio
+import hashlib
+import json
+from collections import defaultdict
+from typing import Awaitable, Callable, Iterable
+
+from src.models.character import CharacterActionEnum
+
+# postgres channel relaying character action changes between the workers
+CHARACTER_ACTION_CHANNEL = "character_action"
+
+
+def get_mules_version(ids: Iterable[int]) -> str:
+    """Version derived from the content, identical on every worker for the same set."""
+    return hashlib.blake2b(
+        ",".join(map(str, sorted(ids))).encode(), digest_size=8
+    ).hexdigest()
+
+
+def dump_action_change(
+    id: int, server_id: int, action: CharacterActionEnum | None
+) -> str:
+    return json.dumps(
+        {"id": id, "server_id": server_id, "action": action.value if action else None}
+    )
+
+
+class MuleRegistry:
+    """In-memory set of the characters accepting bank exchanges, per server.
+
+    A server is loaded from the database with `loader` on first read, then kept up to
+    date write-through with `apply`. Subscribers wait for a new version with
+    `wait_for_change` instead of polling.
+    """
+
+    def __init__(
+        self, loader: Callable[[int], Awaitable[list[int]]], synced: bool = False
+    ):
+        self.loader = loader
+        # without the notifications of the other workers, every read hits the database
+        self.synced = synced
+        self._ids: dict[int, set[int]] = {}
+        self._changed: dict[int, asyncio.Event] = {}
+        self._load_locks: dict[int, asyncio.Lock] = defaultdict(asyncio.Lock)
+
+    async def get_ids(self, server_id: int) -> tuple[list[int], str]:
+        if not self.synced:
+            ids = set(await self.loader(server_id))
+            return sorted(ids), get_mules_version(ids)
+        if server_id not in self._ids:
+            # a single load per server, even with many concurrent subscribers
+            async with self._load_locks[server_id]:
+                if server_id not in self._ids:
+                    self._ids[server_id] = set(await self.loader(server_id))
+        ids = self._ids[server_id]
+        return sorted(ids), get_mules_version(ids)
+
+    def _notify(self, server_id: int):
+        event = self._changed.pop(server_id, None)
+        if event is not None:
+            event.set()
+
+    def _notify_all(self):
+        for server_id in list(self._changed):
+            self._notify(server_id)
+
+    def apply(self, id: int, server_id: int, action: CharacterActionEnum | None):
+        """Record a committed action change, the character may have changed server."""
+        if not self.synced:
+            # nothing is cached, the subscribers reload from the database
+            self._notify_all()
+            return
+        for loaded_server_id, ids in self._ids.items():
+            is_mule = (
+                loaded_server_id == server_id
+                and action == CharacterActionEnum.MULE_ACCEPT_BANK
+            )
+            if is_mule and id not in ids:
+                ids.add(id)
+                self._notify(loaded_server_id)
+            elif not is_mule and id in ids:
+                ids.discard(id)
+                self._notify(loaded_server_id)
+
+    def apply_notification(self, payload: str):
+        change = json.loads(payload)
+        self.apply(
+            change["id"],
+            change["server_id"],
+            CharacterActionEnum(change["action"]) if change["action"] else None,
+        )
+
+    def set_synced(self, synced: bool):
+        """Changes may have been missed meanwhile, loaded servers are forgotten."""
+        self.synced = synced
+        self._ids.clear()
+        self._notify_all()
+
+    async def wait_for_change(
+        self, server_id: int, version: str | None, timeout: float
+    ) -> tuple[list[int], str]:
+        """Return the mules once their version differs from `version`, or after
+        `timeout` seconds with the unchanged set."""
+        changed = self._changed.setdefault(server_id, asyncio.Event())
+        ids, current_version = await self.get_ids(server_id)
+        if current_version != version:
+            return ids, current_version
+        try:
+            await asyncio.wait_for(changed.wait(), timeout)
+        except TimeoutError:
+            pass
+        return await self.get_ids(server_id)
@@ -0,0 +1,37 @@
+"""Opaque cursors of the keyset paginated routes.
+
+A cursor holds the (recorded_at, id) key of the last row sent and the change
+version the first page was read at. The next pages continue after that key at the
+same version: the rows committed meanwhile neither shift nor split the pages, they
+are left to the next sync from that version.
+"""
+
+import base64
+import binascii
+from dataclasses import dataclass
+from datetime import datetime
+
+
+@dataclass(frozen=True)
+class KeysetCursor:
+    recorded_at: datetime
+    id: int
+    version: int
+
+    @property
+    def key(self) -> tuple[datetime, int]:
+        return self.recorded_at, self.id
+
+    def encode(self) -> str:
+        raw = f"{self.recorded_at.isoformat()}|{self.id}|{self.version}"
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+    @classmethod
+    def decode(cls, cursor: str) -> "KeysetCursor":
+        """Raises ValueError when `cursor` was not made by `encode`."""
+        try:
+            raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+            recorded_at, id, version = raw.decode().split("|")
+            return cls(datetime.fromisoformat(recorded_at), int(id), int(version))
+        except (binascii.Error, UnicodeDecodeError, ValueError) as error:
+            raise ValueError(f"invalid cursor {cursor!r}") from error
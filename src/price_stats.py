@@ -0,0 +1,249 @@
+"""Grouped price statistics on NumPy columns, shared by the analytics rankings and
+the resell evaluation.
+
+Counts, sums and deviations are accumulated by `np.bincount` and the extrema by
+`np.minimum.at`/`np.maximum.at`, in a single pass without sort. Medians need the
+rows sorted by (gid, price), only done when they are asked for. There is no
+Python loop over the rows.
+"""
+
+from dataclasses import dataclass
+from typing import Sequence
+
+import numpy as np
+from sqlalchemy import Select, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+
+@dataclass
+class PriceColumns:
+    gids: np.ndarray
+    prices: np.ndarray
+
+    @classmethod
+    def from_rows(cls, rows: Sequence[Sequence[int]]) -> "PriceColumns":
+        """Columns of (gid, price) rows, as returned by the database."""
+        # one pass per column is much faster than np.array on row objects
+        return cls(
+            gids=np.fromiter((row[0] for row in rows), np.int64, len(rows)),
+            prices=np.fromiter((row[1] for row in rows), np.int64, len(rows)),
+        )
+
+    @classmethod
+    def from_arrays(
+        cls, gids: Sequence[int] | None, prices: Sequence[int] | None
+    ) -> "PriceColumns":
+        """Columns of the arrays aggregated by `price_columns_statement`, NULL when
+        there was no row."""
+        return cls(
+            gids=np.array(gids or [], dtype=np.int64),
+            prices=np.array(prices or [], dtype=np.int64),
+        )
+
+    @classmethod
+    def from_server_rows(
+        cls, rows: Sequence[Sequence[int]]
+    ) -> dict[int, "PriceColumns"]:
+        """Columns of each server of (server_id, gid, price) rows."""
+        rows_by_server: dict[int, list] = {}
+        for server_id, gid, price in rows:
+            rows_by_server.setdefault(server_id, []).append((gid, price))
+        return {
+            server_id: cls.from_rows(server_rows)
+            for server_id, server_rows in rows_by_server.items()
+        }
+
+    @classmethod
+    def concat(cls, columns: list["PriceColumns"]) -> "PriceColumns":
+        return cls(
+            gids=np.concatenate([column.gids for column in columns]),
+            prices=np.concatenate([column.prices for column in columns]),
+        )
+
+    def __len__(self) -> int:
+        return len(self.gids)
+
+    def filter(self, mask: np.ndarray) -> "PriceColumns":
+        return PriceColumns(gids=self.gids[mask], prices=self.prices[mask])
+
+
+def price_columns_statement(statement: Select) -> Select:
+    """Aggregate the (gid, price) rows of `statement` in two arrays, decoded by the
+    driver several times faster than as many rows."""
+    rows = statement.subquery()
+    return select(func.array_agg(rows.c.gid), func.array_agg(rows.c.price))
+
+
+def fetch_price_columns(session: Session, statement: Select) -> PriceColumns:
+    if session.get_bind().dialect.name != "postgresql":
+        return PriceColumns.from_rows(session.execute(statement).all())
+    return PriceColumns.from_arrays(
+        *session.execute(price_columns_statement(statement)).one()
+    )
+
+
+async def fetch_price_columns_async(
+    session: AsyncSession, statement: Select
+) -> PriceColumns:
+    if session.get_bind().dialect.name != "postgresql":
+        return PriceColumns.from_rows((await session.execute(statement)).all())
+    return PriceColumns.from_arrays(
+        *(await session.execute(price_columns_statement(statement))).one()
+    )
+
+
+def price_columns_by_server_statement(statement: Select) -> Select:
+    """Aggregate the (server_id, gid, price) rows of `statement` in two arrays per
+    server, a row per server."""
+    rows = statement.subquery()
+    return select(
+        rows.c.server_id, func.array_agg(rows.c.gid), func.array_agg(rows.c.price)
+    ).group_by(rows.c.server_id)
+
+
+def fetch_price_columns_by_server(
+    session: Session, statement: Select
+) -> dict[int, PriceColumns]:
+    if session.get_bind().dialect.name != "postgresql":
+        return PriceColumns.from_server_rows(session.execute(statement).all())
+    return {
+        server_id: PriceColumns.from_arrays(gids, prices)
+        for server_id, gids, prices in session.execute(
+            price_columns_by_server_statement(statement)
+        )
+    }
+
+
+async def fetch_price_columns_by_server_async(
+    session: AsyncSession, statement: Select
+) -> dict[int, PriceColumns]:
+    if session.get_bind().dialect.name != "postgresql":
+        return PriceColumns.from_server_rows((await session.execute(statement)).all())
+    return {
+        server_id: PriceColumns.from_arrays(gids, prices)
+        for server_id, gids, prices in await session.execute(
+            price_columns_by_server_statement(statement)
+        )
+    }
+
+
+@dataclass
+class GroupedPriceStats:
+    gids: np.ndarray
+    counts: np.ndarray
+    sums: np.ndarray
+    means: np.ndarray
+    mins: np.ndarray
+    maxs: np.ndarray
+    stds: np.ndarray
+    # index of the first row of each gid, to keep the order they were seen in
+    first_rows: np.ndarray
+    medians: np.ndarray | None = None
+
+    def __len__(self) -> int:
+        return len(self.gids)
+
+    def filter(self, mask: np.ndarray) -> "GroupedPriceStats":
+        return GroupedPriceStats(
+            gids=self.gids[mask],
+            counts=self.counts[mask],
+            sums=self.sums[mask],
+            means=self.means[mask],
+            mins=self.mins[mask],
+            maxs=self.maxs[mask],
+            stds=self.stds[mask],
+            first_rows=self.first_rows[mask],
+            medians=None if self.medians is None else self.medians[mask],
+        )
+
+    def mean_by_gid(self) -> dict[int, float]:
+        return dict(zip(self.gids.tolist(), self.means.tolist()))
+
+
+# prices and group indexes packed in a single int64 sort key, when they fit
+PRICE_BITS = 40
+MAX_PACKED_GROUPS = 1 << (63 - PRICE_BITS)
+
+
+def get_group_indexes(gids: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """(index of the group of each row, gid of each group) with groups by increasing
+    gid: item ids are small, they are used directly as indexes unless too sparse."""
+    if gids.min() >= 0 and gids.max() < max(4 * len(gids), 1 << 16):
+        return gids, np.arange(gids.max() + 1)
+    group_gids, group_indexes = np.unique(gids, return_inverse=True)
+    return group_indexes, group_gids
+
+
+def get_medians(
+    group_indexes: np.ndarray, prices: np.ndarray, counts: np.ndarray
+) -> np.ndarray:
+    """Medians of the prices of each group, the mean of the two middle values for
+    even counts, by sorting the rows once by (group, price)."""
+    if (
+        len(counts) <= MAX_PACKED_GROUPS
+        and prices.min() >= 0
+        and prices.max() < 1 << PRICE_BITS
+    ):
+        keys = (group_indexes.astype(np.int64) << PRICE_BITS) | prices
+        keys.sort()
+        sorted_prices = keys & ((1 << PRICE_BITS) - 1)
+    else:
+        sorted_prices = prices[np.lexsort((prices, group_indexes))]
+    starts = np.cumsum(counts) - counts
+    # empty groups read any row, they are dropped by the caller
+    lows = np.minimum(starts + np.maximum(counts - 1, 0) // 2, len(prices) - 1)
+    highs = np.minimum(starts + counts // 2, len(prices) - 1)
+    return (sorted_prices[lows] + sorted_prices[highs]) / 2
+
+
+def group_price_stats(
+    columns: PriceColumns, min_count: int = 1, with_medians: bool = False
+) -> GroupedPriceStats:
+    """Count, sum, mean, min, max and population std of the prices of each gid
+    having at least `min_count` prices, by increasing gid, and their median when
+    `with_medians`, which needs a sort."""
+    if not len(columns):
+        integers, floats = np.zeros(0, np.int64), np.zeros(0)
+        return GroupedPriceStats(
+            gids=integers,
+            counts=integers,
+            sums=floats,
+            means=floats,
+            mins=integers,
+            maxs=integers,
+            stds=floats,
+            first_rows=integers,
+            medians=floats if with_medians else None,
+        )
+
+    prices = columns.prices
+    group_indexes, group_gids = get_group_indexes(columns.gids)
+    size = len(group_gids)
+
+    counts = np.bincount(group_indexes, minlength=size)
+    sums = np.bincount(group_indexes, weights=prices, minlength=size)
+    means = sums / np.maximum(counts, 1)
+    deviations = prices - means[group_indexes]
+    variances = np.bincount(
+        group_indexes, weights=deviations * deviations, minlength=size
+    ) / np.maximum(counts, 1)
+    mins = np.full(size, np.iinfo(np.int64).max)
+    np.minimum.at(mins, group_indexes, prices)
+    maxs = np.full(size, np.iinfo(np.int64).min)
+    np.maximum.at(maxs, group_indexes, prices)
+    first_rows = np.full(size, len(prices))
+    np.minimum.at(first_rows, group_indexes, np.arange(len(prices)))
+
+    stats = GroupedPriceStats(
+        gids=group_gids,
+        counts=counts,
+        sums=sums,
+        means=means,
+        mins=mins,
+        maxs=maxs,
+        stds=np.sqrt(variances),
+        first_rows=first_rows,
+        medians=get_medians(group_indexes, prices, counts) if with_medians else None,
+    )
+    return stats.filter(counts >= max(min_count, 1))
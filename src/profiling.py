@@ -0,0 +1,116 @@
+"""On-demand sampling profiler, for requests sent with `?profile=1`.
+
+The stacks of every thread are sampled during the request and returned in the
+folded format ("thread;outer;...;inner count" per line) read by flamegraph.pl,
+speedscope or inferno, instead of the response. The status of the profiled
+response is sent in the X-Profiled-Status header.
+
+Profiling is allowed only when PROFILING_ENABLED is 1. Samples are wall clock and
+process wide: the concurrent requests and the idle threads show up too, under
+their own stacks.
+"""
+
+import collections
+import os
+import sys
+import threading
+from types import FrameType
+from urllib.parse import parse_qs
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.const import PROFILING_ENABLED, PROFILING_INTERVAL_SECONDS
+
+PROFILE_QUERY_PARAM = "profile"
+
+
+def get_frame_label(frame: FrameType) -> str:
+    code = frame.f_code
+    filename = os.path.basename(code.co_filename)
+    return f"{code.co_qualname} ({filename}:{code.co_firstlineno})".replace(";", ":")
+
+
+def fold_stack(frame: FrameType | None) -> list[str]:
+    labels = []
+    while frame is not None:
+        labels.append(get_frame_label(frame))
+        frame = frame.f_back
+    labels.reverse()
+    return labels
+
+
+class SamplingProfiler:
+    def __init__(self, interval: float = PROFILING_INTERVAL_SECONDS):
+        self.interval = interval
+        self.counts: collections.Counter[str] = collections.Counter()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="sampling-profiler", daemon=True
+        )
+
+    def _sample(self):
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == self._thread.ident:
+                continue
+            stack = [names.get(thread_id, str(thread_id))] + fold_stack(frame)
+            self.counts[";".join(stack)] += 1
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self._sample()
+
+    def __enter__(self) -> "SamplingProfiler":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stopped.set()
+        self._thread.join()
+
+    def folded(self) -> str:
+        return "".join(
+            f"{stack} {count}\n" for stack, count in self.counts.most_common()
+        )
+
+
+def is_profile_requested(scope: Scope) -> bool:
+    query = parse_qs(scope.get("query_string", b"").decode())
+    return query.get(PROFILE_QUERY_PARAM, ["0"])[-1] in ("1", "true")
+
+
+class ProfilingMiddleware:
+    def __init__(self, app: ASGIApp, enabled: bool = PROFILING_ENABLED):
+        self.app = app
+        self.enabled = enabled
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if not (
+            self.enabled and scope["type"] == "http" and is_profile_requested(scope)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def discard_response(message: Message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+
+        with SamplingProfiler() as profiler:
+            await self.app(scope, receive, discard_response)
+
+        body = profiler.folded().encode()
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [
+                    (b"content-type", b"text/plain; charset=utf-8"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"x-profiled-status", str(status).encode()),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,18 @@
+from typing import Any
+
+import msgspec
+from fastapi.responses import JSONResponse
+
+_encoder = msgspec.json.Encoder()
+
+
+class MsgspecJSONResponse(JSONResponse):
+    """JSON response encoded by msgspec, without FastAPI's validation against the
+    response_model nor its jsonable_encoder pass.
+
+    Meant for the msgspec Structs of src.schemas and plain builtins: the route keeps
+    its response_model, which only describes the body in the OpenAPI schema.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return _encoder.encode(content)
@@ -0,0 +1,57 @@
+import secrets
+from dataclasses import asdict
+
+from fastapi import APIRouter, Depends, Header, HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.const import ADMIN_TOKEN
+from src.controllers.hot_window import HOT_WINDOW, HotWindowController
+from src.database import async_session_local
+from src.schemas.admin import (
+    HotWindowCheckSchema,
+    HotWindowStatusSchema,
+    SlowQuerySchema,
+)
+from src.slow_queries import SLOW_QUERY_LOG
+
+
+def require_admin(x_admin_token: str | None = Header(None)):
+    """Refuse la requête sans le jeton ADMIN_TOKEN, ou si aucun n'est configuré."""
+    if ADMIN_TOKEN is None:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, "Not Found")
+    if x_admin_token is None or not secrets.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status.HTTP_403_FORBIDDEN, "Invalid admin token")
+
+
+router = APIRouter(
+    prefix="/admin", dependencies=[Depends(require_admin)], include_in_schema=False
+)
+
+
+@router.get("/slow_queries", response_model=list[SlowQuerySchema])
+async def get_slow_queries():
+    """Dernières requêtes SQL lentes de ce processus, de la plus récente à la plus
+    ancienne, avec leur plan d'exécution quand il a pu être capturé."""
+    return [asdict(query) for query in reversed(SLOW_QUERY_LOG.queries)]
+
+
+@router.delete("/slow_queries", status_code=status.HTTP_204_NO_CONTENT)
+async def clear_slow_queries():
+    SLOW_QUERY_LOG.clear()
+
+
+@router.get("/hot_window", response_model=HotWindowStatusSchema)
+async def get_hot_window_status():
+    """Serveurs chargés dans la fenêtre des prix récents de ce processus."""
+    return HOT_WINDOW.get_status()
+
+
+@router.get("/hot_window/{server_id}/check", response_model=HotWindowCheckSchema)
+async def check_hot_window(
+    server_id: int, session: AsyncSession = Depends(async_session_local)
+):
+    """Compare la fenêtre du serveur avec la base, sur le primaire."""
+    check = await HotWindowController.check_consistency_async(session, server_id)
+    if check is None:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, "Server not in the hot window")
+    return check
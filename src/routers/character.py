@@ -1,31 +1,125 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
+import json
+from typing import AsyncIterator
 
-from src.controllers.character import CharacterController
-from src.database import session_local
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.controllers.character import MULE_REGISTRY, CharacterController
+from src.database import async_session_local
 from src.models.character import CharacterActionEnum
-from src.schemas.character import CharacterCreateSchema
+from src.schemas.character import (
+    CharacterActionChangeSchema,
+    CharacterActionChangesSchema,
+    CharacterCreateSchema,
+    CharacterReadSchema,
+    MuleAcceptBankIdsSchema,
+)
 
 router = APIRouter(prefix="/character")
 
+MAX_BATCH_SIZE = 1000
+
+MAX_POLL_TIMEOUT_SECONDS = 60
+
+# comment sent on idle streams, so proxies do not close them
+STREAM_KEEPALIVE_SECONDS = 15
+
 
 @router.post("")
-def create_character(
+async def create_character(
     payload: CharacterCreateSchema,
-    session: Session = Depends(session_local),
+    session: AsyncSession = Depends(async_session_local),
 ):
-    return CharacterController.get_or_create_character(session, payload)
+    return await CharacterController.get_or_create_character_async(session, payload)
+
+
+@router.post("/batch", response_model=list[CharacterReadSchema])
+async def create_characters(
+    payloads: list[CharacterCreateSchema],
+    session: AsyncSession = Depends(async_session_local),
+):
+    """Enregistre ou met à jour plusieurs personnages en une seule requête SQL."""
+    if len(payloads) > MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Too many characters, max {MAX_BATCH_SIZE}",
+        )
+    if not payloads:
+        return []
+    return await CharacterController.upsert_characters_async(session, payloads)
 
 
 @router.patch("/{id}/action")
-def patch_character_action(
+async def patch_character_action(
     id: int,
     action: CharacterActionEnum | None,
-    session: Session = Depends(session_local),
+    session: AsyncSession = Depends(async_session_local),
 ):
-    return CharacterController.update_action(session, id, action)
+    return await CharacterController.update_action_async(session, id, action)
 
 
 @router.get("/mule_accept_bank_ids", response_model=list[int])
-def get_mule_accept_bank_ids(server_id: int, session: Session = Depends(session_local)):
-    return CharacterController.get_mule_accept_bank_ids(session, server_id)
+async def get_mule_accept_bank_ids(server_id: int):
+    return (await MULE_REGISTRY.get_ids(server_id))[0]
+
+
+@router.get(
+    "/mule_accept_bank_ids/changes", response_model=CharacterActionChangesSchema
+)
+async def get_mule_accept_bank_changes(
+    server_id: int,
+    since_version: int = Query(0, ge=0),
+    session: AsyncSession = Depends(async_session_local),
+):
+    """Synchronisation delta : actions des personnages du serveur modifiées après
+    `since_version`, une action nulle retire le personnage des mules.
+
+    Avec `since_version=0` seules les mules actuelles sont renvoyées, la `version`
+    de la réponse est à renvoyer comme `since_version` lors du prochain appel.
+    """
+    version, changes = await CharacterController.get_action_changes_async(
+        session, server_id, since_version
+    )
+    return CharacterActionChangesSchema(
+        version=version,
+        changes=[
+            CharacterActionChangeSchema(id=id, action=action) for id, action in changes
+        ],
+    )
+
+
+@router.get("/mule_accept_bank_ids/poll", response_model=MuleAcceptBankIdsSchema)
+async def poll_mule_accept_bank_ids(
+    server_id: int,
+    version: str | None = None,
+    timeout: float = Query(30, ge=0, le=MAX_POLL_TIMEOUT_SECONDS),
+):
+    """Long-poll : répond dès que les mules du serveur diffèrent de `version`, ou
+    après `timeout` secondes avec la même version."""
+    ids, version = await MULE_REGISTRY.wait_for_change(server_id, version, timeout)
+    return MuleAcceptBankIdsSchema(version=version, ids=ids)
+
+
+@router.get("/mule_accept_bank_ids/stream")
+async def stream_mule_accept_bank_ids(server_id: int):
+    """Server-Sent Events : un évènement `mules` avec les ids à chaque changement,
+    le premier dès la connexion."""
+
+    async def events() -> AsyncIterator[str]:
+        version = None
+        while True:
+            ids, new_version = await MULE_REGISTRY.wait_for_change(
+                server_id, version, STREAM_KEEPALIVE_SECONDS
+            )
+            if new_version == version:
+                yield ": keepalive\n\n"
+                continue
+            version = new_version
+            yield f"id: {version}\nevent: mules\ndata: {json.dumps(ids)}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,26 +1,62 @@
-from fastapi import APIRouter
+import hashlib
+import json
+from functools import lru_cache
+from typing import Sequence
 
-from D3Database.data_center.data_reader import DataReader
-from D3Database.data_center.i18n import I18N
-from D3Database.enums.category_item_enum import CategoryEnum
+from fastapi import APIRouter, Request, Response, status
+from pydantic import BaseModel
+
+from src.catalog import CategoryEnum, DataReader, I18N
 from src.schemas.data_center import ItemOptionSchema, ItemTypeOptionSchema
 
 router = APIRouter(prefix="/data_center")
 
 
-@router.get("/type_item", response_model=list[ItemTypeOptionSchema])
-def get_type_items(category: CategoryEnum):
-    return [
+def get_etag(options: Sequence[BaseModel]) -> str:
+    content = json.dumps([option.model_dump() for option in options])
+    return f'"{hashlib.blake2b(content.encode(), digest_size=8).hexdigest()}"'
+
+
+def not_modified_or_options(
+    request: Request, response: Response, etag: str, options: Sequence[BaseModel]
+):
+    """Le catalogue ne change qu'avec D3Database : un client qui a déjà la liste
+    reçoit un 304 sans corps grâce à If-None-Match."""
+    if request.headers.get("if-none-match") == etag:
+        return Response(
+            status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag}
+        )
+    response.headers["ETag"] = etag
+    return options
+
+
+@lru_cache(maxsize=1024)
+def get_type_item_options(
+    category: CategoryEnum,
+) -> tuple[str, list[ItemTypeOptionSchema]]:
+    options = [
         ItemTypeOptionSchema(id=type_item.id, name=I18N().name_by_id[type_item.nameId])
         for type_item in DataReader().item_type_by_id.values()
         if type_item.categoryId == category.value
     ]
+    return get_etag(options), options
 
 
-@router.get("/item", response_model=list[ItemOptionSchema])
-def get_items(type_id: int):
-    return [
+@lru_cache(maxsize=1024)
+def get_item_options(type_id: int) -> tuple[str, list[ItemOptionSchema]]:
+    options = [
         ItemOptionSchema(id=item.id, name=I18N().name_by_id[item.nameId])
         for item in DataReader().item_by_id.values()
         if item.typeId is type_id and item.nameId in I18N().name_by_id
     ]
+    return get_etag(options), options
+
+
+@router.get("/type_item", response_model=list[ItemTypeOptionSchema])
+def get_type_items(category: CategoryEnum, request: Request, response: Response):
+    return not_modified_or_options(request, response, *get_type_item_options(category))
+
+
+@router.get("/item", response_model=list[ItemOptionSchema])
+def get_items(type_id: int, request: Request, response: Response):
+    return not_modified_or_options(request, response, *get_item_options(type_id))
@@ -0,0 +1,24 @@
+from fastapi import APIRouter, Request, status
+from fastapi.responses import PlainTextResponse
+
+from src.database import ping_database
+
+router = APIRouter()
+
+
+@router.get("/healthz", response_class=PlainTextResponse)
+async def healthz():
+    """Le processus répond, sans vérifier ses dépendances."""
+    return "ok"
+
+
+@router.get("/readyz", response_class=PlainTextResponse)
+async def readyz(request: Request):
+    """Le démarrage est terminé et la base de données répond."""
+    if not getattr(request.app.state, "ready", False):
+        return PlainTextResponse("starting", status.HTTP_503_SERVICE_UNAVAILABLE)
+    if not await ping_database():
+        return PlainTextResponse(
+            "database unreachable", status.HTTP_503_SERVICE_UNAVAILABLE
+        )
+    return "ok"
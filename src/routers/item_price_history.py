@@ -1,67 +1,271 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from datetime import datetime
+from typing import AsyncIterator
 
-from D3Database.enums.category_item_enum import CategoryEnum
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.catalog import CategoryEnum
+from src.const import EVOLUTION_MAX_PAGE_SIZE, EVOLUTION_PAGE_SIZE
+from src.controllers.change_version import ChangeVersionController
+from src.controllers.cold_storage import ColdStorageController
+from src.controllers.craft_ranking import CraftRankingController
+from src.controllers.export import ExportController
 from src.controllers.item_price_history import ItemPriceHistoryController
-from src.database import session_local
+from src.controllers.latest_item_price import LatestItemPriceController
+from src.controllers.top_ranking import TopRankingController
+from src.database import (
+    REPLICA_ROUTER,
+    AsyncSessionMaker,
+    analytics_session_local,
+    async_session_local,
+)
+from src.export import ExportFormatEnum
 from src.models.item_price_history import QuantityEnum
+from src.models.top_ranking import RankingKindEnum, TopRanking
+from src.pagination import KeysetCursor
+from src.responses import MsgspecJSONResponse
 from src.schemas.item_price_history import (
     CreateItemPriceHistorySchema,
+    LatestItemPriceSchema,
     PriceResellEvaluationSchema,
     ProfitableCraftSchema,
+    ProfitableCraftStruct,
     ProfitableItemSchema,
+    ProfitableItemStruct,
     ReadItemPriceHistorySchema,
 )
 
 router = APIRouter(prefix="/item_price_history")
 
 
+async def get_materialized_ranking(
+    session: AsyncSession,
+    response: Response,
+    kind: RankingKindEnum,
+    server_id: int,
+    quantity: QuantityEnum | None,
+    lookback_days: int,
+    min_samples: int,
+    top_n: int,
+    category: CategoryEnum | None,
+    type_id: int | None,
+) -> list[dict] | None:
+    """Classement précalculé pour ces filtres, None s'il faut le calculer à la volée.
+
+    La fraîcheur est exposée dans les headers X-Ranking-Source, X-Computed-At et Age.
+    """
+    ranking: TopRanking | None = None
+    if TopRankingController.is_materialized(lookback_days, min_samples, top_n, type_id):
+        ranking = await TopRankingController.get_ranking_async(
+            session, kind, server_id, quantity, category
+        )
+    if ranking is None:
+        response.headers["X-Ranking-Source"] = "live"
+        return None
+    response.headers["X-Ranking-Source"] = "materialized"
+    response.headers["X-Computed-At"] = ranking.computed_at.isoformat()
+    response.headers["Age"] = str(
+        int((datetime.now() - ranking.computed_at).total_seconds())
+    )
+    return ranking.payload[:top_n]
+
+
+async def get_incremental_crafts(
+    session: AsyncSession,
+    response: Response,
+    server_id: int,
+    quantity: QuantityEnum | None,
+    lookback_days: int,
+    min_samples: int,
+    top_n: int,
+    category: CategoryEnum | None,
+    type_id: int | None,
+    current_prices: bool,
+) -> list[ProfitableCraftStruct] | None:
+    """Top des crafts du classement incrémental pour ces filtres, None s'il n'est
+    pas tenu pour eux ou pas encore chargé.
+
+    X-Computed-At et Age donnent son dernier recalcul complet, depuis lequel les
+    moyennes cumulent les nouveaux prix.
+    """
+    if not CraftRankingController.is_served(
+        lookback_days, min_samples, category, type_id
+    ):
+        return None
+    incremental = await ItemPriceHistoryController.get_incremental_top_crafts_async(
+        session, server_id, quantity, top_n, current_prices
+    )
+    if incremental is None:
+        return None
+    computed_at, ranking = incremental
+    response.headers["X-Ranking-Source"] = "incremental"
+    response.headers["X-Computed-At"] = computed_at.isoformat()
+    response.headers["Age"] = str(int((datetime.now() - computed_at).total_seconds()))
+    return ranking
+
+
 @router.post("/bulk_insert", status_code=status.HTTP_201_CREATED)
-def bulk_insert_item_price_history(
+async def bulk_insert_item_price_history(
     payloads: list[CreateItemPriceHistorySchema],
-    session: Session = Depends(session_local),
+    session: AsyncSession = Depends(async_session_local),
 ):
     if len(payloads) != 4:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Uncorrect amount of price history",
         )
-    ItemPriceHistoryController.bulk_insert(session, payloads)
+    await ItemPriceHistoryController.bulk_insert_async(session, payloads)
 
 
 @router.post("/get_sales_speed", response_model=dict[int, float])
-def get_sales_speed_by_gid(
+async def get_sales_speed_by_gid(
     server_id: int,
     gids: list[int],
     quantity: QuantityEnum = QuantityEnum.HUNDRED,
-    session: Session = Depends(session_local),
+    session: AsyncSession = Depends(analytics_session_local),
 ):
-    return ItemPriceHistoryController.get_sales_speed_from_prices(
+    return await ItemPriceHistoryController.get_sales_speed_from_prices_async(
         session, quantity, server_id, gids
     )
 
 
+@router.post("/get_sales_speed/by_server", response_model=dict[int, dict[int, float]])
+async def get_sales_speed_by_server(
+    gids: list[int],
+    server_ids: list[int] = Query(..., min_length=1),
+    quantity: QuantityEnum = QuantityEnum.HUNDRED,
+    session: AsyncSession = Depends(analytics_session_local),
+):
+    """Vitesse de vente des items sur chaque serveur demandé, calculée en une seule
+    requête groupée par serveur."""
+    return await ItemPriceHistoryController.get_sales_speed_by_server_async(
+        session, quantity, list(dict.fromkeys(server_ids)), gids
+    )
+
+
+@router.post("/current_prices", response_model=list[LatestItemPriceSchema])
+async def get_current_prices(
+    server_id: int,
+    gids: list[int],
+    quantity: QuantityEnum | None = None,
+    session: AsyncSession = Depends(analytics_session_local),
+):
+    """Dernier prix relevé des items demandés, pour chaque quantité ou seulement
+    `quantity`, lus par la clé primaire sans parcourir l'historique.
+
+    Les items jamais relevés sont absents, un prix null indique que l'item n'était
+    pas en vente au dernier relevé.
+    """
+    return MsgspecJSONResponse(
+        await LatestItemPriceController.get_latest_prices_async(
+            session, server_id, gids, quantity
+        )
+    )
+
+
 @router.get("/evolution_price", response_model=list[ReadItemPriceHistorySchema])
-def get_evolution_price(
+async def get_evolution_price(
     server_id: int,
     type_id: int,
+    response: Response,
     item_gid: int | None = None,
     quantity: QuantityEnum = QuantityEnum.HUNDRED,
-    session: Session = Depends(session_local),
+    since_version: int | None = Query(None, ge=0),
+    cursor: str | None = None,
+    limit: int = Query(EVOLUTION_PAGE_SIZE, ge=1, le=EVOLUTION_MAX_PAGE_SIZE),
+    session: AsyncSession = Depends(analytics_session_local),
 ):
-    return ItemPriceHistoryController.get_evolution_price(
-        session, quantity, server_id, type_id, item_gid
+    """Historique des prix par (recorded_at, id), par pages de `limit` lignes,
+    seulement les prix enregistrés après `since_version` si précisé.
+
+    S'il reste des lignes, le header X-Next-Cursor est à renvoyer comme `cursor`
+    avec les mêmes paramètres pour la page suivante. Le header X-Change-Version
+    est à renvoyer comme `since_version` au prochain appel, une fois la dernière
+    page lue.
+    """
+    if cursor is None:
+        # read first: every price up to this version is already committed
+        version = await ChangeVersionController.get_version_async(session, server_id)
+        keyset_cursor = None
+    else:
+        try:
+            keyset_cursor = KeysetCursor.decode(cursor)
+        except ValueError as error:
+            raise HTTPException(status.HTTP_400_BAD_REQUEST, str(error)) from error
+        # the next pages are read at the version of the first one
+        version = keyset_cursor.version
+    rows, next_cursor = await ItemPriceHistoryController.get_evolution_price_page_async(
+        session,
+        quantity,
+        server_id,
+        type_id,
+        version,
+        limit,
+        item_gid,
+        since_version,
+        keyset_cursor,
+    )
+    response.headers["X-Change-Version"] = str(version)
+    if next_cursor is not None:
+        response.headers["X-Next-Cursor"] = next_cursor.encode()
+    return MsgspecJSONResponse(rows, headers=response.headers)
+
+
+@router.get("/export")
+async def export_item_price_history(
+    server_id: int,
+    start: datetime,
+    end: datetime | None = None,
+    format: ExportFormatEnum = ExportFormatEnum.PARQUET,
+):
+    """Exporte l'historique des prix du serveur enregistrés dans [start, end), en
+    Parquet ou en flux Arrow IPC, envoyé au fil de la lecture.
+
+    Les lignes sont lues par lots bornés, la mémoire utilisée ne dépend pas de la
+    taille de l'export. Les mois archivés sont lus dans leurs fichiers Parquet.
+    """
+    end = end or datetime.now()
+    if start >= end:
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, "start must be before end")
+
+    async def chunks() -> AsyncIterator[bytes]:
+        # the session of a dependency would be closed before the body is sent
+        async with AsyncSessionMaker(bind=await REPLICA_ROUTER.get_engine()) as session:
+            paths = await ColdStorageController.get_paths_async(
+                session, server_id, start, end
+            )
+            async for chunk in ExportController.stream_export_async(
+                session,
+                format,
+                server_id,
+                start,
+                end,
+                archived_batches=ColdStorageController.read_export_batches(
+                    paths, server_id, start, end
+                ),
+            ):
+                yield chunk
+
+    filename = (
+        f"item_price_history_{server_id}_{start:%Y%m%dT%H%M%S}_{end:%Y%m%dT%H%M%S}"
+        f".{format.value}"
+    )
+    return StreamingResponse(
+        chunks(),
+        media_type=format.media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
     )
 
 
 @router.get("/evaluate_resell", response_model=PriceResellEvaluationSchema)
-def evaluate_resell(
+async def evaluate_resell(
     gid: int,
     observed_price: float,
     server_id: int,
     quantity: QuantityEnum | None = None,
     lookback_days: int = 30,
-    session: Session = Depends(session_local),
+    session: AsyncSession = Depends(analytics_session_local),
 ):
     """Endpoint pour évaluer si l'achat/revente est potentiellement rentable.
 
@@ -72,21 +276,22 @@ def evaluate_resell(
     - quantity : Quantité spécifique à évaluer (None = toutes les quantités)
     - lookback_days : Nombre de jours d'historique à analyser
     """
-    return ItemPriceHistoryController.is_price_resell_profitable(
+    return await ItemPriceHistoryController.is_price_resell_profitable_async(
         session, gid, quantity, server_id, observed_price, lookback_days
     )
 
 
 @router.get("/top_profitable_items", response_model=list[ProfitableItemSchema])
-def get_top_profitable_items(
+async def get_top_profitable_items(
     server_id: int,
+    response: Response,
     quantity: QuantityEnum | None = None,
     lookback_days: int = 30,
     min_samples: int = 5,
     top_n: int = 50,
     category: CategoryEnum | None = None,
     type_id: int | None = None,
-    session: Session = Depends(session_local),
+    session: AsyncSession = Depends(analytics_session_local),
 ):
     """Retourne un classement des items les plus rentables à acheter pour revendre.
 
@@ -103,22 +308,84 @@ def get_top_profitable_items(
     - quantity : Quantité spécifique à filtrer (None = toutes les quantités)
     - category : Catégorie d'items (EQUIPMENT, CONSUMABLES, RESOURCES, QUEST, OTHER, COSMETICS)
     - type_id : ID du type d'item spécifique
+
+    Avec les paramètres par défaut, le classement précalculé en tâche de fond est servi.
+    """
+    # the stored rows, or the Structs computed on the fly, encoded alike
+    ranking: list[dict] | list[ProfitableItemStruct] | None = (
+        await get_materialized_ranking(
+            session,
+            response,
+            RankingKindEnum.ITEMS,
+            server_id,
+            quantity,
+            lookback_days,
+            min_samples,
+            top_n,
+            category,
+            type_id,
+        )
+    )
+    if ranking is None:
+        ranking = await ItemPriceHistoryController.get_top_profitable_items_async(
+            session,
+            server_id,
+            quantity,
+            lookback_days,
+            min_samples,
+            top_n,
+            category,
+            type_id,
+        )
+    return MsgspecJSONResponse(ranking, headers=response.headers)
+
+
+@router.get(
+    "/top_profitable_items/by_server",
+    response_model=dict[int, list[ProfitableItemSchema]],
+)
+async def get_top_profitable_items_by_server(
+    server_ids: list[int] = Query(..., min_length=1),
+    quantity: QuantityEnum | None = None,
+    lookback_days: int = 30,
+    min_samples: int = 5,
+    top_n: int = 50,
+    category: CategoryEnum | None = None,
+    type_id: int | None = None,
+    session: AsyncSession = Depends(analytics_session_local),
+):
+    """Classement des items les plus rentables de chaque serveur demandé, comme
+    /top_profitable_items, par identifiant de serveur.
+
+    Les prix de tous les serveurs sont lus en une seule requête groupée par serveur,
+    le classement est toujours calculé à la volée.
     """
-    return ItemPriceHistoryController.get_top_profitable_items(
-        session, server_id, quantity, lookback_days, min_samples, top_n, category, type_id
+    return MsgspecJSONResponse(
+        await ItemPriceHistoryController.get_top_profitable_items_by_server_async(
+            session,
+            list(dict.fromkeys(server_ids)),
+            quantity,
+            lookback_days,
+            min_samples,
+            top_n,
+            category,
+            type_id,
+        )
     )
 
 
 @router.get("/top_profitable_crafts", response_model=list[ProfitableCraftSchema])
-def get_top_profitable_crafts(
+async def get_top_profitable_crafts(
     server_id: int,
+    response: Response,
     quantity: QuantityEnum | None = None,
     lookback_days: int = 30,
     min_samples: int = 5,
     top_n: int = 50,
     category: CategoryEnum | None = None,
     type_id: int | None = None,
-    session: Session = Depends(session_local),
+    current_prices: bool = False,
+    session: AsyncSession = Depends(analytics_session_local),
 ):
     """Retourne un classement des items les plus rentables à crafter.
 
@@ -135,7 +402,53 @@ def get_top_profitable_crafts(
     - quantity : Quantité spécifique à filtrer (None = toutes les quantités)
     - category : Catégorie d'items à crafter (EQUIPMENT, CONSUMABLES, RESOURCES, QUEST, OTHER, COSMETICS)
     - type_id : ID du type d'item à crafter
+
+    Avec `current_prices`, les recettes sont évaluées au dernier prix relevé des
+    items plutôt qu'à leur prix moyen, le classement est alors calculé à la volée.
+
+    Avec les paramètres par défaut, le classement précalculé en tâche de fond est servi,
+    ou le classement incrémental tenu à jour à chaque prix s'il est activé.
     """
-    return ItemPriceHistoryController.get_top_profitable_crafts(
-        session, server_id, quantity, lookback_days, min_samples, top_n, category, type_id
+    # the stored rows, or the Structs computed on the fly, encoded alike
+    ranking: list[dict] | list[ProfitableCraftStruct] | None = (
+        await get_incremental_crafts(
+            session,
+            response,
+            server_id,
+            quantity,
+            lookback_days,
+            min_samples,
+            top_n,
+            category,
+            type_id,
+            current_prices,
+        )
     )
+    if ranking is None and current_prices:
+        response.headers["X-Ranking-Source"] = "live"
+    elif ranking is None:
+        ranking = await get_materialized_ranking(
+            session,
+            response,
+            RankingKindEnum.CRAFTS,
+            server_id,
+            quantity,
+            lookback_days,
+            min_samples,
+            top_n,
+            category,
+            type_id,
+        )
+    if ranking is None:
+        ranking = await ItemPriceHistoryController.get_top_profitable_crafts_async(
+            session,
+            server_id,
+            quantity,
+            lookback_days,
+            min_samples,
+            top_n,
+            category,
+            type_id,
+            current_prices,
+        )
+    return MsgspecJSONResponse(ranking, headers=response.headers)
@@ -0,0 +1,12 @@
+from fastapi import APIRouter, Response
+from prometheus_client import CONTENT_TYPE_LATEST
+
+from src.metrics import render_metrics
+
+router = APIRouter()
+
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Métriques Prometheus du processus, ou de tous les workers en multiprocess."""
+    return Response(render_metrics(), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,37 @@
+from datetime import datetime
+
+from pydantic import BaseModel
+
+
+class SlowQuerySchema(BaseModel):
+    statement: str
+    parameters: str
+    duration: float
+    recorded_at: datetime
+    database: str
+    plan: str | None
+    plan_error: str | None
+
+
+class HotWindowServerSchema(BaseModel):
+    since: datetime
+    version: int
+    rows: int
+    chunks: int
+
+
+class HotWindowStatusSchema(BaseModel):
+    max_bytes: int
+    bytes: int
+    servers: dict[int, HotWindowServerSchema]
+
+
+class HotWindowCheckSchema(BaseModel):
+    server_id: int
+    since: datetime
+    version: int
+    window_rows: int
+    window_price_sum: int
+    database_rows: int
+    database_price_sum: int
+    consistent: bool
@@ -1,6 +1,29 @@
 from pydantic import BaseModel
 
+from src.models.character import CharacterActionEnum
+
 
 class CharacterCreateSchema(BaseModel):
     id: int
     server_id: int
+
+
+class CharacterReadSchema(BaseModel):
+    id: int
+    server_id: int
+    action: CharacterActionEnum | None
+
+
+class MuleAcceptBankIdsSchema(BaseModel):
+    version: str
+    ids: list[int]
+
+
+class CharacterActionChangeSchema(BaseModel):
+    id: int
+    action: CharacterActionEnum | None
+
+
+class CharacterActionChangesSchema(BaseModel):
+    version: int
+    changes: list[CharacterActionChangeSchema]
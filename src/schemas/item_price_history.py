@@ -1,5 +1,6 @@
 from datetime import datetime
 
+import msgspec
 from pydantic import BaseModel, PositiveInt
 
 from src.models.item_price_history import QuantityEnum
@@ -19,6 +20,15 @@ class ReadItemPriceHistorySchema(BaseModel):
     recorded_at: datetime
 
 
+class LatestItemPriceSchema(BaseModel):
+    """Schéma pour le dernier prix relevé d'un item."""
+
+    gid: int
+    quantity: QuantityEnum
+    price: PositiveInt | None
+    recorded_at: datetime
+
+
 class PriceResellEvaluationSchema(BaseModel):
     """Schéma pour l'évaluation de la rentabilité d'un achat/revente."""
 
@@ -67,3 +77,54 @@ class ProfitableCraftSchema(BaseModel):
     profit_margin_pct: float
     ingredients: list[IngredientDetailSchema]
     samples: int
+
+
+# Équivalents msgspec des schémas de lecture, construits sans validation par les
+# contrôleurs et encodés directement en JSON par MsgspecJSONResponse. Les schémas
+# pydantic restent ceux de l'OpenAPI, les deux doivent garder les mêmes champs.
+
+
+class ReadItemPriceHistoryStruct(msgspec.Struct):
+    name: str
+    quantity: QuantityEnum
+    price: int | None
+    recorded_at: datetime
+
+
+class LatestItemPriceStruct(msgspec.Struct):
+    gid: int
+    quantity: QuantityEnum
+    price: int | None
+    recorded_at: datetime
+
+
+class ProfitableItemStruct(msgspec.Struct):
+    gid: int
+    name: str
+    avg_price: float
+    min_price: float
+    max_price: float
+    profit_potential: float
+    profit_margin_pct: float
+    profitability_score: float
+    volatility: float
+    samples: int
+
+
+class IngredientDetailStruct(msgspec.Struct):
+    id: int
+    name: str
+    quantity: int
+    unit_price: float
+    total_price: float
+
+
+class ProfitableCraftStruct(msgspec.Struct):
+    result_id: int
+    result_name: str
+    sell_price: float
+    craft_cost: float
+    profit: float
+    profit_margin_pct: float
+    ingredients: list[IngredientDetailStruct]
+    samples: int
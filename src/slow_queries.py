@@ -0,0 +1,184 @@
+"""Slow query log: statements slower than SLOW_QUERY_THRESHOLD_SECONDS are kept in a
+ring buffer of the last SLOW_QUERY_LOG_SIZE ones, listed on /admin/slow_queries.
+
+When SLOW_QUERY_EXPLAIN is 1, their `EXPLAIN (ANALYZE, BUFFERS)` plan is captured by
+a background thread on a side connection, which runs the query again: only SELECT
+statements are explained, in a read only transaction with a statement timeout, and a
+statement is explained at most once per SLOW_QUERY_EXPLAIN_COOLDOWN_SECONDS.
+Asyncpg statements are replayed through psycopg2 on the same database.
+"""
+
+import collections
+import hashlib
+import logging
+import re
+import reprlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+
+from sqlalchemy import Connection, Engine, create_engine, event, text
+from sqlalchemy.engine import URL
+from sqlalchemy.pool import NullPool
+
+from src.const import (
+    SLOW_QUERY_EXPLAIN,
+    SLOW_QUERY_EXPLAIN_COOLDOWN_SECONDS,
+    SLOW_QUERY_EXPLAIN_TIMEOUT_SECONDS,
+    SLOW_QUERY_LOG_SIZE,
+    SLOW_QUERY_THRESHOLD_SECONDS,
+)
+
+logger = logging.getLogger(__name__)
+
+# execution option of the explain connections, so their queries are not logged
+SKIP_OPTION = "skip_slow_query_log"
+# explains waiting for the background thread, the others are skipped
+MAX_PENDING_EXPLAINS = 4
+
+_parameters_repr = reprlib.Repr()
+_parameters_repr.maxlist = 20
+_parameters_repr.maxdict = 50
+_parameters_repr.maxstring = 200
+_parameters_repr.maxother = 200
+
+
+@dataclass
+class SlowQuery:
+    statement: str
+    parameters: str
+    duration: float
+    recorded_at: datetime
+    database: str
+    plan: str | None = None
+    plan_error: str | None = None
+
+
+def to_psycopg2_statement(statement: str, parameters) -> tuple[str, dict]:
+    """Rewrite an asyncpg statement, with $1 positional parameters, for psycopg2."""
+    statement = statement.replace("%", "%%")
+    statement = re.sub(r"\$(\d+)", r"%(p\1)s", statement)
+    return statement, {f"p{index}": value for index, value in enumerate(parameters, 1)}
+
+
+def is_explainable(statement: str) -> bool:
+    return statement.lstrip().upper().startswith(("SELECT", "WITH"))
+
+
+class SlowQueryLog:
+    def __init__(
+        self,
+        threshold: float = SLOW_QUERY_THRESHOLD_SECONDS,
+        size: int = SLOW_QUERY_LOG_SIZE,
+        explain: bool = SLOW_QUERY_EXPLAIN,
+        explain_cooldown: float = SLOW_QUERY_EXPLAIN_COOLDOWN_SECONDS,
+        explain_timeout: float = SLOW_QUERY_EXPLAIN_TIMEOUT_SECONDS,
+    ):
+        self.threshold = threshold
+        self.explain = explain
+        self.explain_cooldown = explain_cooldown
+        self.explain_timeout = explain_timeout
+        self.queries: collections.deque[SlowQuery] = collections.deque(maxlen=size)
+        self._explained_at: dict[bytes, float] = {}
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="slow-query-explain"
+        )
+        self._explain_engines: dict[URL, Engine] = {}
+
+    def record(
+        self,
+        connection: Connection,
+        statement: str,
+        parameters,
+        duration: float,
+        executemany: bool,
+    ) -> SlowQuery:
+        url = connection.engine.url
+        query = SlowQuery(
+            statement=statement,
+            parameters=_parameters_repr.repr(parameters),
+            duration=duration,
+            recorded_at=datetime.now(),
+            database=f"{url.host}/{url.database}",
+        )
+        self.queries.append(query)
+        logger.warning("slow query (%.3fs): %s", duration, statement)
+        if (
+            self.explain
+            and connection.dialect.name == "postgresql"
+            and not executemany
+            and is_explainable(statement)
+            and self._reserve_explain(statement)
+        ):
+            if connection.dialect.driver == "asyncpg":
+                statement, parameters = to_psycopg2_statement(statement, parameters)
+            self._executor.submit(self._explain, query, url, statement, parameters)
+        return query
+
+    def _reserve_explain(self, statement: str) -> bool:
+        key = hashlib.blake2b(statement.encode(), digest_size=16).digest()
+        now = time.monotonic()
+        with self._lock:
+            if self._pending >= MAX_PENDING_EXPLAINS:
+                return False
+            if now - self._explained_at.get(key, -self.explain_cooldown) < (
+                self.explain_cooldown
+            ):
+                return False
+            self._explained_at[key] = now
+            self._pending += 1
+            return True
+
+    def _get_explain_engine(self, url: URL) -> Engine:
+        url = url.set(drivername="postgresql+psycopg2")
+        if url not in self._explain_engines:
+            self._explain_engines[url] = create_engine(
+                url,
+                poolclass=NullPool,
+                execution_options={SKIP_OPTION: True},
+            )
+        return self._explain_engines[url]
+
+    def _explain(self, query: SlowQuery, url: URL, statement: str, parameters):
+        try:
+            with self._get_explain_engine(url).connect() as connection:
+                connection.execute(text("SET TRANSACTION READ ONLY"))
+                connection.execute(
+                    text("SELECT set_config('statement_timeout', :timeout, true)"),
+                    {"timeout": f"{int(self.explain_timeout * 1000)}ms"},
+                )
+                rows = connection.exec_driver_sql(
+                    f"EXPLAIN (ANALYZE, BUFFERS) {statement}", parameters
+                ).all()
+                connection.rollback()
+            query.plan = "\n".join(row[0] for row in rows)
+        except Exception as error:
+            query.plan_error = str(error)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def clear(self):
+        self.queries.clear()
+
+
+SLOW_QUERY_LOG = SlowQueryLog()
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("slow_query_started_at", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    duration = time.perf_counter() - conn.info["slow_query_started_at"].pop()
+    if duration < SLOW_QUERY_LOG.threshold or context.execution_options.get(
+        SKIP_OPTION
+    ):
+        return
+    SLOW_QUERY_LOG.record(conn, statement, parameters, duration, executemany)
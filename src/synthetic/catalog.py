@@ -0,0 +1,191 @@
+"""Deterministic synthetic game catalog, with the interface of D3Database's
+`DataReader` and `I18N`, for benchmarks and tests without the game data.
+
+Types are spread over the categories, items over the types with a Zipf
+popularity, and recipes craft equipment and consumables out of resources: a few
+common resources go into a lot of recipes (fan-out) while each recipe needs one
+to eight ingredients (fan-in).
+"""
+
+import bisect
+import itertools
+import random
+from dataclasses import dataclass, field
+from enum import IntEnum
+
+from src.const import (
+    SYNTHETIC_CATALOG_ITEMS,
+    SYNTHETIC_CATALOG_RECIPES,
+    SYNTHETIC_CATALOG_SEED,
+    SYNTHETIC_CATALOG_TYPES,
+)
+
+try:
+    from D3Database.enums.category_item_enum import CategoryEnum
+except ImportError:
+    # same values as D3Database, when the submodule is not checked out
+
+    class CategoryEnum(IntEnum):  # type: ignore[no-redef]
+        EQUIPMENT = 0
+        CONSUMABLES = 1
+        RESOURCES = 2
+        QUEST = 3
+        OTHER = 4
+        COSMETICS = 5
+
+
+CATEGORY_WEIGHTS = {
+    CategoryEnum.EQUIPMENT: 30,
+    CategoryEnum.CONSUMABLES: 15,
+    CategoryEnum.RESOURCES: 40,
+    CategoryEnum.QUEST: 5,
+    CategoryEnum.OTHER: 5,
+    CategoryEnum.COSMETICS: 5,
+}
+CRAFTED_CATEGORIES = (CategoryEnum.EQUIPMENT, CategoryEnum.CONSUMABLES)
+INGREDIENT_COUNT_WEIGHTS = [5, 15, 25, 25, 15, 8, 5, 2]  # 1 to 8 ingredients
+INGREDIENT_QUANTITIES = [1, 1, 1, 2, 2, 3, 5, 10, 20, 50]
+# type names ids are kept apart from the item ones
+TYPE_NAME_ID_OFFSET = 10_000_000
+
+NOUNS = ["Amulette", "Anneau", "Bottes", "Cape", "Chapeau", "Ceinture", "Potion"]
+NOUNS += ["Pain", "Bois", "Minerai", "Peau", "Laine", "Fleur", "Graine", "Os"]
+ADJECTIVES = ["du Bouftou", "du Tofu", "de Frêne", "de Fer", "Ancien", "Royal"]
+ADJECTIVES += ["du Craqueleur", "du Piou", "de Chêne", "du Bandit", "Sombre"]
+
+
+@dataclass
+class SyntheticItem:
+    id: int
+    typeId: int
+    nameId: int
+
+
+@dataclass
+class SyntheticItemType:
+    id: int
+    nameId: int
+    categoryId: int
+
+
+@dataclass
+class SyntheticRecipe:
+    resultId: int
+    ingredientIds: list[int]
+    quantities: list[int]
+
+
+@dataclass
+class SyntheticCatalog:
+    item_by_id: dict[int, SyntheticItem] = field(default_factory=dict)
+    item_type_by_id: dict[int, SyntheticItemType] = field(default_factory=dict)
+    item_ids_by_category: dict[CategoryEnum, set[int]] = field(default_factory=dict)
+    item_ids_by_type_id: dict[int, set[int]] = field(default_factory=dict)
+    recipes: list[SyntheticRecipe] = field(default_factory=list)
+    name_by_id: dict[int, str] = field(default_factory=dict)
+
+
+def zipf_cum_weights(size: int, exponent: float) -> list[float]:
+    return list(
+        itertools.accumulate(1 / (rank + 1) ** exponent for rank in range(size))
+    )
+
+
+def zipf_sample(
+    rng: random.Random, population: list[int], cum_weights: list[float], k: int
+) -> list[int]:
+    """`k` distinct elements, the first ones of `population` being the most likely."""
+    k = min(k, len(population))
+    sample: list[int] = []
+    while len(sample) < k:
+        index = bisect.bisect(cum_weights, rng.random() * cum_weights[-1])
+        if population[index] not in sample:
+            sample.append(population[index])
+    return sample
+
+
+def generate_catalog(
+    items: int, types: int, recipes: int, seed: int = 0
+) -> SyntheticCatalog:
+    rng = random.Random(seed)
+    catalog = SyntheticCatalog(
+        item_ids_by_category={category: set() for category in CategoryEnum}
+    )
+
+    # every category gets a type, the others follow the weights
+    categories = list(CategoryEnum)[:types]
+    categories += rng.choices(
+        list(CATEGORY_WEIGHTS),
+        list(CATEGORY_WEIGHTS.values()),
+        k=types - len(categories),
+    )
+    for type_id, category in enumerate(categories, start=1):
+        catalog.item_type_by_id[type_id] = SyntheticItemType(
+            id=type_id, nameId=TYPE_NAME_ID_OFFSET + type_id, categoryId=category.value
+        )
+        catalog.item_ids_by_type_id[type_id] = set()
+        catalog.name_by_id[TYPE_NAME_ID_OFFSET + type_id] = f"Type {type_id}"
+
+    type_ids = list(catalog.item_type_by_id)
+    rng.shuffle(type_ids)
+    type_cum_weights = zipf_cum_weights(len(type_ids), 0.8)
+    for gid in range(1, items + 1):
+        # a few types hold most of the items
+        type_id = type_ids[
+            bisect.bisect(type_cum_weights, rng.random() * type_cum_weights[-1])
+        ]
+        catalog.item_by_id[gid] = SyntheticItem(id=gid, typeId=type_id, nameId=gid)
+        catalog.name_by_id[gid] = f"{rng.choice(NOUNS)} {rng.choice(ADJECTIVES)}"
+        catalog.item_ids_by_type_id[type_id].add(gid)
+        category = CategoryEnum(catalog.item_type_by_id[type_id].categoryId)
+        catalog.item_ids_by_category[category].add(gid)
+
+    ingredient_ids = sorted(catalog.item_ids_by_category[CategoryEnum.RESOURCES])
+    rng.shuffle(ingredient_ids)
+    ingredient_cum_weights = zipf_cum_weights(len(ingredient_ids), 1.0)
+    craftable_ids = sorted(
+        gid
+        for category in CRAFTED_CATEGORIES
+        for gid in catalog.item_ids_by_category[category]
+    )
+    if not ingredient_ids:
+        return catalog
+    for result_id in rng.sample(craftable_ids, min(recipes, len(craftable_ids))):
+        ingredient_count = rng.choices(
+            range(1, len(INGREDIENT_COUNT_WEIGHTS) + 1), INGREDIENT_COUNT_WEIGHTS
+        )[0]
+        recipe_ingredient_ids = zipf_sample(
+            rng, ingredient_ids, ingredient_cum_weights, ingredient_count
+        )
+        catalog.recipes.append(
+            SyntheticRecipe(
+                resultId=result_id,
+                ingredientIds=recipe_ingredient_ids,
+                quantities=[
+                    rng.choice(INGREDIENT_QUANTITIES) for _ in recipe_ingredient_ids
+                ],
+            )
+        )
+    return catalog
+
+
+class DataReader:
+    """Synthetic stand-in of D3Database's DataReader, sized by the SYNTHETIC_CATALOG_*
+    settings and generated once per process."""
+
+    _catalog: SyntheticCatalog | None = None
+
+    def __new__(cls):
+        if DataReader._catalog is None:
+            DataReader._catalog = generate_catalog(
+                SYNTHETIC_CATALOG_ITEMS,
+                SYNTHETIC_CATALOG_TYPES,
+                SYNTHETIC_CATALOG_RECIPES,
+                SYNTHETIC_CATALOG_SEED,
+            )
+        return DataReader._catalog
+
+
+class I18N:
+    def __new__(cls):
+        return DataReader()
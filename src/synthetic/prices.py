@@ -0,0 +1,110 @@
+"""Deterministic synthetic price history, for debugging and benchmarks.
+
+Series are generated per (server, gid, quantity): popular items get more samples
+(Zipf), each series is a mean reverting random walk around a log-normal base price,
+and some samples have no price like an empty market listing.
+"""
+
+import math
+import random
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Iterator
+
+from src.models.item_price_history import QuantityEnum
+
+# unit price discount of the bigger lots
+QUANTITY_DISCOUNTS = {
+    QuantityEnum.ONE: 0.0,
+    QuantityEnum.TEN: 0.05,
+    QuantityEnum.HUNDRED: 0.1,
+    QuantityEnum.THOUSAND: 0.15,
+}
+
+# a lot of thousand stays within the integer price column
+MAX_BASE_PRICE = 1_000_000
+
+SCALES = {
+    "10k": 10_000,
+    "100k": 100_000,
+    "1m": 1_000_000,
+    "10m": 10_000_000,
+    "100m": 100_000_000,
+}
+
+
+@dataclass(frozen=True)
+class PriceRow:
+    gid: int
+    quantity: QuantityEnum
+    price: int | None
+    recorded_at: datetime
+    server_id: int
+
+
+def get_series_counts(
+    rows: int, series: int, rng: random.Random, zipf_exponent: float = 0.7
+) -> list[int]:
+    """Split `rows` between `series`, with a Zipf popularity in random order."""
+    weights = [1 / (rank + 1) ** zipf_exponent for rank in range(series)]
+    rng.shuffle(weights)
+    total = sum(weights)
+    counts = [int(rows * weight / total) for weight in weights]
+    # the rounding remainder goes to the most popular series
+    for index in sorted(range(series), key=weights.__getitem__, reverse=True)[
+        : rows - sum(counts)
+    ]:
+        counts[index] += 1
+    return counts
+
+
+def generate_price_rows(
+    rows: int,
+    gids: list[int],
+    server_ids: list[int],
+    seed: int = 0,
+    days: int = 60,
+    end: datetime | None = None,
+    missing_price_ratio: float = 0.03,
+) -> Iterator[PriceRow]:
+    """Yield exactly `rows` price samples over the `days` days before `end` (now by
+    default), always the same ones for the same arguments."""
+    rng = random.Random(seed)
+    end = end or datetime.now().replace(microsecond=0)
+    window = timedelta(days=days).total_seconds()
+
+    # one stable base unit price per item, shared by the servers
+    base_prices = {
+        gid: min(max(math.exp(rng.gauss(7, 1.5)), 1), MAX_BASE_PRICE) for gid in gids
+    }
+    series = [
+        (server_id, gid, quantity)
+        for server_id in server_ids
+        for gid in gids
+        for quantity in QuantityEnum
+    ]
+    counts = get_series_counts(rows, len(series), rng)
+
+    for (server_id, gid, quantity), count in zip(series, counts):
+        if not count:
+            continue
+        mean = base_prices[gid] * quantity * (1 - QUANTITY_DISCOUNTS[quantity])
+        # server economies drift apart
+        mean *= math.exp(rng.gauss(0, 0.1))
+        log_mean = math.log(mean)
+        log_price = log_mean
+        step = window / count
+        for index in range(count):
+            log_price += 0.1 * (log_mean - log_price) + rng.gauss(0, 0.05)
+            offset = window - (index + rng.random()) * step
+            yield PriceRow(
+                gid=gid,
+                quantity=quantity,
+                price=(
+                    None
+                    if rng.random() < missing_price_ratio
+                    else max(round(math.exp(log_price)), 1)
+                ),
+                recorded_at=end - timedelta(seconds=offset),
+                server_id=server_id,
+            )
@@ -0,0 +1,150 @@
+"""Lightweight spans, to see where the time of a request goes.
+
+When TRACING_EXPORTER is "console" or "file", `TracingMiddleware` starts a trace per
+request and `span` records its nested phases, including those run in threads by
+`asyncio.to_thread` which copies the context. Without an active trace, `span` only
+reads a context variable.
+
+The time of the request outside of any span is the framework work, mostly the
+validation and serialization of the response model.
+"""
+
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Iterator
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from src.const import TRACING_EXPORTER, TRACING_FILE
+from src.metrics import get_route_label
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(eq=False)
+class Span:
+    name: str
+    parent: "Span | None"
+    started_at: float
+    thread: str
+    duration: float = 0.0
+
+
+@dataclass
+class Trace:
+    name: str
+    started_at: datetime
+    spans: list[Span] = field(default_factory=list)
+
+
+_current_span: ContextVar[tuple[Trace, Span] | None] = ContextVar(
+    "current_span", default=None
+)
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    current = _current_span.get()
+    if current is None:
+        yield
+        return
+    trace, parent = current
+    record = Span(name, parent, time.perf_counter(), threading.current_thread().name)
+    trace.spans.append(record)
+    token = _current_span.set((trace, record))
+    try:
+        yield
+    finally:
+        record.duration = time.perf_counter() - record.started_at
+        _current_span.reset(token)
+
+
+@contextmanager
+def start_trace(name: str) -> Iterator[Trace]:
+    """Record the spans opened in this context under a root span named `name`."""
+    trace = Trace(name, datetime.now())
+    root = Span(name, None, time.perf_counter(), threading.current_thread().name)
+    trace.spans.append(root)
+    token = _current_span.set((trace, root))
+    try:
+        yield trace
+    finally:
+        root.duration = time.perf_counter() - root.started_at
+        _current_span.reset(token)
+
+
+def dump_trace(trace: Trace) -> dict:
+    ids = {span: index for index, span in enumerate(trace.spans)}
+    root_started_at = trace.spans[0].started_at
+    return {
+        "name": trace.name,
+        "started_at": trace.started_at.isoformat(),
+        "spans": [
+            {
+                "id": ids[span],
+                "parent": None if span.parent is None else ids[span.parent],
+                "name": span.name,
+                "start_ms": round((span.started_at - root_started_at) * 1000, 3),
+                "duration_ms": round(span.duration * 1000, 3),
+                "thread": span.thread,
+            }
+            for span in trace.spans
+        ],
+    }
+
+
+def format_trace(trace: Trace) -> str:
+    """Indented tree of the spans, with the time of each parent outside its children."""
+    children: dict[Span | None, list[Span]] = {}
+    for span in trace.spans:
+        children.setdefault(span.parent, []).append(span)
+
+    lines = []
+
+    def add_lines(span: Span, depth: int):
+        lines.append(f"{'  ' * depth}{span.name} {span.duration * 1000:.1f}ms")
+        for child in children.get(span, []):
+            add_lines(child, depth + 1)
+        if span in children:
+            own = span.duration - sum(child.duration for child in children[span])
+            lines.append(f"{'  ' * (depth + 1)}(other) {own * 1000:.1f}ms")
+
+    for root in children.get(None, []):
+        add_lines(root, 0)
+    return "\n".join(lines)
+
+
+_file_lock = threading.Lock()
+
+
+def export_trace(trace: Trace, exporter: str | None = TRACING_EXPORTER):
+    if exporter == "console":
+        logger.info("trace\n%s", format_trace(trace))
+    elif exporter == "file":
+        line = json.dumps(dump_trace(trace))
+        with _file_lock, open(TRACING_FILE, "a") as file:
+            file.write(line + "\n")
+
+
+class TracingMiddleware:
+    def __init__(self, app: ASGIApp, exporter: str | None = TRACING_EXPORTER):
+        self.app = app
+        self.exporter = exporter
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or self.exporter is None:
+            await self.app(scope, receive, send)
+            return
+
+        route = get_route_label(scope["app"], scope)
+        try:
+            with start_trace(f"{scope['method']} {route}") as trace:
+                await self.app(scope, receive, send)
+        finally:
+            export_trace(trace, self.exporter)
@@ -0,0 +1,54 @@
+"""Keep the in-process crafts ranking of the active servers: rebuild it from the
+database every CRAFT_RANKING_REFRESH_INTERVAL_SECONDS, which also drops the samples
+past RANKING_LOOKBACK_DAYS from the averages. Between two rebuilds the ranking is
+updated by the ingestion of this process and the catch up of the others' writes.
+
+Started by the API lifespan when CRAFT_RANKING_ENABLED is 1, the ranking lives in
+the API process.
+"""
+
+import asyncio
+import logging
+import time
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from src.const import CRAFT_RANKING_REFRESH_INTERVAL_SECONDS
+from src.controllers.craft_ranking import CraftRankingController
+from src.controllers.top_ranking import TopRankingController
+from src.database import AsyncSessionMaker, get_async_engine
+
+logger = logging.getLogger(__name__)
+
+
+async def refresh_once() -> list[int]:
+    """Rebuild the ranking of every active server, returns them."""
+    rebuilt = []
+    async with AsyncSessionMaker(bind=get_async_engine()) as session:
+        server_ids = await TopRankingController.get_active_server_ids_async(session)
+        for server_id in server_ids:
+            started_at = time.perf_counter()
+            # a snapshot per server, the version read matches the statistics
+            await session.rollback()
+            server_crafts = await CraftRankingController.warm_server_async(
+                session, server_id
+            )
+            rebuilt.append(server_id)
+            logger.info(
+                "crafts ranking of server %s rebuilt with %s recipes in %.3fs",
+                server_id,
+                len(server_crafts.heaps[(None, False)].candidates),
+                time.perf_counter() - started_at,
+            )
+    return rebuilt
+
+
+async def run_craft_ranking(
+    interval: float = CRAFT_RANKING_REFRESH_INTERVAL_SECONDS,
+):
+    while True:
+        try:
+            await refresh_once()
+        except (OSError, SQLAlchemyError):
+            logger.exception("crafts ranking refresh failed")
+        await asyncio.sleep(interval)
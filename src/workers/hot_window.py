@@ -0,0 +1,64 @@
+"""Keep the in-process hot window of recent prices warm: load the active servers at
+startup and the new ones later, catch up with the other processes' writes and
+evict the samples past HOT_WINDOW_DAYS.
+
+Started by the API lifespan when HOT_WINDOW_ENABLED is 1, the window lives in the
+API process.
+"""
+
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from src.const import HOT_WINDOW_DAYS, HOT_WINDOW_REFRESH_INTERVAL_SECONDS
+from src.controllers.hot_window import HOT_WINDOW, HotWindowController
+from src.controllers.top_ranking import TopRankingController
+from src.database import AsyncSessionMaker, get_async_engine
+
+logger = logging.getLogger(__name__)
+
+
+async def refresh_once(days: int = HOT_WINDOW_DAYS) -> list[int]:
+    """Warm the servers not loaded yet, returns them."""
+    warmed = []
+    async with AsyncSessionMaker(bind=get_async_engine()) as session:
+        server_ids = await TopRankingController.get_active_server_ids_async(session)
+        for server_id, server_window in list(HOT_WINDOW.servers.items()):
+            await HotWindowController.sync_server_async(
+                session, server_id, server_window
+            )
+        for server_id in server_ids:
+            # a server over the budget is loaded again once eviction freed enough
+            if server_id in HOT_WINDOW.servers or not HOT_WINDOW.fits(server_id):
+                continue
+            started_at = time.perf_counter()
+            # a transaction per server, none is held open for the whole refresh; the
+            # rows streamed are bounded by the version read, committed before it
+            await session.rollback()
+            warmed_window = await HotWindowController.warm_server_async(
+                session, server_id, days=days
+            )
+            if warmed_window is None:
+                continue
+            warmed.append(server_id)
+            logger.info(
+                "hot window of server %s warmed with %s rows in %.3fs",
+                server_id,
+                warmed_window.rows,
+                time.perf_counter() - started_at,
+            )
+    # on the event loop like every other change of the windows
+    HOT_WINDOW.evict(datetime.now() - timedelta(days=days))
+    return warmed
+
+
+async def run_hot_window(interval: float = HOT_WINDOW_REFRESH_INTERVAL_SECONDS):
+    while True:
+        try:
+            await refresh_once()
+        except (OSError, SQLAlchemyError):
+            logger.exception("hot window refresh failed")
+        await asyncio.sleep(interval)
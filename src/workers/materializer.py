@@ -0,0 +1,58 @@
+"""Periodically precompute the top items/crafts rankings of every active server.
+
+Started by the API lifespan, or alone with `python -m src.workers.materializer`.
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+
+from sqlalchemy.exc import SQLAlchemyError
+
+sys.path.append(os.path.join(Path(__file__).parent.parent.parent, "D3Database"))
+
+from src.const import RANKING_MATERIALIZER_INTERVAL_SECONDS
+from src.controllers.top_ranking import TopRankingController
+from src.database import AsyncSessionMaker, get_async_engine
+
+logger = logging.getLogger(__name__)
+
+
+async def materialize_once() -> list[int]:
+    started_at = time.perf_counter()
+    async with AsyncSessionMaker(bind=get_async_engine()) as session:
+        server_ids = await TopRankingController.materialize_async(session)
+    logger.info(
+        "materialized rankings of servers %s in %.3fs",
+        server_ids,
+        time.perf_counter() - started_at,
+    )
+    return server_ids
+
+
+async def run_materializer(interval: float = RANKING_MATERIALIZER_INTERVAL_SECONDS):
+    while True:
+        try:
+            await materialize_once()
+        except (OSError, SQLAlchemyError):
+            logger.exception("rankings materialization failed")
+        await asyncio.sleep(interval)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--once", action="store_true", help="run a single pass")
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=RANKING_MATERIALIZER_INTERVAL_SECONDS,
+        help="seconds between two passes",
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, stream=sys.stdout)
+    asyncio.run(materialize_once() if args.once else run_materializer(args.interval))
@@ -0,0 +1,65 @@
+"""Keep the mule registry of this worker in sync with the changes of the others,
+relayed by postgres LISTEN/NOTIFY.
+
+Started by the API lifespan.
+"""
+
+import asyncio
+import logging
+
+import asyncpg
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from src.controllers.character import MULE_REGISTRY
+from src.database import get_async_engine
+from src.mule_registry import CHARACTER_ACTION_CHANNEL, MuleRegistry
+
+logger = logging.getLogger(__name__)
+
+LISTENER_ERRORS = (
+    OSError,
+    SQLAlchemyError,
+    asyncpg.PostgresError,
+    asyncpg.InterfaceError,
+)
+
+
+async def listen_action_changes(
+    registry: MuleRegistry, engine: AsyncEngine, check_interval: float = 5
+):
+    async with engine.connect() as connection:
+        # the connection would keep the listener in the pool, it is never reused
+        connection_fairy = await connection.get_raw_connection()
+        driver_connection = connection_fairy.driver_connection
+        if driver_connection is None:
+            # invalidated before it was handed over, retried as a disconnection
+            raise asyncpg.InterfaceError("character action listener connection lost")
+        try:
+
+            def on_notification(_connection, _pid, _channel, payload: str):
+                registry.apply_notification(payload)
+
+            await driver_connection.add_listener(
+                CHARACTER_ACTION_CHANNEL, on_notification
+            )
+            registry.set_synced(True)
+            logger.info("listening to character action changes")
+            while True:
+                await asyncio.sleep(check_interval)
+                # outside of a transaction, notifications are held while one is open
+                await driver_connection.execute("SELECT 1")
+        finally:
+            registry.set_synced(False)
+            await connection.invalidate()
+
+
+async def run_mule_listener(
+    registry: MuleRegistry = MULE_REGISTRY, retry_delay: float = 1
+):
+    while True:
+        try:
+            await listen_action_changes(registry, get_async_engine())
+        except LISTENER_ERRORS:
+            logger.exception("character action listener disconnected")
+        await asyncio.sleep(retry_delay)
@@ -0,0 +1,77 @@
+"""Move the price history older than COLD_STORAGE_AFTER_MONTHS whole months out of
+PostgreSQL, to the Parquet files of COLD_STORAGE_DIR read back by the analytics.
+
+Runs alone, next to the API which reads the same directory:
+
+    python -m src.workers.tiering [--once]
+
+The API only looks for archives before the cutoff of the same
+COLD_STORAGE_AFTER_MONTHS, so the months kept are not overridable here: archiving
+more recent months would hide them from the analytics.
+
+The space of the deleted rows is reused by the next inserts; VACUUM FULL gives it
+back to the file system.
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+
+from sqlalchemy.exc import SQLAlchemyError
+
+sys.path.append(os.path.join(Path(__file__).parent.parent.parent, "D3Database"))
+
+from src.cold_storage import ColdStorage
+from src.const import COLD_STORAGE_INTERVAL_SECONDS
+from src.controllers.cold_storage import COLD_STORAGE, ColdStorageController
+from src.database import SessionMaker, get_engine
+
+logger = logging.getLogger(__name__)
+
+
+def tier_once(storage: ColdStorage) -> int:
+    started_at = time.perf_counter()
+    cutoff = ColdStorageController.get_cutoff()
+    with SessionMaker(bind=get_engine()) as session:
+        archived = ColdStorageController.archive(session, storage, cutoff)
+    rows = sum(archived.values())
+    logger.info(
+        "archived %s rows from %s months before %s in %.3fs",
+        rows,
+        len(archived),
+        cutoff.date(),
+        time.perf_counter() - started_at,
+    )
+    return rows
+
+
+def run_tiering(storage: ColdStorage, interval: float = COLD_STORAGE_INTERVAL_SECONDS):
+    while True:
+        try:
+            tier_once(storage)
+        except (OSError, SQLAlchemyError):
+            logger.exception("tiering failed")
+        time.sleep(interval)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--once", action="store_true", help="run a single pass")
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=COLD_STORAGE_INTERVAL_SECONDS,
+        help="seconds between two passes",
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, stream=sys.stdout)
+    if COLD_STORAGE is None:
+        parser.error("COLD_STORAGE_DIR is not set")
+    if args.once:
+        tier_once(COLD_STORAGE)
+    else:
+        run_tiering(COLD_STORAGE, args.interval)
@@ -0,0 +1,208 @@
+import asyncio
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from src.controllers.change_version import ChangeVersionController
+from src.controllers.character import CharacterController
+from src.controllers.utils import get_or_create
+from src.models.base import Base
+from src.models.character import Character, CharacterActionEnum
+from src.mule_registry import MuleRegistry
+from src.schemas.character import CharacterCreateSchema
+
+
+@pytest.fixture()
+def in_memory_session():
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+    session = Session()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+def test_get_or_create_upsert_creates_then_updates(in_memory_session):
+    session = in_memory_session
+
+    character, _ = get_or_create(session, Character, upsert=True, id=1, server_id=10)
+    assert (character.id, character.server_id) == (1, 10)
+
+    character.action = CharacterActionEnum.MULE_ACCEPT_BANK
+    session.commit()
+
+    character, _ = get_or_create(session, Character, upsert=True, id=1, server_id=11)
+    assert character.server_id == 11
+    # columns outside of the upserted values are kept
+    assert character.action == CharacterActionEnum.MULE_ACCEPT_BANK
+    assert session.scalar(select(func.count()).select_from(Character)) == 1
+
+
+def test_get_or_create_upsert_defaults_only_on_creation(in_memory_session):
+    session = in_memory_session
+
+    get_or_create(
+        session,
+        Character,
+        upsert=True,
+        defaults={"action": CharacterActionEnum.MULE_ACCEPT_BANK},
+        id=2,
+        server_id=10,
+    )
+    session.get(Character, 2).action = None
+    session.commit()
+
+    character, _ = get_or_create(
+        session,
+        Character,
+        upsert=True,
+        defaults={"action": CharacterActionEnum.MULE_ACCEPT_BANK},
+        id=2,
+        server_id=10,
+    )
+    assert character.action is None
+
+
+def test_upsert_characters_in_one_statement(in_memory_session):
+    session = in_memory_session
+    get_or_create(session, Character, upsert=True, id=1, server_id=10)
+
+    characters = CharacterController.upsert_characters(
+        session,
+        [CharacterCreateSchema(id=id, server_id=20) for id in range(1, 301)]
+        + [CharacterCreateSchema(id=1, server_id=30)],
+    )
+
+    assert len(characters) == 300
+    assert session.get(Character, 1).server_id == 30
+    assert session.scalar(select(func.count()).select_from(Character)) == 300
+
+
+def test_action_changes_since_version():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    Session = async_sessionmaker(engine, expire_on_commit=False)
+
+    async def run():
+        async with engine.begin() as connection:
+            await connection.run_sync(Base.metadata.create_all)
+        async with Session() as session:
+            await CharacterController.upsert_characters_async(
+                session, [CharacterCreateSchema(id=id, server_id=1) for id in (1, 2)]
+            )
+            first_version, first_changes = (
+                await CharacterController.get_action_changes_async(session, 1, 0)
+            )
+
+            await CharacterController.update_action_async(
+                session, 1, CharacterActionEnum.MULE_ACCEPT_BANK
+            )
+            # registering again an unchanged character is not a change
+            await CharacterController.upsert_characters_async(
+                session, [CharacterCreateSchema(id=2, server_id=1)]
+            )
+            _, changes = await CharacterController.get_action_changes_async(
+                session, 1, first_version
+            )
+
+            await CharacterController.upsert_characters_async(
+                session, [CharacterCreateSchema(id=1, server_id=2)]
+            )
+            _, moved_changes = await CharacterController.get_action_changes_async(
+                session, 2, 0
+            )
+        await engine.dispose()
+        return first_changes, changes, moved_changes
+
+    first_changes, changes, moved_changes = asyncio.run(run())
+    assert first_changes == []
+    assert list(changes) == [(1, CharacterActionEnum.MULE_ACCEPT_BANK)]
+    assert list(moved_changes) == [(1, CharacterActionEnum.MULE_ACCEPT_BANK)]
+
+
+def test_action_changes_report_departures():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    Session = async_sessionmaker(engine, expire_on_commit=False)
+
+    async def run():
+        async with engine.begin() as connection:
+            await connection.run_sync(Base.metadata.create_all)
+        async with Session() as session:
+            await CharacterController.upsert_characters_async(
+                session, [CharacterCreateSchema(id=id, server_id=1) for id in (1, 2)]
+            )
+            await CharacterController.update_action_async(
+                session, 1, CharacterActionEnum.MULE_ACCEPT_BANK
+            )
+            version, _ = await CharacterController.get_action_changes_async(
+                session, 1, 0
+            )
+
+            await CharacterController.upsert_characters_async(
+                session, [CharacterCreateSchema(id=1, server_id=2)]
+            )
+            _, left_changes = await CharacterController.get_action_changes_async(
+                session, 1, version
+            )
+
+            # back on its former server, its current action is reported
+            await CharacterController.upsert_characters_async(
+                session, [CharacterCreateSchema(id=1, server_id=1)]
+            )
+            _, back_changes = await CharacterController.get_action_changes_async(
+                session, 1, version
+            )
+        await engine.dispose()
+        return left_changes, back_changes
+
+    left_changes, back_changes = asyncio.run(run())
+    assert list(left_changes) == [(1, None)]
+    assert list(back_changes) == [(1, CharacterActionEnum.MULE_ACCEPT_BANK)]
+
+
+def test_upsert_unchanged_characters_allocates_no_version(in_memory_session):
+    session = in_memory_session
+    payloads = [CharacterCreateSchema(id=id, server_id=10) for id in (1, 2)]
+    CharacterController.upsert_characters(session, payloads)
+    version = ChangeVersionController.get_version(session, 10)
+
+    characters = CharacterController.upsert_characters(session, payloads)
+
+    assert [character.id for character in characters] == [1, 2]
+    assert ChangeVersionController.get_version(session, 10) == version
+    CharacterController.upsert_characters(
+        session, [CharacterCreateSchema(id=2, server_id=11)]
+    )
+    # the departure of the moved character is a change of its former server
+    assert ChangeVersionController.get_version(session, 10) == version + 1
+    assert ChangeVersionController.get_version(session, 11) == 1
+
+
+def test_sync_writes_go_through_the_registry(in_memory_session):
+    session = in_memory_session
+
+    async def loader(server_id: int) -> list[int]:
+        return []
+
+    registry = MuleRegistry(loader, synced=True)
+    asyncio.run(registry.get_ids(10))
+    asyncio.run(registry.get_ids(11))
+    with patch("src.controllers.character.MULE_REGISTRY", registry):
+        CharacterController.upsert_characters(
+            session, [CharacterCreateSchema(id=1, server_id=10)]
+        )
+        CharacterController.update_action(
+            session, 1, CharacterActionEnum.MULE_ACCEPT_BANK
+        )
+        mules = asyncio.run(registry.get_ids(10))[0]
+        CharacterController.upsert_characters(
+            session, [CharacterCreateSchema(id=1, server_id=11)]
+        )
+
+    assert mules == [1]
+    assert asyncio.run(registry.get_ids(10))[0] == []
+    assert asyncio.run(registry.get_ids(11))[0] == [1]
@@ -0,0 +1,185 @@
+import io
+from datetime import date, datetime, timedelta
+from unittest.mock import MagicMock, patch
+
+import pyarrow.parquet as pq
+import pytest
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import sessionmaker
+
+from src.cold_storage import ColdStorage
+from src.controllers.cold_storage import ColdStorageController
+from src.controllers.export import ExportController
+from src.export import ExportFormatEnum
+from src.controllers.item_price_history import ItemPriceHistoryController
+from src.models.base import Base
+from src.models.cold_partition import ColdPartition
+from src.models.item_price_history import ItemPriceHistory, QuantityEnum
+
+
+@pytest.fixture()
+def storage(tmp_path, monkeypatch):
+    storage = ColdStorage(tmp_path)
+    monkeypatch.setattr("src.controllers.cold_storage.COLD_STORAGE", storage)
+    return storage
+
+
+@pytest.fixture()
+def session():
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(engine)
+    with sessionmaker(bind=engine)() as session:
+        yield session
+
+
+def add_prices(session, recorded_ats: list[datetime], gid: int = 100):
+    session.add_all(
+        ItemPriceHistory(
+            gid=gid,
+            quantity=QuantityEnum.HUNDRED,
+            price=(index + 1) * 10,
+            recorded_at=recorded_at,
+            server_id=1,
+            change_version=index + 1,
+        )
+        for index, recorded_at in enumerate(recorded_ats)
+    )
+    session.commit()
+
+
+def test_get_cutoff():
+    assert ColdStorageController.get_cutoff(6, datetime(2026, 3, 15, 12)) == (
+        datetime(2025, 9, 1)
+    )
+
+
+def test_archive_moves_whole_months_before_cutoff(session, storage):
+    add_prices(
+        session,
+        [datetime(2025, 1, 5), datetime(2025, 1, 20), datetime(2025, 3, 1)],
+    )
+    add_prices(session, [datetime(2025, 4, 1)], gid=200)
+
+    archived = ColdStorageController.archive(session, storage, datetime(2025, 4, 1))
+
+    assert archived == {(1, date(2025, 1, 1)): 2, (1, date(2025, 3, 1)): 1}
+    assert session.scalar(select(func.count()).select_from(ItemPriceHistory)) == 1
+    partitions = session.scalars(select(ColdPartition).order_by(ColdPartition.month))
+    assert [(partition.month, partition.rows) for partition in partitions] == [
+        (date(2025, 1, 1), 2),
+        (date(2025, 3, 1), 1),
+    ]
+    # nothing left to move, no temporary file left behind
+    assert ColdStorageController.archive(session, storage, datetime(2025, 4, 1)) == {}
+    assert not list(storage.root.rglob("*.tmp"))
+
+
+def test_export_reads_archived_months(session, storage):
+    now = datetime.now()
+    old = ColdStorageController.get_cutoff() - timedelta(days=10)
+    add_prices(session, [old, old + timedelta(days=1), now - timedelta(days=1)])
+    ColdStorageController.archive(session, storage, ColdStorageController.get_cutoff())
+
+    def export(start: datetime, end: datetime) -> list[int]:
+        output = io.BytesIO()
+        paths = ColdStorageController.get_paths(session, 1, start, end)
+        ExportController.export(
+            session,
+            output,
+            ExportFormatEnum.PARQUET,
+            1,
+            start,
+            end,
+            archived_batches=ColdStorageController.read_export_batches(
+                paths, 1, start, end
+            ),
+        )
+        table = pq.read_table(io.BytesIO(output.getvalue()))
+        return sorted(table.column("price").to_pylist())
+
+    assert export(old, now) == [10, 20, 30]
+    assert export(old + timedelta(hours=1), now - timedelta(days=2)) == [20]
+
+
+@patch("src.controllers.item_price_history.DataReader")
+@patch("src.controllers.item_price_history.I18N")
+def test_analytics_read_archived_and_recent_prices(
+    mock_i18n, mock_data_reader, session, storage
+):
+    mock_data_reader.return_value.item_by_id = {100: MagicMock(nameId=1)}
+    mock_i18n.return_value.name_by_id = {1: "Item 100"}
+    now = datetime.now()
+    old = ColdStorageController.get_cutoff() - timedelta(days=10)
+    add_prices(session, [old, old + timedelta(days=1), now - timedelta(days=1)])
+    ColdStorageController.archive(session, storage, ColdStorageController.get_cutoff())
+
+    evolution = ItemPriceHistoryController.get_evolution_price(
+        session, QuantityEnum.HUNDRED, 1, 0, 100
+    )
+    assert [row.price for row in evolution] == [10, 20, 30]
+    assert evolution[0].quantity == QuantityEnum.HUNDRED
+
+    # a delta sync only gets the prices after its version
+    evolution = ItemPriceHistoryController.get_evolution_price(
+        session, QuantityEnum.HUNDRED, 1, 0, 100, since_version=1
+    )
+    assert [row.price for row in evolution] == [20, 30]
+
+    # the pages go on from the archives to the database
+    rows, cursor = ItemPriceHistoryController.get_evolution_price_page(
+        session, QuantityEnum.HUNDRED, 1, 0, 3, 2, 100
+    )
+    assert [row.price for row in rows] == [10, 20]
+    rows, cursor = ItemPriceHistoryController.get_evolution_price_page(
+        session, QuantityEnum.HUNDRED, 1, 0, 3, 2, 100, cursor=cursor
+    )
+    assert [row.price for row in rows] == [30]
+    assert cursor is None
+
+    lookback_days = (now - old).days + 1
+    columns = ItemPriceHistoryController._fetch_profitable_columns(
+        session, 1, QuantityEnum.HUNDRED, lookback_days
+    )
+    assert sorted(columns.prices.tolist()) == [10, 20, 30]
+    # a recent lookback does not reach the archives
+    columns = ItemPriceHistoryController._fetch_profitable_columns(
+        session, 1, QuantityEnum.HUNDRED, 30
+    )
+    assert columns.prices.tolist() == [30]
+
+    evaluation = ItemPriceHistoryController.is_price_resell_profitable(
+        session, 100, None, 1, 5, lookback_days=lookback_days, min_samples=3
+    )
+    assert evaluation.samples == 3
+    assert evaluation.median_price == 20
+
+
+def test_evolution_page_reads_the_months_it_spans(session, storage):
+    add_prices(
+        session,
+        [datetime(2025, 1, 5), datetime(2025, 2, 5), datetime(2025, 3, 5)],
+    )
+    ColdStorageController.archive(session, storage, datetime(2025, 4, 1))
+    paths_by_month = ColdStorageController.get_month_paths(session, 1, None)
+    assert len(paths_by_month) == 3
+
+    def read(paths_by_month, after=None):
+        return ColdStorageController.read_price_history(
+            paths_by_month, 1, QuantityEnum.HUNDRED, [100], after=after, limit=1
+        )
+
+    with patch.object(storage, "scan", wraps=storage.scan) as scan:
+        rows = read(paths_by_month)
+    assert [row[2] for row in rows] == [10]
+    assert scan.call_count == 1
+
+    # the next page starts from the month of its cursor
+    after = (rows[-1][3], rows[-1][4])
+    paths_by_month = ColdStorageController.get_month_paths(session, 1, after[0])
+    assert len(paths_by_month) == 3
+    rows = read(paths_by_month, after)
+    assert [row[2] for row in rows] == [20]
+    paths_by_month = ColdStorageController.get_month_paths(
+        session, 1, datetime(2025, 2, 5)
+    )
+    assert len(paths_by_month) == 2
@@ -0,0 +1,150 @@
+import asyncio
+import random
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock, patch
+
+import pytest
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from src.controllers.craft_ranking import CRAFT_RANKING, CraftRankingController
+from src.controllers.item_price_history import ItemPriceHistoryController
+from src.controllers.latest_item_price import LatestItemPriceController
+from src.craft_ranking import CraftCandidate, ProfitHeap
+from src.models.base import Base
+from src.models.item_price_history import ItemPriceHistory, QuantityEnum
+from src.models.server_change_version import ServerChangeVersion
+from src.schemas.item_price_history import CreateItemPriceHistorySchema
+
+
+def make_candidate(profit: float) -> CraftCandidate:
+    return CraftCandidate(profit + 10, 10, profit, profit * 10)
+
+
+def test_profit_heap_keeps_the_live_order():
+    heap = ProfitHeap()
+    for recipe_index, profit in enumerate([5, 20, 20.001, 1]):
+        heap.set(recipe_index, make_candidate(profit))
+    # the rounded profits tie, the first recipe wins like the stable sort
+    assert [index for index, _ in heap.top(3)] == [1, 2, 0]
+
+    heap.set(1, make_candidate(2))
+    heap.set(0, None)
+    assert [(index, candidate.profit) for index, candidate in heap.top(10)] == [
+        (2, 20.001),
+        (1, 2),
+        (3, 1),
+    ]
+    # reading the top does not consume it
+    assert len(heap.top(10)) == 3
+
+
+@pytest.fixture()
+def async_session_maker():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+
+    async def setup():
+        async with engine.begin() as connection:
+            await connection.run_sync(Base.metadata.create_all)
+
+    asyncio.run(setup())
+    yield async_sessionmaker(engine, expire_on_commit=False)
+    asyncio.run(engine.dispose())
+    CRAFT_RANKING.servers.clear()
+    CRAFT_RANKING.index = None
+
+
+@patch("src.controllers.craft_ranking.DataReader")
+@patch("src.controllers.item_price_history.DataReader")
+@patch("src.controllers.item_price_history.I18N")
+def test_incremental_ranking_matches_the_live_one(
+    mock_i18n, mock_data_reader, mock_ranking_data_reader, async_session_maker
+):
+    rng = random.Random(47)
+    gids = list(range(18001, 18013))
+    recipes = [
+        MagicMock(
+            resultId=result_id,
+            ingredientIds=(ingredient_ids := rng.sample(gids[6:], 2)),
+            quantities=[rng.randint(1, 3) for _ in ingredient_ids],
+        )
+        for result_id in gids[:6]
+    ]
+    for data_reader in (mock_data_reader, mock_ranking_data_reader):
+        data_reader.return_value.recipes = recipes
+        data_reader.return_value.item_by_id = {
+            gid: MagicMock(nameId=gid) for gid in gids
+        }
+    mock_i18n.return_value.name_by_id = {gid: f"Item {gid}" for gid in gids}
+    now = datetime.now()
+
+    def make_price(gid: int) -> int:
+        # the results sell above their ingredients, most recipes are profitable
+        return rng.randint(2000, 6000) if gid in gids[:6] else rng.randint(100, 900)
+
+    def make_payloads() -> list[CreateItemPriceHistorySchema]:
+        return [
+            CreateItemPriceHistorySchema(
+                gid=(gid := rng.choice(gids)),
+                quantity=quantity,
+                price=rng.choice([None, make_price(gid), make_price(gid)]),
+                server_id=1,
+            )
+            for quantity in QuantityEnum
+        ]
+
+    async def assert_same_rankings(session):
+        ranked = 0
+        for quantity in [None, *QuantityEnum]:
+            for current_prices in (False, True):
+                _, incremental = (
+                    await ItemPriceHistoryController.get_incremental_top_crafts_async(
+                        session, 1, quantity, 50, current_prices
+                    )
+                )
+                live = await ItemPriceHistoryController.get_top_profitable_crafts_async(
+                    session, 1, quantity, current_prices=current_prices
+                )
+                assert incremental == live, (quantity, current_prices)
+                ranked += len(live)
+        return ranked
+
+    async def run():
+        async with async_session_maker() as session:
+            await session.merge(ServerChangeVersion(server_id=1, version=1))
+            session.add_all(
+                ItemPriceHistory(
+                    gid=gid,
+                    quantity=quantity,
+                    price=make_price(gid),
+                    recorded_at=now - timedelta(days=rng.randint(1, 20)),
+                    server_id=1,
+                    change_version=1,
+                )
+                for gid in gids
+                for quantity in QuantityEnum
+                for _ in range(rng.randint(3, 8))
+            )
+            await session.commit()
+            await session.run_sync(LatestItemPriceController.rebuild)
+            await CraftRankingController.warm_server_async(session, 1)
+            assert await assert_same_rankings(session)
+
+            # inserted by this process
+            for _ in range(30):
+                await ItemPriceHistoryController.bulk_insert_async(
+                    session, make_payloads()
+                )
+            assert await assert_same_rankings(session)
+
+            # inserted by another process, then caught up
+            server_crafts = CRAFT_RANKING.servers.pop(1)
+            for _ in range(30):
+                await ItemPriceHistoryController.bulk_insert_async(
+                    session, make_payloads()
+                )
+            CRAFT_RANKING.servers[1] = server_crafts
+            server_crafts.synced_at = 0
+            assert await assert_same_rankings(session)
+            assert server_crafts.version == 61
+
+    asyncio.run(run())
@@ -0,0 +1,123 @@
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from src.database import (
+    SYNC_POOL_OPTIONS,
+    ReplicaRouter,
+    get_pool_options,
+    wait_for_database,
+)
+
+
+def test_get_pool_options_splits_budget_between_workers():
+    # the connections of the sync engine are set aside
+    assert get_pool_options(workers=1, max_connections=90, engines=1) == {
+        "pool_size": 44,
+        "max_overflow": 44,
+    }
+    options = get_pool_options(workers=4, max_connections=90, engines=1)
+    assert options["pool_size"] + options["max_overflow"] <= 90 // 4
+
+
+def test_get_pool_options_splits_share_between_engines():
+    # a primary engine and two replica engines per worker, and a sync engine
+    options = get_pool_options(workers=4, max_connections=90, engines=3)
+    connections = options["pool_size"] + options["max_overflow"]
+    assert 4 * (3 * connections + sum(SYNC_POOL_OPTIONS.values())) <= 90
+
+
+def test_get_pool_options_keeps_a_minimal_pool():
+    assert get_pool_options(workers=64, max_connections=10, engines=1) == {
+        "pool_size": 1,
+        "max_overflow": 1,
+    }
+
+
+def make_router(lags: dict[str, float | Exception], check_interval: float = 0):
+    async def lag_probe(engine):
+        lag = lags[str(engine.url)]
+        if isinstance(lag, Exception):
+            raise lag
+        return lag
+
+    return ReplicaRouter(
+        "sqlite+aiosqlite:///primary.db",
+        ["sqlite+aiosqlite:///replica1.db", "sqlite+aiosqlite:///replica2.db"],
+        max_lag=5,
+        check_interval=check_interval,
+        engine_factory=create_async_engine,
+        lag_probe=lag_probe,
+    )
+
+
+def test_replica_router_round_robin_between_fresh_replicas():
+    router = make_router(
+        {"sqlite+aiosqlite:///replica1.db": 0, "sqlite+aiosqlite:///replica2.db": 1}
+    )
+
+    async def run():
+        return [str((await router.get_engine()).url) for _ in range(4)]
+
+    assert asyncio.run(run()) == [
+        "sqlite+aiosqlite:///replica1.db",
+        "sqlite+aiosqlite:///replica2.db",
+        "sqlite+aiosqlite:///replica1.db",
+        "sqlite+aiosqlite:///replica2.db",
+    ]
+
+
+def test_replica_router_skips_lagging_and_unreachable_replicas():
+    lags = {
+        "sqlite+aiosqlite:///replica1.db": 60.0,
+        "sqlite+aiosqlite:///replica2.db": OSError("unreachable"),
+    }
+    router = make_router(lags)
+
+    async def run():
+        return str((await router.get_engine()).url)
+
+    assert asyncio.run(run()) == "sqlite+aiosqlite:///primary.db"
+
+    lags["sqlite+aiosqlite:///replica2.db"] = 0.5
+    assert asyncio.run(run()) == "sqlite+aiosqlite:///replica2.db"
+
+
+def test_replica_router_caches_lag_between_checks():
+    lags = {"sqlite+aiosqlite:///replica1.db": 0, "sqlite+aiosqlite:///replica2.db": 0}
+    router = make_router(lags, check_interval=60)
+
+    async def run():
+        return str((await router.get_engine()).url)
+
+    assert asyncio.run(run()) == "sqlite+aiosqlite:///replica1.db"
+    lags["sqlite+aiosqlite:///replica1.db"] = 60.0
+    # the stale lag is still trusted until the next check
+    assert asyncio.run(run()) == "sqlite+aiosqlite:///replica2.db"
+    assert asyncio.run(run()) == "sqlite+aiosqlite:///replica1.db"
+
+
+def test_wait_for_database_retries_with_backoff():
+    answers = iter([False, False, True])
+    delays = []
+
+    async def fake_sleep(delay):
+        delays.append(delay)
+
+    with (
+        patch(
+            "src.database.ping_database", AsyncMock(side_effect=lambda: next(answers))
+        ),
+        patch("src.database.asyncio.sleep", fake_sleep),
+    ):
+        asyncio.run(wait_for_database(initial_delay=0.1, max_delay=0.15))
+
+    assert delays == [0.1, 0.15]
+
+
+def test_wait_for_database_times_out():
+    with patch("src.database.ping_database", AsyncMock(return_value=False)):
+        with pytest.raises(TimeoutError):
+            asyncio.run(wait_for_database(timeout=0.05, initial_delay=0.01))
@@ -0,0 +1,111 @@
+import asyncio
+import io
+from datetime import datetime, timedelta
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from src.controllers.export import ExportController
+from src.export import ExportFormatEnum
+from src.models.base import Base
+from src.models.item_price_history import ItemPriceHistory, QuantityEnum
+
+NOW = datetime(2026, 1, 31)
+
+ROWS = [
+    {
+        "gid": gid,
+        "quantity": quantity,
+        "price": None if day == 3 else gid + day,
+        "recorded_at": NOW - timedelta(days=day),
+        "server_id": server_id,
+    }
+    for server_id in (1, 2)
+    for gid in (17001, 17002)
+    for quantity in (QuantityEnum.ONE, QuantityEnum.HUNDRED)
+    for day in range(10)
+]
+
+
+def sort_key(row: tuple):
+    # (gid, quantity, recorded_at) is unique in a server
+    return row[0], row[1], row[3]
+
+
+def get_expected(start: datetime, end: datetime) -> list[tuple]:
+    return sorted(
+        (
+            (row["gid"], row["quantity"].value, row["price"], row["recorded_at"])
+            for row in ROWS
+            if row["server_id"] == 1 and start <= row["recorded_at"] < end
+        ),
+        key=sort_key,
+    )
+
+
+def to_tuples(table: pa.Table) -> list[tuple]:
+    columns = ("gid", "quantity", "price", "recorded_at")
+    return sorted(
+        zip(*(table.column(name).to_pylist() for name in columns)), key=sort_key
+    )
+
+
+def test_export_parquet_in_row_groups():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(ItemPriceHistory.__table__.insert(), ROWS)
+
+    start, end = NOW - timedelta(days=5), NOW
+    output = io.BytesIO()
+    with sessionmaker(engine)() as session:
+        rows = ExportController.export(
+            session, output, ExportFormatEnum.PARQUET, 1, start, end, batch_rows=7
+        )
+
+    parquet_file = pq.ParquetFile(io.BytesIO(output.getvalue()))
+    assert rows == 20
+    assert parquet_file.metadata.num_row_groups == 3
+    assert to_tuples(parquet_file.read()) == get_expected(start, end)
+
+
+@pytest.fixture()
+def async_session_maker():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+
+    async def setup():
+        async with engine.begin() as connection:
+            await connection.run_sync(Base.metadata.create_all)
+            await connection.execute(ItemPriceHistory.__table__.insert(), ROWS)
+
+    asyncio.run(setup())
+    yield async_sessionmaker(engine, expire_on_commit=False)
+    asyncio.run(engine.dispose())
+
+
+def test_stream_export_arrow(async_session_maker):
+    async def run() -> list[bytes]:
+        async with async_session_maker() as session:
+            return [
+                chunk
+                async for chunk in ExportController.stream_export_async(
+                    session,
+                    ExportFormatEnum.ARROW,
+                    1,
+                    NOW - timedelta(days=30),
+                    NOW + timedelta(days=1),
+                    batch_rows=16,
+                )
+            ]
+
+    chunks = asyncio.run(run())
+    # a message per batch, sent as soon as it is encoded
+    assert len([chunk for chunk in chunks if chunk]) >= 3
+    table = pa.ipc.open_stream(b"".join(chunks)).read_all()
+    assert table.num_rows == 40
+    assert table.column("price").null_count == 4
+    assert set(table.column("server_id").to_pylist()) == {1}
@@ -0,0 +1,186 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from src.controllers.hot_window import HotWindowController
+from src.hot_window import BYTES_PER_ROW, HotWindow, PriceChunk, ServerWindow
+from src.models.base import Base
+from src.models.item_price_history import ItemPriceHistory, QuantityEnum
+from src.models.server_change_version import ServerChangeVersion
+
+NOW = datetime(2026, 1, 31)
+
+
+def make_chunk(rows: list[tuple[int, int, int, int]]) -> PriceChunk:
+    """Chunk of (gid, price, quantity, days ago) rows."""
+    return PriceChunk.from_rows(
+        [
+            (gid, price, quantity, NOW - timedelta(days=days))
+            for gid, price, quantity, days in rows
+        ]
+    )
+
+
+def test_apply_skips_versions_already_in_the_window():
+    window = ServerWindow(since=NOW - timedelta(days=30), version=2)
+    window.apply(2, make_chunk([(1, 10, 1, 1)]))
+    window.apply(3, make_chunk([(1, 20, 1, 1)]))
+    window.apply(3, make_chunk([(1, 20, 1, 1)]))
+    assert window.rows == 1
+
+    # the catch up skips the version applied by the ingestion of this process
+    window.apply_delta(
+        4,
+        {
+            3: [(1, 20, 1, NOW)],
+            4: [(2, 30, 10, NOW), (2, 40, 10, NOW)],
+        },
+    )
+    assert window.version == 4
+    assert window.applied_versions == set()
+    assert window.rows == 3
+
+
+def test_get_columns_filters_by_date_and_quantity():
+    window = ServerWindow(since=NOW - timedelta(days=30), version=0)
+    window.apply(1, make_chunk([(1, 10, 1, 1), (1, 20, 10, 1), (2, 30, 1, 20)]))
+    window.apply(2, make_chunk([(2, 40, 1, 2)]))
+
+    columns = window.get_columns(NOW - timedelta(days=7), QuantityEnum.ONE)
+    assert columns.gids.tolist() == [1, 2]
+    assert columns.prices.tolist() == [10, 40]
+    assert window.get_prices(2, NOW - timedelta(days=30), None).tolist() == [30, 40]
+
+
+def test_evict_by_age_then_budget():
+    hot_window = HotWindow(max_bytes=3 * BYTES_PER_ROW)
+    first = ServerWindow(since=NOW - timedelta(days=30), version=0)
+    first.apply(1, make_chunk([(1, 10, 1, days) for days in (1, 2, 3, 4, 40)]))
+    second = ServerWindow(since=NOW - timedelta(days=30), version=0)
+    second.apply(1, make_chunk([(2, 10, 1, 1)]))
+    hot_window.servers = {1: first, 2: second}
+
+    hot_window.evict(NOW - timedelta(days=30))
+
+    assert hot_window.nbytes <= hot_window.max_bytes
+    # the largest window lost its oldest samples and no longer covers the month
+    assert first.rows == 2
+    assert first.since == NOW - timedelta(days=2)
+    assert hot_window.get(1, NOW - timedelta(days=30)) is None
+    assert hot_window.get(2, NOW - timedelta(days=30)) is second
+
+
+def test_evict_samples_recorded_at_the_same_date():
+    hot_window = HotWindow(max_bytes=100)
+    window = ServerWindow(since=NOW - timedelta(days=30), version=0)
+    window.apply(1, make_chunk([(gid, 10, 1, 1) for gid in range(20)]))
+    hot_window.servers = {1: window}
+
+    hot_window.evict(NOW - timedelta(days=30))
+
+    assert hot_window.nbytes <= hot_window.max_bytes
+    assert window.rows == 0
+    assert window.since > NOW - timedelta(days=1)
+
+
+@pytest.fixture()
+def async_session_maker():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+
+    async def setup():
+        async with engine.begin() as connection:
+            await connection.run_sync(Base.metadata.create_all)
+
+    asyncio.run(setup())
+    yield async_sessionmaker(engine, expire_on_commit=False)
+    asyncio.run(engine.dispose())
+
+
+def test_warm_sync_and_check(async_session_maker):
+    now = datetime.now()
+
+    def make_rows(version: int, prices: list[int | None]) -> list[dict]:
+        return [
+            {
+                "gid": 17001,
+                "quantity": QuantityEnum.ONE,
+                "price": price,
+                "recorded_at": now - timedelta(days=1),
+                "server_id": 1,
+                "change_version": version,
+            }
+            for price in prices
+        ]
+
+    async def write(session, version: int, prices: list[int | None]):
+        await session.merge(ServerChangeVersion(server_id=1, version=version))
+        await session.execute(
+            ItemPriceHistory.__table__.insert(), make_rows(version, prices)
+        )
+        await session.commit()
+
+    async def run():
+        hot_window = HotWindow(max_bytes=1 << 20)
+        async with async_session_maker() as session:
+            await write(session, 1, [100, 200, None])
+            server_window = await HotWindowController.warm_server_async(
+                session, 1, window=hot_window, days=30
+            )
+            assert server_window.version == 1
+            assert server_window.rows == 2
+
+            # written by another process, then caught up
+            await write(session, 2, [300])
+            await HotWindowController.sync_server_async(session, 1, server_window)
+            assert server_window.version == 2
+
+            # written by this process, applied after its commit
+            rows = make_rows(3, [400])
+            await write(session, 3, [400])
+            HotWindowController.apply_inserted_rows(rows, window=hot_window)
+            assert server_window.rows == 4
+
+            check = await HotWindowController.check_consistency_async(
+                session, 1, window=hot_window
+            )
+            assert check["consistent"]
+            assert check["window_price_sum"] == 1000
+            assert check["database_rows"] == 4
+
+    asyncio.run(run())
+
+
+def test_rejected_server_waits_for_free_budget(async_session_maker):
+    hot_window = HotWindow(max_bytes=4 * BYTES_PER_ROW)
+    other = ServerWindow(since=NOW - timedelta(days=30), version=0)
+    other.apply(1, make_chunk([(2, 10, 1, days) for days in (1, 2, 3)]))
+    hot_window.servers = {2: other}
+
+    async def run():
+        async with async_session_maker() as session:
+            await session.execute(
+                ItemPriceHistory.__table__.insert(),
+                [
+                    {
+                        "gid": 1,
+                        "quantity": QuantityEnum.ONE,
+                        "price": price,
+                        "recorded_at": datetime.now() - timedelta(days=1),
+                        "server_id": 1,
+                        "change_version": 0,
+                    }
+                    for price in (100, 200)
+                ],
+            )
+            await session.commit()
+            return await HotWindowController.warm_server_async(
+                session, 1, window=hot_window, days=30
+            )
+
+    assert asyncio.run(run()) is None
+    assert not hot_window.fits(1)
+
+    del hot_window.servers[2]
+    assert hot_window.fits(1)
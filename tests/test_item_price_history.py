@@ -1,14 +1,20 @@
+import asyncio
 from datetime import datetime, timedelta
 from unittest.mock import MagicMock, patch
 
 import pytest
 from sqlalchemy import create_engine
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 
 from D3Database.enums.category_item_enum import CategoryEnum
+from src.controllers.change_version import ChangeVersionController
 from src.controllers.item_price_history import ItemPriceHistoryController
 from src.models.base import Base
 from src.models.item_price_history import ItemPriceHistory, QuantityEnum
+from src.pagination import KeysetCursor
+from src.schemas.item_price_history import CreateItemPriceHistorySchema
 
 
 @pytest.fixture()
@@ -400,6 +406,64 @@ def test_get_top_profitable_items_server_isolation(mock_i18n, mock_data_reader,
     assert result_server2[0].gid == 5002
 
 
+@patch("src.controllers.item_price_history.DataReader")
+@patch("src.controllers.item_price_history.I18N")
+def test_by_server_variants_match_one_call_per_server(
+    mock_i18n, mock_data_reader, in_memory_session
+):
+    """Test que les variantes multi-serveurs retournent, pour chaque serveur, le
+    résultat d'un appel dédié à ce serveur."""
+    session = in_memory_session
+    quantity = QuantityEnum.HUNDRED
+    now = datetime.now()
+    mock_data_reader.return_value.item_by_id = {
+        5001: MagicMock(nameId=1),
+        5002: MagicMock(nameId=2),
+    }
+    mock_i18n.return_value.name_by_id = {1: "Item 5001", 2: "Item 5002"}
+    for server_id, gid, prices in [
+        (1, 5001, [100, 120, 90, 150, 110, 130]),
+        (1, 5002, [10, 30, 20, 40, 25, 35]),
+        (2, 5002, [200, 180, 220, 260, 240, 210]),
+    ]:
+        session.add_all(
+            ItemPriceHistory(
+                gid=gid,
+                quantity=quantity,
+                price=price,
+                recorded_at=now - timedelta(days=len(prices) - i),
+                server_id=server_id,
+            )
+            for i, price in enumerate(prices)
+        )
+    session.commit()
+    # le serveur 3 n'a pas de prix
+    server_ids = [1, 2, 3]
+
+    top_items = ItemPriceHistoryController.get_top_profitable_items_by_server(
+        session, server_ids, quantity
+    )
+    speeds = ItemPriceHistoryController.get_sales_speed_by_server(
+        session, quantity, server_ids, [5001, 5002]
+    )
+
+    assert list(top_items) == list(speeds) == server_ids
+    for server_id in server_ids:
+        assert top_items[server_id] == (
+            ItemPriceHistoryController.get_top_profitable_items(
+                session, server_id, quantity
+            )
+        )
+        assert speeds[server_id] == (
+            ItemPriceHistoryController.get_sales_speed_from_prices(
+                session, quantity, server_id, [5001, 5002]
+            )
+        )
+    assert [item.gid for item in top_items[1]] == [5002, 5001]
+    assert top_items[3] == []
+    assert speeds[3] == {}
+
+
 @patch("src.controllers.item_price_history.DataReader")
 @patch("src.controllers.item_price_history.I18N")
 def test_get_top_profitable_items_quantity_isolation(mock_i18n, mock_data_reader, in_memory_session):
@@ -678,6 +742,97 @@ def test_get_top_profitable_items_filter_by_category(mock_data_reader, in_memory
     assert result[0].gid == 10001
 
 
+def test_profitable_prices_filtered_in_sql(in_memory_session):
+    session = in_memory_session
+    now = datetime.now()
+    session.add_all(
+        ItemPriceHistory(
+            gid=gid,
+            quantity=QuantityEnum.HUNDRED,
+            price=100,
+            recorded_at=now - timedelta(days=1),
+            server_id=1,
+        )
+        for gid in [10001, 10002, 10003]
+    )
+    session.commit()
+
+    for gids in [{10001, 10003}, {10002}, set()]:
+        columns = ItemPriceHistoryController._fetch_profitable_columns(
+            session, 1, QuantityEnum.HUNDRED, 30, gids
+        )
+        assert set(columns.gids.tolist()) == gids
+
+    # a single array parameter whatever the number of items
+    statement = ItemPriceHistoryController._profitable_prices_statement(
+        1, QuantityEnum.HUNDRED, 30, set(range(1000))
+    )
+    compiled = statement.compile(dialect=postgresql.dialect())
+    assert "item_price_history.gid = ANY(" in str(compiled)
+    assert len(compiled.params) == 4
+
+    # a filter too broad is left to the ranking
+    assert ItemPriceHistoryController._get_sql_gids(set(range(100))) is not None
+    assert ItemPriceHistoryController._get_sql_gids(set(range(100_000))) is None
+
+
+def test_cached_statements_bind_the_new_values(in_memory_session):
+    session = in_memory_session
+    now = datetime.now()
+    for server_id, gid, quantity, prices in [
+        (1, 10001, QuantityEnum.ONE, [10, 20]),
+        (1, 10001, QuantityEnum.HUNDRED, [30]),
+        (1, 10002, QuantityEnum.HUNDRED, [40, 50, 45]),
+        (2, 10002, QuantityEnum.HUNDRED, [60, 70]),
+    ]:
+        session.add_all(
+            ItemPriceHistory(
+                gid=gid,
+                quantity=quantity,
+                price=price,
+                recorded_at=now - timedelta(days=len(prices) - i),
+                server_id=server_id,
+            )
+            for i, price in enumerate(prices)
+        )
+    session.commit()
+
+    def get_resell_prices(gid, quantity, server_id):
+        return session.scalars(
+            ItemPriceHistoryController._resell_prices_statement(
+                gid, quantity, server_id, 30
+            )
+        ).all()
+
+    # the statements are built once, every call binds its own values
+    assert get_resell_prices(10001, QuantityEnum.ONE, 1) == [20, 10]
+    assert get_resell_prices(10001, QuantityEnum.HUNDRED, 1) == [30]
+    assert sorted(get_resell_prices(10001, None, 1)) == [10, 20, 30]
+    assert get_resell_prices(10002, None, 2) == [70, 60]
+    assert get_resell_prices(10002, QuantityEnum.ONE, 2) == []
+
+    def get_speeds(server_ids, gids):
+        return ItemPriceHistoryController.get_sales_speed_by_server(
+            session, QuantityEnum.HUNDRED, server_ids, gids
+        )
+
+    assert get_speeds([1, 2], [10001, 10002]) == {
+        1: {10001: 0.0, 10002: 1 / 3},
+        2: {10002: 0.5},
+    }
+    assert get_speeds([2], [10001]) == {2: {}}
+
+    # a single SQL text whatever the number of items, prepared once by the server
+    def compile_speeds(gids):
+        return str(
+            ItemPriceHistoryController._sales_speed_statement(
+                QuantityEnum.HUNDRED, [1], gids
+            ).compile(dialect=postgresql.dialect())
+        )
+
+    assert compile_speeds([10001]) == compile_speeds(list(range(500)))
+
+
 @patch("src.controllers.item_price_history.DataReader")
 def test_get_top_profitable_items_filter_by_type_id(mock_data_reader, in_memory_session):
     """Test le filtrage par type d'item."""
@@ -1024,3 +1179,145 @@ def test_get_top_profitable_crafts_with_quantity_none(mock_data_reader, in_memor
     assert len(result) == 1
     assert result[0].result_id == 15001
     assert result[0].samples == 6
+
+
+@patch("src.controllers.item_price_history.DataReader")
+@patch("src.controllers.item_price_history.I18N")
+def test_async_variants_match_sync(mock_i18n, mock_data_reader):
+    """Test que les variantes async retournent les mêmes résultats que les sync."""
+    mock_data_reader.return_value.item_by_id = {16001: MagicMock(nameId=1)}
+    mock_i18n.return_value.name_by_id = {1: "Item 16001"}
+    now = datetime.now()
+    rows = [
+        {
+            "gid": 16001,
+            "quantity": QuantityEnum.HUNDRED,
+            "price": price,
+            "recorded_at": now - timedelta(days=i + 1),
+            "server_id": 1,
+        }
+        for i, price in enumerate([100, 150, 200, 250, 300])
+    ]
+
+    async def run():
+        engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+        async with engine.begin() as connection:
+            await connection.run_sync(Base.metadata.create_all)
+            await connection.execute(ItemPriceHistory.__table__.insert(), rows)
+        async with async_sessionmaker(engine)() as session:
+            evaluation = await ItemPriceHistoryController.is_price_resell_profitable_async(
+                session, 16001, None, 1, observed_price=50, min_samples=3
+            )
+            top_items = await ItemPriceHistoryController.get_top_profitable_items_async(
+                session, 1, QuantityEnum.HUNDRED
+            )
+            top_items_by_server = (
+                await (
+                    ItemPriceHistoryController.get_top_profitable_items_by_server_async(
+                        session, [1, 2], QuantityEnum.HUNDRED
+                    )
+                )
+            )
+        await engine.dispose()
+        return evaluation, top_items, top_items_by_server
+
+    evaluation, top_items, top_items_by_server = asyncio.run(run())
+
+    assert evaluation.samples == 5
+    assert evaluation.median_price == 200
+    assert len(top_items) == 1
+    assert top_items[0].avg_price == 200.0
+    assert top_items[0].samples == 5
+    assert top_items_by_server == {1: top_items, 2: []}
+
+
+@patch("src.controllers.item_price_history.DataReader")
+@patch("src.controllers.item_price_history.I18N")
+def test_evolution_price_since_version(mock_i18n, mock_data_reader, in_memory_session):
+    mock_data_reader.return_value.item_by_id = {100: MagicMock(nameId=1)}
+    mock_i18n.return_value.name_by_id = {1: "Item 100"}
+    session = in_memory_session
+    payloads = [
+        CreateItemPriceHistorySchema(gid=100, quantity=quantity, price=10, server_id=1)
+        for quantity in QuantityEnum
+    ]
+    ItemPriceHistoryController.bulk_insert(session, payloads)
+    first_version = ChangeVersionController.get_version(session, 1)
+    ItemPriceHistoryController.bulk_insert(
+        session, [payload.model_copy(update={"price": 20}) for payload in payloads]
+    )
+    version = ChangeVersionController.get_version(session, 1)
+
+    evolution = ItemPriceHistoryController.get_evolution_price(
+        session, QuantityEnum.HUNDRED, 1, 0, 100, first_version, version
+    )
+    assert [(row.name, row.price) for row in evolution] == [("Item 100", 20)]
+    assert list(
+        ItemPriceHistoryController.get_evolution_price(
+            session, QuantityEnum.HUNDRED, 1, 0, 100, version, version
+        )
+    ) == []
+
+
+@patch("src.controllers.item_price_history.DataReader")
+@patch("src.controllers.item_price_history.I18N")
+def test_evolution_price_pages(mock_i18n, mock_data_reader, in_memory_session):
+    mock_data_reader.return_value.item_by_id = {
+        100: MagicMock(id=100, nameId=1, typeId=7),
+        200: MagicMock(id=200, nameId=2, typeId=7),
+    }
+    mock_data_reader.return_value.item_ids_by_type_id = {7: {100, 200}}
+    mock_i18n.return_value.name_by_id = {1: "Item 100", 2: "Item 200"}
+    session = in_memory_session
+    now = datetime.now().replace(microsecond=0)
+    # two rows share each recorded_at, the id breaks the tie
+    session.add_all(
+        ItemPriceHistory(
+            gid=gid,
+            quantity=QuantityEnum.HUNDRED,
+            price=index,
+            recorded_at=now + timedelta(minutes=index // 2),
+            server_id=1,
+            change_version=1,
+        )
+        for index, gid in enumerate([100, 200] * 3 + [100])
+    )
+    session.commit()
+
+    pages, cursor = [], None
+    while True:
+        rows, cursor = ItemPriceHistoryController.get_evolution_price_page(
+            session, QuantityEnum.HUNDRED, 1, 7, version=1, limit=3, cursor=cursor
+        )
+        pages.append([row.price for row in rows])
+        if cursor is None:
+            break
+        cursor = KeysetCursor.decode(cursor.encode())
+    assert pages == [[0, 1, 2], [3, 4, 5], [6]]
+
+    # the rows committed after the first page are left to the next sync
+    session.add(
+        ItemPriceHistory(
+            gid=100,
+            quantity=QuantityEnum.HUNDRED,
+            price=7,
+            recorded_at=now + timedelta(hours=1),
+            server_id=1,
+            change_version=2,
+        )
+    )
+    session.commit()
+    rows, cursor = ItemPriceHistoryController.get_evolution_price_page(
+        session, QuantityEnum.HUNDRED, 1, 7, version=1, limit=3
+    )
+    rows, cursor = ItemPriceHistoryController.get_evolution_price_page(
+        session, QuantityEnum.HUNDRED, 1, 7, cursor.version, 10, cursor=cursor
+    )
+    assert [row.price for row in rows] == [3, 4, 5, 6]
+    assert cursor is None
+
+
+@pytest.mark.parametrize("cursor", ["", "not a cursor", "MjAyNnwxfDI"])
+def test_keyset_cursor_decode_invalid(cursor):
+    with pytest.raises(ValueError):
+        KeysetCursor.decode(cursor)
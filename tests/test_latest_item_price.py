@@ -0,0 +1,141 @@
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock, patch
+
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+
+from src.controllers.item_price_history import ItemPriceHistoryController
+from src.controllers.latest_item_price import LatestItemPriceController
+from src.models.base import Base
+from src.models.item_price_history import ItemPriceHistory, QuantityEnum
+from src.models.latest_item_price import LatestItemPrice
+from src.schemas.item_price_history import CreateItemPriceHistorySchema
+
+
+@pytest.fixture()
+def session():
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(engine)
+    with sessionmaker(bind=engine)() as session:
+        yield session
+
+
+def get_snapshot(session) -> list[tuple]:
+    return session.execute(
+        select(
+            LatestItemPrice.server_id,
+            LatestItemPrice.gid,
+            LatestItemPrice.quantity,
+            LatestItemPrice.price,
+            LatestItemPrice.recorded_at,
+            LatestItemPrice.change_version,
+        ).order_by(
+            LatestItemPrice.server_id, LatestItemPrice.gid, LatestItemPrice.quantity
+        )
+    ).all()
+
+
+def test_bulk_insert_keeps_the_latest_prices(session):
+    payloads = [
+        CreateItemPriceHistorySchema(gid=100, quantity=quantity, price=10, server_id=1)
+        for quantity in QuantityEnum
+    ]
+    ItemPriceHistoryController.bulk_insert(session, payloads)
+    ItemPriceHistoryController.bulk_insert(
+        session,
+        [
+            payload.model_copy(update={"price": None if index else 20})
+            for index, payload in enumerate(payloads)
+        ],
+    )
+
+    prices = LatestItemPriceController.get_latest_prices(session, 1, [100, 200])
+    assert sorted((row.quantity, row.price) for row in prices) == [
+        (QuantityEnum.ONE, 20),
+        (QuantityEnum.TEN, None),
+        (QuantityEnum.HUNDRED, None),
+        (QuantityEnum.THOUSAND, None),
+    ]
+    assert [
+        row.price
+        for row in LatestItemPriceController.get_latest_prices(
+            session, 1, [100], QuantityEnum.ONE
+        )
+    ] == [20]
+    assert LatestItemPriceController.get_latest_prices(session, 2, [100]) == []
+    # the items not on sale at the last check have no current price
+    assert LatestItemPriceController.get_current_prices(session, 1) == {100: 20}
+
+    # the snapshot is the one recomputed from the history
+    snapshot = get_snapshot(session)
+    LatestItemPriceController.rebuild(session)
+    assert get_snapshot(session) == snapshot
+
+
+def test_older_prices_do_not_replace_newer_ones(session):
+    now = datetime.now()
+    row = {
+        "gid": 100,
+        "quantity": QuantityEnum.HUNDRED,
+        "price": 10,
+        "recorded_at": now,
+        "server_id": 1,
+        "change_version": 2,
+    }
+    LatestItemPriceController.upsert(
+        session,
+        [
+            row,
+            # a row is only upserted once per statement, the last one wins
+            row | {"price": 30},
+        ],
+    )
+    LatestItemPriceController.upsert(
+        session,
+        [row | {"price": 20, "recorded_at": now - timedelta(hours=1)}],
+    )
+    session.commit()
+
+    assert LatestItemPriceController.get_current_prices(session, 1) == {100: 30}
+
+
+@patch("src.controllers.item_price_history.DataReader")
+@patch("src.controllers.item_price_history.I18N")
+def test_top_profitable_crafts_at_current_prices(mock_i18n, mock_data_reader, session):
+    mock_data_reader.return_value.recipes = [
+        MagicMock(resultId=14001, ingredientIds=[14100], quantities=[2])
+    ]
+    mock_data_reader.return_value.item_by_id = {
+        14001: MagicMock(nameId=1),
+        14100: MagicMock(nameId=100),
+    }
+    mock_i18n.return_value.name_by_id = {1: "Craft", 100: "Ingredient"}
+    now = datetime.now()
+    # the ingredient was cheap, its last price makes the craft unprofitable
+    for gid, prices in {14001: [100] * 6, 14100: [10] * 5 + [60]}.items():
+        for index, price in enumerate(prices):
+            session.add(
+                ItemPriceHistory(
+                    gid=gid,
+                    quantity=QuantityEnum.HUNDRED,
+                    price=price,
+                    recorded_at=now - timedelta(days=len(prices) - index),
+                    server_id=1,
+                )
+            )
+    session.commit()
+    LatestItemPriceController.rebuild(session)
+
+    crafts = ItemPriceHistoryController.get_top_profitable_crafts(
+        session, 1, QuantityEnum.HUNDRED
+    )
+    assert [(craft.result_id, craft.craft_cost) for craft in crafts] == [
+        (14001, round(2 * (50 + 60) / 6, 2))
+    ]
+    assert (
+        ItemPriceHistoryController.get_top_profitable_crafts(
+            session, 1, QuantityEnum.HUNDRED, current_prices=True
+        )
+        == []
+    )
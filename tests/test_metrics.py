@@ -0,0 +1,82 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+from sqlalchemy import create_engine, text
+
+from src.metrics import MetricsMiddleware, TimedQueuePool, count_ingested_rows
+
+# the sync routes run in the threads of the test client
+engine = create_engine(
+    "sqlite://",
+    poolclass=TimedQueuePool,
+    connect_args={"check_same_thread": False},
+)
+
+app = FastAPI()
+app.add_middleware(MetricsMiddleware)
+
+
+@app.get("/items/{gid}")
+def get_item(gid: int):
+    with engine.connect() as connection:
+        rows = connection.execute(text("SELECT 1 UNION ALL SELECT 2")).all()
+        connection.execute(text("SELECT 3"))
+    return {"gid": gid, "rows": len(rows)}
+
+
+def get_sample(name: str, **labels) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+def test_metrics_middleware_accounts_requests_and_statements():
+    labels = {"route": "/items/{gid}"}
+    statements = get_sample("db_statements_total", **labels)
+    requests = get_sample(
+        "http_request_duration_seconds_count", method="GET", status="200", **labels
+    )
+    checkouts = get_sample("db_pool_checkout_wait_seconds_count", pool="TimedQueuePool")
+
+    client = TestClient(app)
+    assert client.get("/items/1").status_code == 200
+    assert client.get("/items/2").status_code == 200
+
+    # the path parameter does not leak into the labels
+    assert (
+        get_sample(
+            "http_request_duration_seconds_count", method="GET", status="200", **labels
+        )
+        == requests + 2
+    )
+    assert get_sample("db_statements_total", **labels) == statements + 4
+    assert get_sample("http_requests_in_progress", method="GET", **labels) == 0
+    assert (
+        get_sample("db_pool_checkout_wait_seconds_count", pool="TimedQueuePool")
+        > checkouts
+    )
+
+
+def test_metrics_middleware_labels_unknown_paths():
+    before = get_sample(
+        "http_request_duration_seconds_count",
+        method="GET",
+        route="unmatched",
+        status="404",
+    )
+    assert TestClient(app).get("/unknown/1").status_code == 404
+    assert (
+        get_sample(
+            "http_request_duration_seconds_count",
+            method="GET",
+            route="unmatched",
+            status="404",
+        )
+        == before + 1
+    )
+
+
+def test_count_ingested_rows_by_server():
+    before = get_sample("item_price_history_ingested_rows_total", server_id="7")
+    count_ingested_rows([7, 8, 7])
+    assert get_sample("item_price_history_ingested_rows_total", server_id="7") == (
+        before + 2
+    )
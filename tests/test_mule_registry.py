@@ -0,0 +1,81 @@
+import asyncio
+
+from src.models.character import CharacterActionEnum
+from src.mule_registry import MuleRegistry, dump_action_change, get_mules_version
+
+MULE = CharacterActionEnum.MULE_ACCEPT_BANK
+
+
+def make_registry(mules: dict[int, list[int]], synced: bool = True):
+    loads = []
+
+    async def loader(server_id: int) -> list[int]:
+        loads.append(server_id)
+        return mules.get(server_id, [])
+
+    return MuleRegistry(loader, synced=synced), loads
+
+
+def test_mule_registry_loads_each_server_once():
+    registry, loads = make_registry({1: [10, 11]})
+
+    async def run():
+        return await asyncio.gather(*(registry.get_ids(1) for _ in range(10)))
+
+    results = asyncio.run(run())
+    assert all(result == ([10, 11], get_mules_version([11, 10])) for result in results)
+    assert loads == [1]
+
+
+def test_mule_registry_apply_moves_characters_between_servers():
+    registry, _ = make_registry({1: [10], 2: []})
+
+    async def run():
+        await registry.get_ids(1)
+        await registry.get_ids(2)
+        registry.apply(10, 2, MULE)
+        registry.apply_notification(dump_action_change(11, 1, MULE))
+        return await registry.get_ids(1), await registry.get_ids(2)
+
+    (ids_1, _), (ids_2, _) = asyncio.run(run())
+    assert ids_1 == [11]
+    assert ids_2 == [10]
+
+
+def test_mule_registry_wakes_subscribers_on_change():
+    registry, _ = make_registry({1: [10]})
+
+    async def run():
+        _, version = await registry.get_ids(1)
+        waiter = asyncio.create_task(registry.wait_for_change(1, version, timeout=5))
+        await asyncio.sleep(0)
+        registry.apply(10, 1, None)
+        return await asyncio.wait_for(waiter, 1)
+
+    assert asyncio.run(run()) == ([], get_mules_version([]))
+
+
+def test_mule_registry_wait_times_out_without_change():
+    registry, _ = make_registry({1: [10]})
+
+    async def run():
+        _, version = await registry.get_ids(1)
+        return await registry.wait_for_change(1, version, timeout=0.01), version
+
+    (ids, new_version), version = asyncio.run(run())
+    assert ids == [10]
+    assert new_version == version
+
+
+def test_mule_registry_reads_database_when_not_synced():
+    registry, loads = make_registry({1: [10]}, synced=False)
+
+    async def run():
+        await registry.get_ids(1)
+        await registry.get_ids(1)
+        registry.set_synced(True)
+        await registry.get_ids(1)
+        await registry.get_ids(1)
+
+    asyncio.run(run())
+    assert loads == [1, 1, 1]
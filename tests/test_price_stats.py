@@ -0,0 +1,57 @@
+import random
+import statistics
+
+import numpy as np
+
+from src.price_stats import PriceColumns, group_price_stats
+
+
+def test_group_price_stats_matches_python():
+    rng = random.Random(0)
+    rows = [(rng.randint(1, 50), rng.randint(1, 10_000)) for _ in range(5_000)]
+    stats = group_price_stats(PriceColumns.from_rows(rows), with_medians=True)
+
+    prices_by_gid: dict[int, list[int]] = {}
+    for gid, price in rows:
+        prices_by_gid.setdefault(gid, []).append(price)
+
+    assert stats.gids.tolist() == sorted(prices_by_gid)
+    for index, gid in enumerate(stats.gids.tolist()):
+        prices = prices_by_gid[gid]
+        assert stats.counts[index] == len(prices)
+        assert stats.sums[index] == sum(prices)
+        assert stats.means[index] == sum(prices) / len(prices)
+        assert stats.mins[index] == min(prices)
+        assert stats.maxs[index] == max(prices)
+        assert np.isclose(stats.stds[index], statistics.pstdev(prices))
+        assert stats.medians[index] == statistics.median(prices)
+        assert rows[stats.first_rows[index]][0] == gid
+        assert all(row[0] != gid for row in rows[: stats.first_rows[index]])
+
+
+def test_group_price_stats_min_count():
+    rows = [(1, 10), (2, 5), (1, 30), (2, 7), (1, 20), (3, 1)]
+    stats = group_price_stats(
+        PriceColumns.from_rows(rows), min_count=2, with_medians=True
+    )
+    assert stats.gids.tolist() == [1, 2]
+    assert stats.medians.tolist() == [20, 6]
+    assert stats.first_rows.tolist() == [0, 1]
+
+
+def test_group_price_stats_sparse_gids_and_large_prices():
+    # gids too sparse to index by, prices too large to pack in the sort key
+    rows = [(10**12, 2**50), (5, 3), (10**12, 2**50 + 2), (5, 1), (5, 2)]
+    stats = group_price_stats(PriceColumns.from_rows(rows), with_medians=True)
+    assert stats.gids.tolist() == [5, 10**12]
+    assert stats.counts.tolist() == [3, 2]
+    assert stats.mins.tolist() == [1, 2**50]
+    assert stats.maxs.tolist() == [3, 2**50 + 2]
+    assert stats.medians.tolist() == [2, 2**50 + 1]
+    assert stats.first_rows.tolist() == [1, 0]
+
+
+def test_group_price_stats_empty():
+    stats = group_price_stats(PriceColumns.from_arrays(None, None))
+    assert len(stats) == 0
+    assert stats.mean_by_gid() == {}
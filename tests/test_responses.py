@@ -0,0 +1,80 @@
+from datetime import datetime
+
+import msgspec
+import pytest
+from pydantic import TypeAdapter
+
+from src.models.item_price_history import QuantityEnum
+from src.responses import MsgspecJSONResponse
+from src.schemas.item_price_history import (
+    IngredientDetailSchema,
+    IngredientDetailStruct,
+    LatestItemPriceSchema,
+    LatestItemPriceStruct,
+    ProfitableCraftSchema,
+    ProfitableCraftStruct,
+    ProfitableItemSchema,
+    ProfitableItemStruct,
+    ReadItemPriceHistorySchema,
+    ReadItemPriceHistoryStruct,
+)
+
+PAIRS = [
+    (ReadItemPriceHistorySchema, ReadItemPriceHistoryStruct),
+    (LatestItemPriceSchema, LatestItemPriceStruct),
+    (ProfitableItemSchema, ProfitableItemStruct),
+    (IngredientDetailSchema, IngredientDetailStruct),
+    (ProfitableCraftSchema, ProfitableCraftStruct),
+]
+
+
+@pytest.mark.parametrize("schema, struct", PAIRS)
+def test_structs_have_the_schema_fields(schema, struct):
+    assert list(schema.model_fields) == list(struct.__struct_fields__)
+
+
+@pytest.mark.parametrize(
+    "schema, rows",
+    [
+        (
+            ReadItemPriceHistorySchema,
+            [
+                ReadItemPriceHistoryStruct(
+                    "Item", QuantityEnum.HUNDRED, 120, datetime(2026, 1, 2, 3, 4, 5, 6)
+                ),
+                ReadItemPriceHistoryStruct(
+                    "", QuantityEnum.ONE, None, datetime(2026, 1, 2)
+                ),
+            ],
+        ),
+        (
+            ProfitableItemSchema,
+            [
+                ProfitableItemStruct(
+                    1, "Item", 10.5, 3.0, 20.0, 7.5, 250.0, 1875.0, 4.2, 8
+                )
+            ],
+        ),
+        (
+            ProfitableCraftSchema,
+            [
+                ProfitableCraftStruct(
+                    1,
+                    "Craft",
+                    100.0,
+                    40.0,
+                    60.0,
+                    150.0,
+                    [IngredientDetailStruct(2, "Ingredient", 4, 10.0, 40.0)],
+                    12,
+                )
+            ],
+        ),
+    ],
+)
+def test_msgspec_response_matches_the_pydantic_body(schema, rows):
+    body = MsgspecJSONResponse(rows).body
+    expected = TypeAdapter(list[schema]).dump_json(
+        TypeAdapter(list[schema]).validate_python(msgspec.to_builtins(rows))
+    )
+    assert body == expected
@@ -0,0 +1,72 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+
+from src.routers import admin
+from src.slow_queries import (
+    SLOW_QUERY_LOG,
+    SlowQueryLog,
+    is_explainable,
+    to_psycopg2_statement,
+)
+
+
+def test_to_psycopg2_statement():
+    statement, parameters = to_psycopg2_statement(
+        "SELECT gid FROM item WHERE name LIKE '%a' AND gid IN ($2, $1) AND id = $2",
+        (1, 2),
+    )
+    assert statement == (
+        "SELECT gid FROM item WHERE name LIKE '%%a' AND gid IN (%(p2)s, %(p1)s)"
+        " AND id = %(p2)s"
+    )
+    assert parameters == {"p1": 1, "p2": 2}
+
+
+def test_only_queries_are_explained():
+    assert is_explainable("  select 1")
+    assert is_explainable("WITH a AS (SELECT 1) SELECT * FROM a")
+    assert not is_explainable("INSERT INTO item VALUES (1)")
+    assert not is_explainable("UPDATE server_change_version SET version = 1")
+
+
+def test_explains_are_throttled_per_statement():
+    log = SlowQueryLog(explain_cooldown=60)
+    assert log._reserve_explain("SELECT 1")
+    assert not log._reserve_explain("SELECT 1")
+    assert log._reserve_explain("SELECT 2")
+
+
+def test_slow_queries_are_logged_and_listed(monkeypatch):
+    monkeypatch.setattr(SLOW_QUERY_LOG, "threshold", 0)
+    SLOW_QUERY_LOG.clear()
+    engine = create_engine("sqlite://")
+    with engine.connect() as connection:
+        connection.execute(text("SELECT :value"), {"value": 42})
+
+    monkeypatch.setattr(admin, "ADMIN_TOKEN", "secret")
+    app = FastAPI()
+    app.include_router(admin.router)
+    client = TestClient(app)
+
+    assert client.get("/admin/slow_queries").status_code == 403
+    response = client.get("/admin/slow_queries", headers={"X-Admin-Token": "secret"})
+    assert response.status_code == 200
+    queries = response.json()
+    assert queries[0]["statement"] == "SELECT ?"
+    assert queries[0]["parameters"] == "(42,)"
+    # only postgresql statements are explained
+    assert queries[0]["plan"] is None
+
+    client.delete("/admin/slow_queries", headers={"X-Admin-Token": "secret"})
+    assert not SLOW_QUERY_LOG.queries
+
+
+def test_admin_routes_are_disabled_without_token(monkeypatch):
+    monkeypatch.setattr(admin, "ADMIN_TOKEN", None)
+    app = FastAPI()
+    app.include_router(admin.router)
+    response = TestClient(app).get(
+        "/admin/slow_queries", headers={"X-Admin-Token": "secret"}
+    )
+    assert response.status_code == 404
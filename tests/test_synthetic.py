@@ -0,0 +1,77 @@
+from collections import Counter
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+from src.controllers.item_price_history import ItemPriceHistoryController
+from src.price_stats import PriceColumns
+from src.synthetic.catalog import CategoryEnum, generate_catalog
+from src.synthetic.prices import generate_price_rows
+
+END = datetime(2026, 10, 19)
+
+
+def test_generate_price_rows_is_deterministic():
+    def generate(seed: int):
+        return list(
+            generate_price_rows(5_000, list(range(1, 200)), [1, 2], seed, end=END)
+        )
+
+    first, second, other = generate(3), generate(3), generate(4)
+
+    assert first == second
+    assert first != other
+
+
+def test_generate_price_rows_shape():
+    rows = list(generate_price_rows(10_000, list(range(1, 100)), [1], days=30, end=END))
+
+    assert len(rows) == 10_000
+    assert all(END - timedelta(days=30) <= row.recorded_at <= END for row in rows)
+    prices = [row.price for row in rows if row.price is not None]
+    assert 0 < len(rows) - len(prices) < len(rows) * 0.1
+    assert all(1 <= price < 2**31 for price in prices)
+
+
+def test_generate_catalog_is_consistent():
+    catalog = generate_catalog(items=2_000, types=50, recipes=300, seed=1)
+
+    assert catalog == generate_catalog(items=2_000, types=50, recipes=300, seed=1)
+    assert len(catalog.item_by_id) == 2_000
+    assert len(catalog.recipes) == 300
+    for gid, item in catalog.item_by_id.items():
+        item_type = catalog.item_type_by_id[item.typeId]
+        assert gid in catalog.item_ids_by_type_id[item.typeId]
+        assert gid in catalog.item_ids_by_category[CategoryEnum(item_type.categoryId)]
+        assert item.nameId in catalog.name_by_id
+
+    resources = catalog.item_ids_by_category[CategoryEnum.RESOURCES]
+    for recipe in catalog.recipes:
+        assert 1 <= len(recipe.ingredientIds) <= 8
+        assert len(set(recipe.ingredientIds)) == len(recipe.quantities)
+        assert set(recipe.ingredientIds) <= resources
+    # a few common resources go into most recipes
+    uses = Counter(gid for recipe in catalog.recipes for gid in recipe.ingredientIds)
+    assert uses.most_common(1)[0][1] > 10 * sorted(uses.values())[len(uses) // 2]
+
+
+def test_crafts_ranking_on_synthetic_catalog():
+    catalog = generate_catalog(items=500, types=20, recipes=100, seed=2)
+    prices_data = [
+        (row.gid, row.price)
+        for row in generate_price_rows(20_000, list(catalog.item_by_id), [1], end=END)
+        if row.price is not None
+    ]
+
+    with (
+        patch("src.controllers.item_price_history.DataReader", return_value=catalog),
+        patch("src.controllers.item_price_history.I18N", return_value=catalog),
+    ):
+        crafts = ItemPriceHistoryController._rank_profitable_crafts(
+            PriceColumns.from_rows(prices_data), 5, 50, None, None
+        )
+
+    assert crafts
+    assert all(craft.profit > 0 for craft in crafts)
+    assert all(
+        craft.result_name == catalog.name_by_id[craft.result_id] for craft in crafts
+    )
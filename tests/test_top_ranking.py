@@ -0,0 +1,111 @@
+import asyncio
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock, patch
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from src.controllers.top_ranking import TopRankingController
+from src.models.base import Base
+from src.models.item_price_history import ItemPriceHistory, QuantityEnum
+from src.models.top_ranking import RankingKindEnum, TopRanking
+
+
+@pytest.fixture()
+def async_session_maker():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    now = datetime.now()
+    rows = [
+        {
+            "gid": gid,
+            "quantity": QuantityEnum.HUNDRED,
+            "price": price,
+            "recorded_at": now - timedelta(days=i + 1),
+            "server_id": 1,
+        }
+        for gid in (17001, 17002)
+        for i, price in enumerate([100, 150, 200, 250, 300])
+    ]
+
+    async def setup():
+        async with engine.begin() as connection:
+            await connection.run_sync(Base.metadata.create_all)
+            await connection.execute(ItemPriceHistory.__table__.insert(), rows)
+
+    asyncio.run(setup())
+    yield async_sessionmaker(engine, expire_on_commit=False)
+    asyncio.run(engine.dispose())
+
+
+@patch("src.controllers.item_price_history.DataReader")
+@patch("src.controllers.item_price_history.I18N")
+def test_materialize_stores_every_combination(
+    mock_i18n, mock_data_reader, async_session_maker
+):
+    """Test que le materializer précalcule les classements du serveur actif."""
+    mock_data_reader.return_value.item_by_id = {
+        17001: MagicMock(nameId=1),
+        17002: MagicMock(nameId=2),
+    }
+    mock_data_reader.return_value.item_ids_by_category = {}
+    mock_data_reader.return_value.recipes = []
+    mock_i18n.return_value.name_by_id = {1: "Item 17001", 2: "Item 17002"}
+
+    async def run():
+        async with async_session_maker() as session:
+            materialized = await TopRankingController.materialize_async(session)
+            # computed less than an interval ago, the next pass skips the server
+            again = await TopRankingController.materialize_async(session)
+            ranking = await TopRankingController.get_ranking_async(
+                session, RankingKindEnum.ITEMS, 1, QuantityEnum.HUNDRED, None
+            )
+            rankings = list(await session.scalars(select(TopRanking)))
+        return materialized, ranking, rankings, again
+
+    materialized, ranking, rankings, again = asyncio.run(run())
+
+    assert materialized == [1]
+    assert again == []
+    assert ranking is not None
+    assert [item["gid"] for item in ranking.payload] == [17001, 17002]
+    assert ranking.payload[0]["samples"] == 5
+    assert {(row.kind, row.quantity) for row in rankings} >= {
+        (RankingKindEnum.ITEMS, None),
+        (RankingKindEnum.CRAFTS, QuantityEnum.THOUSAND),
+    }
+
+
+def test_get_ranking_ignores_stale_rankings(async_session_maker):
+    """Test qu'un classement trop ancien n'est pas servi."""
+
+    async def run():
+        async with async_session_maker() as session:
+            session.add(
+                TopRanking(
+                    kind=RankingKindEnum.ITEMS,
+                    server_id=1,
+                    quantity=None,
+                    category_id=None,
+                    payload=[],
+                    computed_at=datetime.now() - timedelta(hours=2),
+                )
+            )
+            await session.commit()
+            return await TopRankingController.get_ranking_async(
+                session,
+                RankingKindEnum.ITEMS,
+                1,
+                None,
+                None,
+                max_staleness=timedelta(hours=1),
+            )
+
+    assert asyncio.run(run()) is None
+
+
+def test_is_materialized_only_for_default_filters():
+    assert TopRankingController.is_materialized(30, 5, 50, None)
+    assert not TopRankingController.is_materialized(7, 5, 50, None)
+    assert not TopRankingController.is_materialized(30, 5, 50, 42)
+    assert not TopRankingController.is_materialized(30, 5, 10_000, None)
@@ -0,0 +1,85 @@
+import asyncio
+import json
+import time
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from src.profiling import ProfilingMiddleware, SamplingProfiler
+from src.tracing import TracingMiddleware, dump_trace, format_trace, span, start_trace
+
+
+def test_span_without_trace_records_nothing():
+    with span("sql"):
+        pass
+
+
+def test_spans_nest_across_threads():
+    def rank():
+        with span("ranking"):
+            pass
+
+    async def run():
+        with start_trace("GET /crafts") as trace:
+            with span("sql"):
+                await asyncio.sleep(0)
+            await asyncio.to_thread(rank)
+        return trace
+
+    trace = asyncio.run(run())
+    spans = dump_trace(trace)["spans"]
+    assert [(span["name"], span["parent"]) for span in spans] == [
+        ("GET /crafts", None),
+        ("sql", 0),
+        ("ranking", 0),
+    ]
+    assert spans[2]["thread"] != spans[0]["thread"]
+    assert "  (other)" in format_trace(trace)
+
+
+def test_tracing_middleware_exports_request_spans(tmp_path, monkeypatch):
+    trace_file = tmp_path / "traces.jsonl"
+    monkeypatch.setattr("src.tracing.TRACING_FILE", str(trace_file))
+    app = FastAPI()
+    app.add_middleware(TracingMiddleware, exporter="file")
+
+    @app.get("/items/{gid}")
+    def get_item(gid: int):
+        with span("lookup"):
+            return {"gid": gid}
+
+    assert TestClient(app).get("/items/1").status_code == 200
+    trace = json.loads(trace_file.read_text())
+    assert trace["name"] == "GET /items/{gid}"
+    assert [span["name"] for span in trace["spans"]] == ["GET /items/{gid}", "lookup"]
+
+
+def busy_wait(seconds: float):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+def test_sampling_profiler_folds_stacks():
+    with SamplingProfiler(interval=0.001) as profiler:
+        busy_wait(0.05)
+    stacks = profiler.folded().splitlines()
+    assert stacks
+    assert any("busy_wait (test_tracing.py" in stack for stack in stacks)
+    assert all(stack.rsplit(" ", 1)[1].isdigit() for stack in stacks)
+
+
+def test_profiling_middleware_returns_folded_stacks():
+    app = FastAPI()
+    app.add_middleware(ProfilingMiddleware, enabled=True)
+
+    @app.get("/slow")
+    def slow():
+        busy_wait(0.05)
+        return "done"
+
+    client = TestClient(app)
+    assert client.get("/slow").json() == "done"
+    response = client.get("/slow", params={"profile": 1})
+    assert response.headers["x-profiled-status"] == "200"
+    assert "busy_wait (test_tracing.py" in response.text